@@ -0,0 +1,388 @@
+
+# backends.py
+
+"""
+Input and screen backends for the player.
+
+Every mouse, keyboard, screen and clock call the player makes goes through an
+InputBackend instance. PyAutoGUIBackend drives the real desktop; SimulatorBackend
+replays against a virtual framebuffer, cursor and clock so sequences can run
+headlessly at full CPU speed (benchmarks, CI regression replays).
+
+Frames returned by screenshot() are always BGR uint8 NumPy arrays (OpenCV convention).
+"""
+
+import collections                  # Bounded event history of the simulator.
+import time                         # Real clock for the desktop backend.
+import numpy as np                  # Framebuffer storage and random number generation.
+import cv2                          # Template image decoding and colour conversion.
+from sequences import file_stamp    # Template cache invalidation.
+from memory import LRUCache         # Size cap of the template cache.
+
+
+SPIN_WINDOW = 0.002  # Final stretch of a deadline wait done by yielding instead of sleeping.
+TEMPLATE_CACHE_SIZE = 64            # Decoded template images kept per cache.
+SIMULATOR_MAX_EVENTS = 1_000_000    # Input events a simulator keeps; the oldest are dropped first.
+
+
+# --- Templates ---
+
+def read_template(cache, image_path):
+    """
+    Decodes a template image, reusing the copy in `cache` until the file changes on disk.
+
+    Args:
+        cache (LRUCache): Path -> (file stamp, decoded BGR image).
+        image_path (str): Template image.
+
+    Returns:
+        np.ndarray: The BGR template.
+
+    Raises:
+        FileNotFoundError: The image cannot be read.
+    """
+    stamp = file_stamp(image_path)
+    cached = cache.get(image_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    template = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if template is None:
+        raise FileNotFoundError(f"Could not read template image: {image_path}")
+    cache[image_path] = (stamp, template)
+    return template
+
+
+# --- Backend Interface ---
+
+class InputBackend:
+    """
+    Interface the player uses for all input, screen and timing operations.
+    Subclasses implement every method; the defaults only raise NotImplementedError.
+    """
+    name = "base"
+
+    # Random number source for human-like jitter. Must expose normal() and uniform().
+    random = np.random
+
+    def now(self):
+        """Returns the current time in seconds from a monotonic clock."""
+        raise NotImplementedError
+
+    def sleep(self, seconds):
+        """Blocks (or advances the clock) for the given number of seconds."""
+        raise NotImplementedError
+
+    def sleep_until(self, deadline):
+        """
+        Sleeps until now() reaches `deadline`. Scheduling against absolute deadlines
+        keeps long replays from drifting: an overrun shortens the next wait instead
+        of pushing every later event back.
+        """
+        self.sleep(deadline - self.now())
+
+    def size(self):
+        """Returns the (width, height) of the screen."""
+        raise NotImplementedError
+
+    def position(self):
+        """Returns the current (x, y) cursor position."""
+        raise NotImplementedError
+
+    def move_to(self, x, y, duration=0.0, pause=True):
+        """
+        Moves the cursor to (x, y) over `duration` seconds.
+
+        Args:
+            pause (bool): Apply the backend's per-call pause afterwards. Recorded
+                          paths pass False and keep their own timing.
+        """
+        raise NotImplementedError
+
+    def click(self, button='left'):
+        """Clicks at the current cursor position."""
+        raise NotImplementedError
+
+    def mouse_down(self, button='left'):
+        """Presses and holds a mouse button."""
+        raise NotImplementedError
+
+    def mouse_up(self, button='left'):
+        """Releases a mouse button."""
+        raise NotImplementedError
+
+    def write(self, text):
+        """Types the given text."""
+        raise NotImplementedError
+
+    def press(self, key):
+        """Presses and releases a single named key (e.g. 'enter')."""
+        raise NotImplementedError
+
+    def hotkey(self, *keys):
+        """Presses a key combination (e.g. 'ctrl', 'c')."""
+        raise NotImplementedError
+
+    def scroll(self, clicks, pause=True):
+        """
+        Scrolls the mouse wheel by `clicks` notches (positive is up).
+
+        Args:
+            clicks (int): Amount to scroll.
+            pause (bool): Apply the backend's per-call pause afterwards. Scheduled
+                          bursts pass False and keep their own timing.
+        """
+        raise NotImplementedError
+
+    def screenshot(self, region=None):
+        """
+        Captures the screen.
+
+        Args:
+            region (tuple): Optional (left, top, width, height) to capture.
+
+        Returns:
+            np.ndarray: BGR image of the captured area.
+        """
+        raise NotImplementedError
+
+
+# --- Real Desktop Backend ---
+
+class PyAutoGUIBackend(InputBackend):
+    """
+    Drives the real desktop through pyautogui.
+    pyautogui is imported here rather than at module level so that headless
+    environments can still import the player and use the simulator.
+    """
+    name = "pyautogui"
+
+    def __init__(self, pause=0.1, failsafe=False):
+        """
+        Args:
+            pause (float): Pause pyautogui inserts after every call.
+            failsafe (bool): Whether moving the mouse to a corner aborts execution.
+        """
+        import pyautogui
+        self._pyautogui = pyautogui
+        pyautogui.FAILSAFE = failsafe  # Disable fail-safe for batch execution
+        pyautogui.PAUSE = pause        # Small pause between PyAutoGUI calls
+
+    def now(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def sleep_until(self, deadline):
+        # time.sleep() can overshoot by a scheduler tick; sleep coarsely, then
+        # yield in a short loop for the last SPIN_WINDOW seconds.
+        remaining = deadline - time.perf_counter()
+        if remaining > SPIN_WINDOW:
+            time.sleep(remaining - SPIN_WINDOW)
+        while time.perf_counter() < deadline:
+            time.sleep(0)
+
+    def size(self):
+        width, height = self._pyautogui.size()
+        return width, height
+
+    def position(self):
+        x, y = self._pyautogui.position()
+        return x, y
+
+    def move_to(self, x, y, duration=0.0, pause=True):
+        self._pyautogui.moveTo(x, y, duration=duration, _pause=pause)
+
+    def click(self, button='left'):
+        self._pyautogui.click(button=button)
+
+    def mouse_down(self, button='left'):
+        self._pyautogui.mouseDown(button=button)
+
+    def mouse_up(self, button='left'):
+        self._pyautogui.mouseUp(button=button)
+
+    def write(self, text):
+        self._pyautogui.write(text)
+
+    def press(self, key):
+        self._pyautogui.press(key)
+
+    def hotkey(self, *keys):
+        self._pyautogui.hotkey(*keys)
+
+    def scroll(self, clicks, pause=True):
+        self._pyautogui.scroll(clicks, _pause=pause)
+
+    def screenshot(self, region=None):
+        image = self._pyautogui.screenshot(region=region)
+        return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+
+
+
+# --- Simulator Backend ---
+
+class VirtualClock:
+    """
+    A clock that only moves when told to. sleep() returns immediately and
+    advances the virtual time instead.
+    """
+    def __init__(self, start=0.0):
+        self._now = float(start)
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self._now += seconds
+
+
+class SimulatorBackend(InputBackend):
+    """
+    Deterministic in-memory desktop.
+
+    Keeps a virtual framebuffer (BGR NumPy array), a virtual cursor and a virtual
+    clock. Every input call is appended to `events` as (time, kind, details) so
+    replays can be asserted on or compared between runs. Template images can be
+    painted onto the framebuffer with blit()/stage_sequence() so screenshot
+    matching behaves like it would on a real screen.
+    """
+    name = "simulator"
+
+    def __init__(self, width=1920, height=1080, seed=0, pause=0.0, clock=None, max_events=SIMULATOR_MAX_EVENTS):
+        """
+        Args:
+            width (int): Framebuffer width in pixels (all monitors combined).
+            height (int): Framebuffer height in pixels.
+            seed (int): Seed for the random source, making jittered delays reproducible.
+            pause (float): Virtual seconds charged after every input call,
+                           mirroring pyautogui.PAUSE on a real desktop.
+            clock (VirtualClock): Clock to use; a fresh one starting at 0 by default.
+            max_events (int): Input events kept in `events` (a ring buffer, so
+                              endless simulated loops use bounded memory).
+        """
+        self.framebuffer = np.zeros((height, width, 3), dtype=np.uint8)
+        self.cursor = (width // 2, height // 2)
+        self.buttons_down = set()
+        self.clock = clock or VirtualClock()
+        self.random = np.random.RandomState(seed)
+        self.pause = pause
+        self.events = collections.deque(maxlen=max_events)
+        self._templates = LRUCache(TEMPLATE_CACHE_SIZE)  # Path -> (file stamp, decoded template image).
+
+    # --- Clock ---
+
+    def now(self):
+        return self.clock.now()
+
+    def sleep(self, seconds):
+        self.clock.sleep(seconds)
+
+    def _record(self, kind, pause=True, **details):
+        self.events.append((self.clock.now(), kind, details))
+        if pause:
+            self.clock.sleep(self.pause)
+
+    # --- Framebuffer helpers ---
+
+    def load_template(self, image_path):
+        """Decodes a template image and caches it until the file changes on disk."""
+        return read_template(self._templates, image_path)
+
+    def blit(self, image, x, y):
+        """
+        Paints an image onto the framebuffer with its top-left corner at (x, y).
+        Parts falling outside the framebuffer are clipped.
+        """
+        height, width = self.framebuffer.shape[:2]
+        img_h, img_w = image.shape[:2]
+        left, top = max(0, x), max(0, y)
+        right, bottom = min(width, x + img_w), min(height, y + img_h)
+        if left >= right or top >= bottom:
+            return
+        self.framebuffer[top:bottom, left:right] = image[top - y:bottom - y, left - x:right - x]
+
+    def stage_sequence(self, actions):
+        """
+        Paints every click screenshot of a sequence at its recorded coordinates,
+        so template matching succeeds during a headless replay.
+
+        Args:
+            actions (list): The 'actions' list of a sequence.
+        """
+        for action in actions:
+            path = action.get('screenshot')
+            if action.get('type') != 'click' or not path:
+                continue
+            try:
+                template = self.load_template(path)
+            except FileNotFoundError:
+                continue
+            x, y = action['coordinates']['x'], action['coordinates']['y']
+            self.blit(template, x - template.shape[1] // 2, y - template.shape[0] // 2)
+
+    # --- Input ---
+
+    def size(self):
+        height, width = self.framebuffer.shape[:2]
+        return width, height
+
+    def position(self):
+        return self.cursor
+
+    def move_to(self, x, y, duration=0.0, pause=True):
+        width, height = self.size()
+        self.cursor = (min(max(0, int(round(x))), width - 1), min(max(0, int(round(y))), height - 1))
+        self.clock.sleep(duration)
+        self._record('move', pause=pause, x=self.cursor[0], y=self.cursor[1])
+
+    def click(self, button='left'):
+        self._record('click', x=self.cursor[0], y=self.cursor[1], button=button)
+
+    def mouse_down(self, button='left'):
+        self.buttons_down.add(button)
+        self._record('mouse_down', x=self.cursor[0], y=self.cursor[1], button=button)
+
+    def mouse_up(self, button='left'):
+        self.buttons_down.discard(button)
+        self._record('mouse_up', x=self.cursor[0], y=self.cursor[1], button=button)
+
+    def write(self, text):
+        self._record('write', text=text)
+
+    def press(self, key):
+        self._record('press', key=key)
+
+    def hotkey(self, *keys):
+        self._record('hotkey', keys=keys)
+
+    def scroll(self, clicks, pause=True):
+        self._record('scroll', pause=pause, clicks=clicks)
+
+    # --- Screen ---
+
+    def screenshot(self, region=None):
+        if region is None:
+            return self.framebuffer.copy()
+        left, top, width, height = region
+        return self.framebuffer[top:top + height, left:left + width].copy()
+
+
+def create_backend(name, **kwargs):
+    """
+    Builds a backend by name.
+
+    Args:
+        name (str): 'pyautogui' for the real desktop or 'simulator' for the headless one.
+        **kwargs: Passed to the backend constructor.
+
+    Returns:
+        InputBackend: The backend instance.
+    """
+    if name == PyAutoGUIBackend.name:
+        return PyAutoGUIBackend(**kwargs)
+    if name == SimulatorBackend.name:
+        return SimulatorBackend(**kwargs)
+    raise ValueError(f"Unknown backend: {name}")
@@ -0,0 +1,213 @@
+
+# batch.py
+
+"""
+Data-driven replay: one sequence, many records.
+
+String fields of a sequence's actions may contain {{column}} placeholders, such
+as a type_string text of "{{first_name}} {{last_name}}" or click coordinates of
+{"x": "{{x}}", "y": 310}. SequenceTemplate finds them once, when the sequence
+is compiled. bind() then produces each row's actions by copying only the
+actions that contain placeholders. The data is a CSV file. read_rows() streams
+it in chunks through pandas, so files with millions of records never sit in
+memory at once. BatchResults appends one line per processed row to a results
+CSV, which makes per-row success easy to review and re-run.
+"""
+
+import csv                          # Results file.
+import os                           # Results file paths.
+import re                           # Placeholder syntax.
+import time                         # Result timestamps.
+import pandas as pd                 # Chunked CSV reading.
+from sequences import SequenceValidationError
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{\s*([^{}]+?)\s*\}\}')
+# A field consisting of a single placeholder takes the row value as a number when
+# the player reads the field as a number (a value that is not one fails the row);
+# everywhere else the text is kept as is (so values like zip codes keep their
+# leading zeros). 'path' covers the [x, y, t] points of recorded mouse paths.
+NUMERIC_FIELDS = ('x', 'y', 'total_delta', 'steps', 'duration_sec', 'delay_before', 'delay_after_click',
+                  'offset_ns', 'timestamp', 'path')
+UNTEMPLATED_FIELDS = ('type', 'screenshot')  # Resolved at compile time, never substituted.
+BATCH_CHUNK_ROWS = 1000                       # Rows read from the CSV at a time.
+RESULT_FIELDS = ('row', 'status', 'error', 'duration_s', 'finished_at')
+
+
+def results_path(data_path):
+    """Default results file of a data file: <name>.results.csv next to it."""
+    return os.path.splitext(data_path)[0] + '.results.csv'
+
+
+def _placeholders_in(value, found):
+    """Adds the placeholder names used anywhere in `value` to `found`; True if there were any."""
+    if isinstance(value, str):
+        names = PLACEHOLDER_PATTERN.findall(value)
+        found.extend(names)
+        return bool(names)
+    if isinstance(value, dict):
+        return any([_placeholders_in(v, found) for k, v in value.items() if k not in UNTEMPLATED_FIELDS])
+    if isinstance(value, list):
+        return any([_placeholders_in(v, found) for v in value])
+    return False
+
+
+class RowValueError(ValueError):
+    """A row value that cannot be used where its placeholder stands (e.g. text in a numeric field)."""
+
+
+def _convert(value, field, column):
+    if field in NUMERIC_FIELDS:
+        try:
+            number = float(value)
+        except ValueError:
+            raise RowValueError(f"column '{column}' value {value!r} is not a number (needed for '{field}')")
+        return int(number) if number.is_integer() else number
+    return value
+
+
+def _substitute(value, row, field=None):
+    """`value` with every placeholder replaced by the row's value."""
+    if isinstance(value, str):
+        whole = PLACEHOLDER_PATTERN.fullmatch(value)
+        if whole:
+            return _convert(row[whole.group(1)], field, whole.group(1))
+        return PLACEHOLDER_PATTERN.sub(lambda m: str(row[m.group(1)]), value)
+    if isinstance(value, dict):
+        return {k: v if k in UNTEMPLATED_FIELDS else _substitute(v, row, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute(v, row, field) for v in value]
+    return value
+
+
+class SequenceTemplate:
+    """
+    A compiled sequence whose actions may contain {{column}} placeholders.
+
+    Attributes:
+        compiled (CompiledSequence): The sequence, compiled once.
+        placeholders (list): Column names used, in order of first appearance.
+    """
+    def __init__(self, compiled):
+        """
+        Args:
+            compiled (CompiledSequence): The sequence to fill in.
+        """
+        self.compiled = compiled
+        self.placeholders = []
+        self._actions = list(compiled.actions)  # Built once (binary sequences build actions on access).
+        self._templated = []  # Indices of the actions that contain placeholders.
+        for idx, action in enumerate(self._actions):
+            names = []
+            if _placeholders_in(action, names):
+                self._templated.append(idx)
+                self.placeholders.extend(name for name in names if name not in self.placeholders)
+
+    def check_columns(self, columns, source="data"):
+        """Raises SequenceValidationError if the data has no column for a placeholder."""
+        missing = [name for name in self.placeholders if name not in columns]
+        if missing:
+            raise SequenceValidationError([f"{source}: no column for placeholder '{{{{{name}}}}}'" for name in missing])
+
+    def bind(self, row):
+        """
+        Returns the actions for one record. Actions without placeholders are shared
+        with the compiled sequence; only templated ones are copied.
+
+        Args:
+            row (dict): Column name -> value (strings, as read by read_rows()).
+
+        Returns:
+            list: Action dictionaries ready for playback.
+
+        Raises:
+            RowValueError: A value does not fit its field (the row cannot be played).
+        """
+        actions = list(self._actions)
+        for idx in self._templated:
+            try:
+                actions[idx] = _substitute(actions[idx], row)
+            except RowValueError as e:
+                raise RowValueError(f"action {idx} ({actions[idx].get('type')}): {e}") from None
+        return actions
+
+
+def read_columns(data_path):
+    """The column names of a CSV file (reads the header only)."""
+    return list(pd.read_csv(data_path, nrows=0).columns)
+
+
+def _open_reader(data_path, chunksize, **options):
+    """Chunked CSV reader with the settings every record count and read must share."""
+    return pd.read_csv(data_path, dtype=str, keep_default_na=False, chunksize=chunksize, **options)
+
+
+def count_rows(data_path):
+    """
+    Number of records in a CSV file, as read_rows() yields them (blank lines are
+    skipped, quoted line breaks are handled). Used for progress and ETA.
+    """
+    with _open_reader(data_path, BATCH_CHUNK_ROWS, usecols=[0]) as reader:  # One column is enough to count.
+        return sum(len(chunk) for chunk in reader)
+
+
+def read_rows(data_path, start_row=0, chunksize=BATCH_CHUNK_ROWS):
+    """
+    Streams the records of a CSV file.
+
+    Every value is read as text and empty cells stay empty strings, so what is
+    typed is exactly what is in the file.
+
+    Args:
+        data_path (str): CSV file with a header line.
+        start_row (int): 0-based index of the first record to yield. Earlier records are
+                         parsed and skipped (not skipped as lines, since quoted values
+                         may span several lines).
+        chunksize (int): Records parsed at a time.
+
+    Yields:
+        tuple: (0-based record index, dict of column -> value).
+    """
+    index = 0
+    with _open_reader(data_path, chunksize) as reader:
+        for chunk in reader:
+            if index + len(chunk) <= start_row:
+                index += len(chunk)
+                continue
+            columns = list(chunk.columns)
+            for values in chunk.itertuples(index=False, name=None):
+                if index >= start_row:
+                    yield index, dict(zip(columns, values))
+                index += 1
+
+
+class BatchResults:
+    """
+    Per-row outcome file (CSV with RESULT_FIELDS), appended and flushed after every row.
+    """
+    def __init__(self, path, append=False):
+        """
+        Args:
+            path (str): Results CSV.
+            append (bool): Keep the existing lines (when resuming) instead of starting over.
+        """
+        self.path = path
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'a' if exists else 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if not exists:
+            self._writer.writerow(RESULT_FIELDS)
+        self.succeeded = 0
+        self.failed = 0
+
+    def add(self, row, error=None, duration=0.0):
+        """Records the outcome of one row (error=None for success)."""
+        if error is None:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self._writer.writerow((row, 'ok' if error is None else 'failed', '' if error is None else str(error),
+                               f"{duration:.3f}", time.strftime("%Y-%m-%d %H:%M:%S")))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,400 @@
+
+# benchmark.py
+
+"""
+Benchmark suite for the playback and recording hot paths.
+
+Everything runs headlessly against the SimulatorBackend, so sleeps cost nothing
+and the numbers measure only the CPU work of the player and recorder.
+
+Usage:
+    python benchmark.py [--quick] [--filter NAME] [--output results.json]
+    python benchmark.py --compare baseline.json [--threshold 1.25]
+
+Results are written as JSON (one entry per benchmark with min/median/mean
+timings and a per-item cost), tagged with the git commit, so runs from
+different commits can be compared with --compare. Before timing anything, the
+suite checks that 'recorded' timing replays clicks at their recorded offsets.
+"""
+
+import argparse                     # Command-line options.
+import contextlib                   # Silences recorder prints while timing.
+import io                           # In-memory sink for silenced output.
+import json                         # Fixture files and machine-readable results.
+import logging                      # Quiets the player's per-action log lines.
+import os                           # Temporary working directories and paths.
+import platform                     # Host description stored with the results.
+import statistics                   # Median/mean of repeated timings.
+import subprocess                   # Reads the current git commit.
+import sys                          # Exit codes.
+import tempfile                     # Scratch directory for fixture files.
+import time                         # perf_counter for timing.
+import numpy as np                  # Synthetic screens and templates.
+import cv2                          # Writes template fixtures to disk.
+from backends import SimulatorBackend
+from player import SequencePlayer, SeleniumBot
+from sequences import BINARY_EXTENSION, convert_sequence
+
+# --- Fixture Definitions ---
+
+SEQUENCE_SIZES = {"10": 10, "1k": 1_000, "100k": 100_000}
+SCREEN_SIZES = {
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+    "multi_monitor": (5760, 1080),  # Three 1080p monitors side by side.
+}
+TEMPLATE_SIZE = 60  # Same crop size the recorder uses.
+
+
+def synthetic_actions(count, seed=0):
+    """
+    Builds a realistic mix of recorded actions without screenshots.
+
+    Args:
+        count (int): Number of actions to generate.
+        seed (int): Random seed so fixtures are identical between runs.
+
+    Returns:
+        list: Action dictionaries in the recorder's format.
+    """
+    rng = np.random.RandomState(seed)
+    actions = []
+    base = 1_700_000_000.0
+    for i in range(count):
+        kind = i % 6
+        timestamp = base + i * 0.5
+        if kind in (0, 3):
+            actions.append({
+                'type': 'click', 'button': 'left',
+                'coordinates': {'x': int(rng.randint(0, 1920)), 'y': int(rng.randint(0, 1080))},
+                'screenshot': None, 'timestamp': timestamp
+            })
+        elif kind == 1:
+            actions.append({'type': 'type_string', 'text': 'hello world', 'timestamp': timestamp})
+        elif kind == 2:
+            actions.append({'type': 'keystroke', 'key': 'enter', 'timestamp': timestamp})
+        elif kind == 4:
+            actions.append({
+                'type': 'scroll', 'total_delta': -500, 'direction': 'down',
+                'start': {'x': 900, 'y': 500}, 'end': {'x': 900, 'y': 500},
+                'start_position': 0, 'final_position': -500,
+                'duration_sec': 0.4, 'steps': 10, 'timestamp': timestamp
+            })
+        else:
+            actions.append({'type': 'clipboard', 'operation': 'c', 'timestamp': timestamp})
+    return actions
+
+
+def synthetic_sequence(count):
+    """Wraps synthetic actions in the sequence file layout."""
+    return {
+        'metadata': {'created_at': '2024-01-01 00:00:00', 'total_actions': count,
+                     'duration_sec': count * 0.5, 'mode': 'desktop_only'},
+        'actions': synthetic_actions(count)
+    }
+
+
+def synthetic_screen(width, height, seed=0):
+    """Returns a noisy BGR frame so template matching has real texture to work on."""
+    rng = np.random.RandomState(seed)
+    return rng.randint(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+
+# --- Timing Helpers ---
+
+def measure(func, repeat, items=1, setup=None):
+    """
+    Times a callable several times.
+
+    Args:
+        func (callable): Work to time. Receives setup()'s return value if setup is given.
+        repeat (int): Number of timed runs.
+        items (int): Units of work per run, used for the per-item cost.
+        setup (callable): Optional untimed preparation run before each timing.
+
+    Returns:
+        dict: min/median/mean seconds per run and microseconds per item.
+    """
+    samples = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        if setup:
+            func(state)
+        else:
+            func()
+        samples.append(time.perf_counter() - start)
+    median = statistics.median(samples)
+    return {
+        'repeat': repeat,
+        'items': items,
+        'min_s': min(samples),
+        'median_s': median,
+        'mean_s': statistics.fmean(samples),
+        'per_item_us': median / items * 1e6,
+    }
+
+
+def _repeat_for(count):
+    """Fewer repetitions for the big fixtures so the suite stays quick."""
+    return 3 if count >= 100_000 else 10 if count >= 1_000 else 50
+
+
+# --- Benchmarks ---
+
+def bench_load_sequence(workdir, sizes):
+    results = {}
+    for label in sizes:
+        count = SEQUENCE_SIZES[label]
+        path = os.path.join(workdir, f"seq_{label}.json")
+        with open(path, 'w') as f:
+            json.dump(synthetic_sequence(count), f, indent=4)
+        player = SequencePlayer(path, backend=SimulatorBackend())
+        results[f"load_sequence[{label}]"] = measure(
+            lambda: player.load_sequence(path), _repeat_for(count), items=count)
+        binary_path = os.path.join(workdir, f"seq_{label}{BINARY_EXTENSION}")
+        convert_sequence(path, binary_path)
+        results[f"load_sequence_binary[{label}]"] = measure(
+            lambda: player.load_sequence(binary_path), _repeat_for(count), items=count)
+    return results
+
+
+def bench_dispatch(sizes):
+    """Per-action cost of execute_with_timing with sleeps and input calls free."""
+    results = {}
+    for label in sizes:
+        count = SEQUENCE_SIZES[label]
+        actions = synthetic_actions(count)
+        bot = SeleniumBot(backend=SimulatorBackend())
+
+        def run():
+            bot.backend.events.clear()
+            for idx, action in enumerate(actions):
+                bot.execute_with_timing(idx, action)
+
+        results[f"execute_with_timing[{label}]"] = measure(run, _repeat_for(count), items=count)
+    return results
+
+
+def bench_template_location(workdir):
+    """The player's template lookup cost per screen size, for a miss and for a hit."""
+    results = {}
+    template = synthetic_screen(TEMPLATE_SIZE, TEMPLATE_SIZE, seed=1)
+    template_path = os.path.join(workdir, "template.png")
+    cv2.imwrite(template_path, template)
+    for label, (width, height) in SCREEN_SIZES.items():
+        backend = SimulatorBackend(width=width, height=height)
+        backend.framebuffer[:] = synthetic_screen(width, height)
+
+        # One capture through the frame cache and one match for all confidence levels.
+        bot = SeleniumBot(backend=backend)
+        bot.load_template(template_path)
+
+        def lookup():
+            bot.frames.invalidate()
+            return bot.locate(template_path)
+
+        results[f"locate_miss_single_pass[{label}]"] = measure(lookup, 5)
+
+        backend.blit(template, width // 2, height // 2)
+        assert lookup()[0] is not None, "template painted on the screen was not found"
+        results[f"locate_hit[{label}]"] = measure(lookup, 5)
+    return results
+
+
+def check_recorded_timing(workdir, clicks=20, gap_s=1.0, tolerance_s=0.01):
+    """
+    Replays clicks recorded gap_s apart in 'recorded' timing and checks that each
+    click lands on its recorded offset (no humanized delays added on top).
+
+    Returns:
+        list: One message per click that drifted beyond tolerance_s.
+    """
+    actions = [{'type': 'click', 'button': 'left', 'coordinates': {'x': 100 + i, 'y': 200},
+                'screenshot': None, 'offset_ns': int(i * gap_s * 1e9)} for i in range(clicks)]
+    path = os.path.join(workdir, "recorded_timing.json")
+    with open(path, 'w') as f:
+        json.dump({'metadata': {'total_actions': clicks}, 'actions': actions}, f)
+    player = SequencePlayer(path, backend=SimulatorBackend(pause=0.1))
+    player.timing = 'recorded'
+    player.play()
+    times = [t for t, kind, _ in player.backend.events if kind == 'click']
+    if len(times) != clicks:
+        return [f"expected {clicks} clicks, replay made {len(times)}"]
+    drift = []
+    for action, t in zip(actions, times):
+        expected = action['offset_ns'] / 1e9
+        if abs((t - times[0]) - expected) > tolerance_s:
+            drift.append(f"click at offset {expected:.3f}s fired at {t - times[0]:.3f}s")
+    return drift
+
+
+def bench_mouse_path(count=1_000):
+    bot = SeleniumBot(backend=SimulatorBackend())
+    targets = [(int(x), int(y)) for x, y in np.random.RandomState(2).randint(0, 1080, size=(count, 2))]
+
+    def run():
+        bot.backend.events.clear()
+        for x, y in targets:
+            bot.human_mouse_move(x, y)
+
+    return {"human_mouse_move": measure(run, 10, items=count)}
+
+
+def bench_recorder(workdir, sizes):
+    """record_scroll burst coalescing, event ingestion and save_sequence serialization."""
+    try:
+        from recorder import ElementRecorder, EventPump
+    except Exception as e:  # pynput/pyautogui need a display on most platforms.
+        print(f"Skipping recorder benchmarks: {e}")
+        return {}
+
+    results = {}
+    cwd = os.getcwd()
+    os.chdir(workdir)  # The recorder writes screenshots/ and sequence.json relative to cwd.
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            events = 10_000
+
+            def make_recorder():
+                return ElementRecorder()
+
+            def scroll_burst(recorder):
+                # Direction flips every 20 notches, so bursts keep opening and closing.
+                for i in range(events):
+                    recorder.record_scroll(900, 500, 0, 1 if (i // 20) % 2 else -1)
+                recorder._finalize_scroll_burst()
+
+            results["record_scroll"] = measure(scroll_burst, 10, items=events, setup=make_recorder)
+
+            # A burst of mouse moves through the listener-side queue: the callback
+            # cost the OS hooks see, plus draining, simplification and saving.
+            pumps = []
+
+            def ingest_burst(recorder):
+                pump = EventPump(recorder).start()
+                for i in range(events):
+                    pump.on_move(i % 1920, 500 + (i // 1920))
+                pump.stop()
+                pump.join()
+                pumps.append(pump)
+
+            results["event_pump_moves"] = measure(
+                ingest_burst, 10, items=events, setup=lambda: ElementRecorder(capture_motion=True))
+            results["event_pump_moves"]['last_run'] = pumps[-1].stats()
+
+            for label in sizes:
+                count = SEQUENCE_SIZES[label]
+                actions = synthetic_actions(count)
+
+                def loaded_recorder():
+                    recorder = ElementRecorder()
+                    recorder.recorded_actions = list(actions)
+                    return recorder
+
+                results[f"save_sequence[{label}]"] = measure(
+                    lambda recorder: recorder.save_sequence(), _repeat_for(count),
+                    items=count, setup=loaded_recorder)
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+# --- Reporting ---
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline, threshold):
+    """
+    Prints the ratio of every shared benchmark against a baseline run.
+
+    Returns:
+        list: Names of benchmarks whose median got slower than `threshold` times the baseline.
+    """
+    regressions = []
+    print(f"{'benchmark':40} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base:
+            continue
+        ratio = result['median_s'] / base['median_s'] if base['median_s'] else float('inf')
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:40} {base['median_s']*1e3:10.3f}ms {result['median_s']*1e3:10.3f}ms {ratio:6.2f}x{flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def run_suite(quick=False, name_filter=None):
+    """
+    Runs every benchmark.
+
+    Args:
+        quick (bool): Skip the 100k-action fixtures.
+        name_filter (str): Only keep benchmarks whose name contains this text.
+
+    Returns:
+        dict: Results with run metadata.
+    """
+    sizes = [label for label in SEQUENCE_SIZES if not (quick and label == "100k")]
+    logging.getLogger().setLevel(logging.WARNING)  # Per-action INFO lines would dominate the timings.
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        results.update(bench_load_sequence(workdir, sizes))
+        results.update(bench_dispatch(sizes))
+        results.update(bench_template_location(workdir))
+        results.update(bench_mouse_path())
+        results.update(bench_recorder(workdir, sizes))
+    if name_filter:
+        results = {name: r for name, r in results.items() if name_filter in name}
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+        },
+        'results': results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the player and recorder hot paths.")
+    parser.add_argument("--quick", action="store_true", help="skip the 100k-action fixtures")
+    parser.add_argument("--filter", help="only report benchmarks whose name contains this text")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression (default: 1.25)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        drift = check_recorded_timing(workdir)
+    if drift:
+        print("Recorded timing check failed:\n  " + "\n  ".join(drift))
+        sys.exit(1)
+
+    report = run_suite(quick=args.quick, name_filter=args.filter)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    for name, result in report['results'].items():
+        print(f"{name:40} median {result['median_s']*1e3:10.3f}ms  {result['per_item_us']:10.2f}us/item")
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed beyond {args.threshold}x")
+            sys.exit(1)
@@ -0,0 +1,143 @@
+
+# checkpoint.py
+
+"""
+Durable progress checkpoints for long sequences and chains.
+
+While a run plays, the player records the next unit of work (chain step, loop
+and action index) in a small JSON file, written atomically. Positions are
+reported after every action but written at most every CHECKPOINT_INTERVAL
+seconds or CHECKPOINT_EVERY actions, without fsync; loop ends, failures and
+flush() write immediately and durably. If the process dies, the same run
+started with resume enabled skips everything before the last written position
+(repeating at most the few actions since). A checkpoint is tied to the run's
+configuration through a hash key, so a checkpoint is never applied to a
+different chain.
+"""
+
+import hashlib                      # Configuration keys.
+import json                         # Checkpoint file format and canonical config encoding.
+import os                           # Paths and file removal.
+import time                         # Update timestamps.
+from sequences import atomic_write_json
+
+CHECKPOINT_DIR = 'checkpoints'
+MAX_FAILURES = 100  # Failures kept in the file; older ones are dropped.
+CHECKPOINT_INTERVAL = 1.0  # Seconds between throttled writes...
+CHECKPOINT_EVERY = 100     # ...or this many reported positions, whichever comes first.
+
+
+def config_key(config):
+    """
+    Returns a stable key for a run configuration (chain config, or a sequence
+    file with its loop settings). Relative sequence paths are made absolute
+    so the key does not depend on how the file was referred to.
+
+    Args:
+        config: JSON-serializable configuration.
+    """
+    def normalize(value):
+        if isinstance(value, dict):
+            return {k: (os.path.abspath(v) if k == 'sequence_file' and isinstance(v, str) else normalize(v))
+                    for k, v in value.items()}
+        if isinstance(value, list):
+            return [normalize(v) for v in value]
+        return value
+    canonical = json.dumps(normalize(config), sort_keys=True)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def default_checkpoint_path(key, kind='chain'):
+    """Where a run's checkpoint lives unless a path is given explicitly."""
+    return os.path.join(CHECKPOINT_DIR, f"{kind}_{key[:16]}.json")
+
+
+class Checkpoint:
+    """
+    One run's progress file.
+    """
+    def __init__(self, key, path=None, kind='chain', interval=CHECKPOINT_INTERVAL, every=CHECKPOINT_EVERY):
+        """
+        Args:
+            key (str): Configuration key from config_key().
+            path (str): Checkpoint file; defaults to checkpoints/<kind>_<key>.json.
+            kind (str): Label for the run type, used in the default file name.
+            interval (float): Seconds between throttled writes (see save()).
+            every (int): Positions reported between throttled writes, at most.
+        """
+        self.key = key
+        self.kind = kind
+        self.path = path or default_checkpoint_path(key, kind)
+        self.failures = []
+        self.interval = interval
+        self.every = every
+        self._pending = None       # Latest reported position not written yet.
+        self._unsaved = 0          # Positions reported since the last write.
+        self._last_write = None    # time.monotonic() of the last write.
+
+    def load(self):
+        """
+        Reads the saved position.
+
+        Returns:
+            dict: The saved 'position' (e.g. {'step', 'loop', 'action'}), or None when
+                  there is no checkpoint or it belongs to a different configuration.
+        """
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('key') != self.key:
+            return None
+        self.failures = state.get('failures', [])
+        return state.get('position')
+
+    def save(self, force=False, **position):
+        """
+        Records the next unit of work to do, e.g. save(step=2, loop=0, action=15).
+
+        The file is written (without fsync) only when `interval` seconds or
+        `every` positions have passed since the last write; otherwise the position
+        is kept for the next write or flush().
+
+        Args:
+            force (bool): Write now, durably (loop ends, failures).
+        """
+        self._pending = position
+        self._unsaved += 1
+        now = time.monotonic()
+        if force:
+            self._write(fsync=True)
+        elif (self._last_write is None or self._unsaved >= self.every
+              or now - self._last_write >= self.interval):
+            self._write(fsync=False)
+
+    def flush(self):
+        """Durably writes the latest position if it has not been written yet."""
+        if self._pending is not None:
+            self._write(fsync=True)
+
+    def _write(self, fsync):
+        atomic_write_json(self.path, {
+            'key': self.key,
+            'kind': self.kind,
+            'position': self._pending,
+            'failures': self.failures,
+            'updated_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+        }, indent=None, fsync=fsync)
+        self._pending = None
+        self._unsaved = 0
+        self._last_write = time.monotonic()
+
+    def record_failure(self, error, **position):
+        """Remembers where and why an action failed (saved with the next save())."""
+        self.failures.append(dict(position, error=str(error), at=time.strftime("%Y-%m-%d %H:%M:%S")))
+        del self.failures[:-MAX_FAILURES]
+
+    def clear(self):
+        """Deletes the checkpoint once the run has finished."""
+        self.failures = []
+        self._pending = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
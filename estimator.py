@@ -0,0 +1,379 @@
+
+# estimator.py
+
+"""
+Dry-run estimator for replay wall time.
+
+Walks a sequence or chain config with virtual clocks, without touching the
+screen, and predicts how long a replay will take. Every random wait in the
+player (default 'delay_before', random_delay(), per-character typing pauses)
+is evaluated three times: at its lower bound, its mean and its upper bound.
+Each scenario runs on its own virtual clock, so clock-dependent waits such as
+'delay_after_click' come out right. The result is a minimum, expected and
+maximum duration per action, per loop and per chain step.
+
+All three timing modes are modelled. In 'recorded' timing an action with a
+recorded offset starts at that offset from the loop start and skips the
+humanized waits inside it. In 'adaptive' timing the wait before an action lasts
+between the shortest settle check and the budget of the sequence's learned
+profile (<name>.profile.json), expected at the learned latency. Click
+verification adds between one screen check and VERIFY_WINDOW per click.
+
+Template lookup time depends on the screen and is not part of the player's
+timing model; pass locate_cost to charge a fixed cost per template lookup.
+"""
+
+import json                         # Reads sequence and chain files.
+import os                           # File names in the report.
+from player import (
+    START_DELAY, DEFAULT_DELAY_BEFORE, DELAY_BEFORE_LIMITS, CLICK_DELAY_BEFORE,
+    CLICK_DELAY_AFTER, CLICK_SETTLE, TYPE_CHAR_DELAY, HOTKEY_SETTLE, MOUSE_PATH_POINTS,
+    MOUSE_STEP_DURATION, MOUSE_STEP_SLEEP, MOUSE_FINAL_DURATION, TIMING_MODES,
+    SETTLE_POLLS, SETTLE_POLL_INTERVAL, VERIFY_WINDOW, VERIFY_POLL_INTERVAL,
+    KEY_MAPPING, scroll_delta, scroll_schedule,
+)
+from profiles import DelayProfile, profile_path, MIN_SAMPLES
+from sequences import plan_chain, validate_sequence, is_binary_sequence, read_sequence, template_ambiguous, action_offset
+
+SCENARIOS = ('minimum', 'expected', 'maximum')
+DEFAULT_PAUSE = 0.1  # pyautogui.PAUSE charged after every input call on the real desktop.
+
+CLIPBOARD_OPERATIONS = {'copy', 'c', 'paste', 'v', 'cut', 'x', 'select_all', 'a'}
+SETTLE_CHECK = SETTLE_POLLS * SETTLE_POLL_INTERVAL  # Shortest adaptive wait: a screen that is already still.
+
+
+class _VirtualRun:
+    """
+    One scenario of a dry run: a virtual clock plus the rule for resolving random waits.
+    """
+    def __init__(self, scenario, pause, locate_cost, timing='humanized', verify=False, profile=None):
+        self.scenario = scenario
+        self.pause = pause
+        self.locate_cost = locate_cost
+        self.timing = timing
+        self.verify = verify
+        self.profile = profile      # DelayProfile of the sequence, in 'adaptive' timing.
+        self.now = 0.0
+        self.last_click_time = 0.0
+        self.schedule = None        # (clock origin, recorded offset), as SeleniumBot.schedule.
+        self.on_schedule = False    # Current action started at its recorded offset.
+        self.settled = False        # The adaptive wait saw the screen settle.
+
+    def uniform(self, low, high):
+        """Value a uniform draw takes in this scenario."""
+        if self.scenario == 'minimum':
+            return low
+        if self.scenario == 'maximum':
+            return high
+        return (low + high) / 2
+
+    # random_delay() draws from a normal distribution clipped to [low, high];
+    # the clip is symmetric around the mean, so the same rule applies.
+    random_delay = uniform
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def input_call(self, count=1):
+        """Charges the backend pause for `count` input calls."""
+        self.now += self.pause * count
+
+    def mouse_move(self):
+        """Mirrors SeleniumBot.human_mouse_move: Bézier points then a final exact move."""
+        self.sleep(MOUSE_PATH_POINTS * (MOUSE_STEP_DURATION + MOUSE_STEP_SLEEP))
+        self.sleep(MOUSE_FINAL_DURATION)
+        self.input_call(MOUSE_PATH_POINTS + 1)
+
+    def follow_path(self, path):
+        """Mirrors SeleniumBot.follow_path: recorded timing, then one per-call pause."""
+        if path:
+            self.sleep(path[-1][2] + self.pause)
+
+    def move_to_target(self):
+        """Mirrors SeleniumBot.move_to_target: a direct move without pause when on schedule."""
+        if not self.on_schedule:
+            self.mouse_move()
+
+    def wait_after_click(self, action):
+        if 'delay_after_click' in action and not self.settled and not self.on_schedule:
+            self.sleep(action['delay_after_click'] - (self.now - self.last_click_time))
+
+    def wait_for_recorded_time(self, action):
+        """Mirrors SeleniumBot.wait_for_recorded_time: sleeps until the action's recorded offset."""
+        if self.timing != 'recorded':
+            return False
+        offset = action_offset(action)
+        if offset is None:
+            return False
+        if self.schedule is None:
+            self.schedule = (self.now, offset)
+        origin, base = self.schedule
+        self.sleep(origin + offset - base - self.now)
+        return True
+
+    def wait_adaptive(self, idx, action):
+        """
+        Mirrors SeleniumBot.wait_adaptive. The screen settles after one settle check
+        at best (minimum), after the learned latency when the profile has one
+        (expected), and not before the budget runs out at worst (maximum).
+        """
+        if self.timing != 'adaptive':
+            return False
+        default = action.get('delay_before', self.uniform(*DEFAULT_DELAY_BEFORE))
+        default = max(DELAY_BEFORE_LIMITS[0], min(default, DELAY_BEFORE_LIMITS[1]))
+        # Without a profile (no history yet) every budget is the usual delay.
+        budget = self.profile.budget(idx, default) if self.profile is not None else default
+        shortest = min(budget, SETTLE_CHECK)
+        entry = self.profile.entries.get(idx) if self.profile is not None else None
+        if self.scenario == 'minimum':
+            wait = shortest
+        elif self.scenario == 'maximum':
+            wait = budget
+        elif entry is not None and entry['samples'] >= MIN_SAMPLES:
+            wait = min(budget, entry['ewma'] + SETTLE_CHECK)
+        else:
+            wait = (shortest + budget) / 2
+        self.sleep(wait)
+        self.settled = self.scenario != 'maximum'
+        return True
+
+    def action(self, action, idx=0):
+        """Advances the clock by one action, mirroring SeleniumBot._execute_action."""
+        self.settled = False
+        self.on_schedule = self.wait_for_recorded_time(action)
+        continues_motion = action.get('type') == 'mouse_path' and 'delay_before' not in action
+        # Recorded hovers continue the previous motion: no default delay.
+        if not self.on_schedule and not continues_motion and not self.wait_adaptive(idx, action):
+            delay = action['delay_before'] if 'delay_before' in action else self.uniform(*DEFAULT_DELAY_BEFORE)
+            self.sleep(max(DELAY_BEFORE_LIMITS[0], min(delay, DELAY_BEFORE_LIMITS[1])))
+
+        kind = action.get('type')
+        if kind == 'click':
+            if not self.on_schedule:
+                self.sleep(self.random_delay(*CLICK_DELAY_BEFORE))
+            if action.get('screenshot') and not template_ambiguous(action):
+                # One capture and one match, whatever confidence level it meets.
+                self.sleep(self.locate_cost)
+            self.move_to_target()
+            if not self.on_schedule:
+                self.sleep(CLICK_SETTLE)
+            self.input_call()
+            self.last_click_time = self.now
+            if action.get('verify', self.verify):
+                # The effect shows up between the first screen check and the end of the window.
+                self.sleep(self.uniform(VERIFY_POLL_INTERVAL, VERIFY_WINDOW))
+            if not self.on_schedule:
+                self.sleep(self.random_delay(*CLICK_DELAY_AFTER))
+        elif kind == 'type_string':
+            if 'text' in action:
+                self.wait_after_click(action)
+                if self.on_schedule:
+                    self.input_call()  # The whole text in one call.
+                else:
+                    chars = len(action['text'])
+                    self.sleep(chars * self.uniform(*TYPE_CHAR_DELAY))
+                    self.input_call(chars)
+        elif kind == 'keystroke':
+            self.wait_after_click(action)
+            if action['key'].replace('Key.', '') in KEY_MAPPING:
+                self.input_call()
+        elif kind == 'scroll':
+            dy = scroll_delta(action)
+            if dy != 0:
+                # Mirrors SeleniumBot.scroll_burst: notches on a deadline schedule,
+                # only the last call pays the input pause.
+                num_steps = max(1, int(action.get('steps', 1)))
+                schedule = scroll_schedule(dy, num_steps, action.get('duration_sec', 0.0))
+                self.sleep(schedule[-1][0])
+                self.input_call()
+        elif kind in ('clipboard', 'copy', 'paste', 'cut', 'select_all'):
+            operation = action.get('operation') if kind == 'clipboard' else kind
+            if operation in CLIPBOARD_OPERATIONS:
+                self.sleep(HOTKEY_SETTLE)
+                self.input_call()
+        elif kind in ('drag_start', 'drag_end'):
+            self.move_to_target()
+            self.input_call()
+        elif kind == 'drag_drop':
+            self.move_to_target()
+            self.input_call()
+            if action.get('path'):
+                self.follow_path(action['path'])
+            else:
+                self.move_to_target()
+            self.input_call()
+        elif kind == 'mouse_path':
+            self.follow_path(action['path'])
+
+
+def _span(runs, func):
+    """Runs func on every scenario and returns how far each clock moved."""
+    result = {}
+    for run in runs:
+        start = run.now
+        func(run)
+        result[run.scenario] = run.now - start
+    return result
+
+
+def _check_timing(timing):
+    if timing not in TIMING_MODES:
+        raise ValueError(f"Unknown timing mode {timing!r} (expected one of {', '.join(TIMING_MODES)})")
+
+
+def estimate_sequence(sequence_data, pause=DEFAULT_PAUSE, locate_cost=0.0, timing='humanized', verify=False,
+                      profile=None):
+    """
+    Estimates one pass through a sequence's actions (no start delay).
+
+    Args:
+        sequence_data (dict): Parsed sequence with an 'actions' list.
+        pause (float): Seconds charged per input call (pyautogui.PAUSE).
+        locate_cost (float): Seconds charged per template lookup.
+        timing (str): One of TIMING_MODES, as played with --timing.
+        verify (bool): Clicks are verified (--verify-clicks); a click's own 'verify' overrides.
+        profile (DelayProfile): Learned waits for 'adaptive' timing (None: no history yet).
+
+    Returns:
+        dict: 'total' as {minimum, expected, maximum} in seconds, plus 'actions',
+              a list with the same triple per action.
+    """
+    _check_timing(timing)
+    runs = [_VirtualRun(scenario, pause, locate_cost, timing, verify, profile) for scenario in SCENARIOS]
+    actions = []
+    for idx, action in enumerate(sequence_data['actions']):
+        entry = _span(runs, lambda run: run.action(action, idx))
+        entry['index'] = idx
+        entry['type'] = action.get('type')
+        actions.append(entry)
+    return {
+        'timing': timing,
+        'actions': actions,
+        'total': {run.scenario: run.now for run in runs},
+    }
+
+
+def _loops_total(per_pass, loops, extra_delay):
+    """Duration of `loops` passes separated by `extra_delay` (no wait after the last)."""
+    return {s: per_pass[s] * loops + extra_delay * max(0, loops - 1) for s in SCENARIOS}
+
+
+def estimate_chain(chain_config, pause=DEFAULT_PAUSE, locate_cost=0.0, timing='humanized', verify=False):
+    """
+    Estimates a whole chain, mirroring MultiSequencePlayer.play_chain.
+    The chain is validated and planned exactly as for playback, so an invalid
+    chain raises instead of producing an estimate.
+
+    Args:
+        chain_config (list): Chain steps with 'sequence_file', 'loop_count' and 'extra_delay'.
+        pause (float): Seconds charged per input call.
+        locate_cost (float): Seconds charged per template lookup.
+        timing (str): One of TIMING_MODES; 'adaptive' reads each sequence's profile.
+        verify (bool): Clicks are verified.
+
+    Returns:
+        dict: 'total' plus 'steps', one entry per chain step with its per-loop
+              and per-step estimates.
+    """
+    _check_timing(timing)
+    plan = plan_chain(chain_config)
+    total = dict.fromkeys(SCENARIOS, START_DELAY)
+    steps = []
+    estimates = {}  # Each distinct sequence is walked once, even if it appears in several steps.
+    for step in plan.steps:
+        key = id(step.sequence)
+        if key not in estimates:
+            profile = (DelayProfile(profile_path(step.sequence.path), step.sequence.data['actions'])
+                       if timing == 'adaptive' else None)
+            estimates[key] = estimate_sequence(step.sequence.data, pause, locate_cost, timing, verify, profile)
+        per_pass = estimates[key]['total']
+        # The extra delay also separates this step from the next one.
+        waits = step.loop_count if step is not plan.steps[-1] else max(0, step.loop_count - 1)
+        step_total = {s: per_pass[s] * step.loop_count + step.extra_delay * waits for s in SCENARIOS}
+        for s in SCENARIOS:
+            total[s] += step_total[s]
+        steps.append({
+            'step': step.position, 'sequence_file': step.sequence.path, 'loop_count': step.loop_count,
+            'per_loop': {s: per_pass[s] + step.extra_delay for s in SCENARIOS},
+            'total': step_total,
+        })
+    return {'timing': timing, 'start_delay': START_DELAY, 'steps': steps, 'total': total}
+
+
+def estimate_file(path, loops=1, extra_delay=0.0, pause=DEFAULT_PAUSE, locate_cost=0.0, timing='humanized',
+                  verify=False):
+    """
+    Estimates a sequence file or a chain config file, detected from its content.
+
+    Args:
+        path (str): Sequence file (JSON or binary) or chain config (list of steps).
+        loops (int): For a sequence, how many times it is played back to back.
+        extra_delay (float): For a sequence, wait between loops.
+        pause (float): Seconds charged per input call.
+        locate_cost (float): Seconds charged per template lookup.
+        timing (str): One of TIMING_MODES; 'adaptive' reads the learned profile next to each sequence.
+        verify (bool): Clicks are verified.
+
+    Returns:
+        dict: The estimate, with 'kind' set to 'sequence' or 'chain'.
+    """
+    if is_binary_sequence(path):
+        data = read_sequence(path)
+    else:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    if isinstance(data, list):
+        report = estimate_chain(data, pause, locate_cost, timing, verify)
+        report['kind'] = 'chain'
+        return report
+    validate_sequence(data, source=path)
+    profile = DelayProfile(profile_path(path), data['actions']) if timing == 'adaptive' else None
+    report = estimate_sequence(data, pause, locate_cost, timing, verify, profile)
+    report['kind'] = 'sequence'
+    report['loops'] = loops
+    report['start_delay'] = START_DELAY
+    report['per_loop'] = {s: report['total'][s] + extra_delay for s in SCENARIOS}
+    loops_total = _loops_total(report['total'], loops, extra_delay)
+    report['total'] = {s: START_DELAY + loops_total[s] for s in SCENARIOS}
+    return report
+
+
+def _fmt(triple):
+    return (f"expected {_duration(triple['expected']):>10}  "
+            f"min {_duration(triple['minimum']):>10}  max {_duration(triple['maximum']):>10}")
+
+
+def _duration(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{int(hours)}h{int(minutes):02d}m{secs:04.1f}s"
+    if minutes:
+        return f"{int(minutes)}m{secs:04.1f}s"
+    return f"{secs:.2f}s"
+
+
+def format_report(report, per_action=False):
+    """
+    Renders an estimate as plain text.
+
+    Args:
+        report (dict): Result of estimate_file().
+        per_action (bool): Include one line per action for sequences.
+    """
+    lines = []
+    if report['kind'] == 'sequence':
+        if per_action:
+            for entry in report['actions']:
+                lines.append(f"  #{entry['index']:<5} {str(entry['type']):<12} {_fmt(entry)}")
+        lines.append(f"Per loop:  {_fmt(report['per_loop'])}")
+        lines.append(f"Total ({report['loops']} loops): {_fmt(report['total'])}")
+    else:
+        for step in report['steps']:
+            name = os.path.basename(step['sequence_file'])
+            lines.append(f"Step {step['step']}: {name} x{step['loop_count']}")
+            lines.append(f"  per loop:  {_fmt(step['per_loop'])}")
+            lines.append(f"  step:      {_fmt(step['total'])}")
+        lines.append(f"Chain total: {_fmt(report['total'])}")
+    return "\n".join(lines)
@@ -0,0 +1,256 @@
+
+# library.py
+
+"""
+Bulk checks over a tree of sequence files.
+
+scan_library() walks a directory, validates every sequence (JSON or binary)
+with the same rules as playback, resolves its screenshots the way the player
+does, and collects per-file stats. Files are checked in a process pool, so a
+library of thousands of sequences takes seconds on a multi-core machine.
+Screenshots that no sequence references are reported (and deleted with prune),
+and the results can be written as a JSON index of the whole library.
+
+Screenshot references are resolved relative to the sequence file, its parent
+directories up to the library root's parent (recordings store paths such as
+'sequences/screenshots/x.png' relative to the project directory) and the
+current directory. Pruning is refused while any reference is unresolved or any
+sequence is unreadable, since the missing file might be one of the "unused" ones
+under another path.
+"""
+
+import collections                  # Action type counts.
+import concurrent.futures           # Process pool.
+import json                         # Sequence and chain detection.
+import itertools                    # Library root for every pool task.
+import os                           # Directory walking and file stats.
+from sequences import (BINARY_EXTENSION, ActionColumns, action_values, decode_binary, is_binary_payload,
+                       sequence_problems, resolve_screenshot_path, atomic_write_json)
+
+SEQUENCE_EXTENSIONS = ('.json', BINARY_EXTENSION)
+# JSON files the tools write next to sequences; never sequences themselves.
+IGNORED_SUFFIXES = ('.profile.json', 'library_index.json')
+IGNORED_DIRS = ('checkpoints', 'diagnostics', '__pycache__', '.git')
+SCREENSHOT_EXTENSIONS = ('.png',)
+SCREENSHOTS_DIR_NAME = 'screenshots'  # Directories with this name hold click screenshots.
+INLINE_LIMIT = 32                     # Below this many files a pool costs more than it saves.
+POOL_CHUNK = 16                       # Files handed to a worker at a time.
+
+
+def _normalized(path):
+    return os.path.normcase(os.path.realpath(path))
+
+
+def find_files(root):
+    """
+    Walks `root` once.
+
+    Returns:
+        tuple: (candidate sequence files, screenshot files inside 'screenshots' directories).
+    """
+    sequences, screenshots = [], []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        in_screenshots = os.path.basename(directory) == SCREENSHOTS_DIR_NAME
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in IGNORED_DIRS:
+                        stack.append(entry.path)
+                    continue
+                name = entry.name.lower()
+                if in_screenshots and name.endswith(SCREENSHOT_EXTENSIONS):
+                    screenshots.append(entry.path)
+                elif name.endswith(SEQUENCE_EXTENSIONS) and not name.endswith(IGNORED_SUFFIXES):
+                    sequences.append(entry.path)
+    return sorted(sequences), sorted(screenshots)
+
+
+def _search_dirs(path, root):
+    """
+    Directories a screenshot reference of `path` is resolved against: the file's
+    own directory, then each parent up to and including the parent of `root`.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    stop = os.path.dirname(os.path.abspath(root)) if root else directory
+    dirs = [directory]
+    while _normalized(directory) != _normalized(stop):
+        parent = os.path.dirname(directory)
+        if parent == directory:  # `path` is not under `root`; the file's directory is all we know.
+            break
+        directory = parent
+        dirs.append(directory)
+    return dirs
+
+
+def _resolve_reference(shot, search_dirs):
+    """The screenshot file `shot` refers to, or None (see _search_dirs())."""
+    normalized = shot.replace('/', os.sep).replace('\\', os.sep)
+    if os.path.isabs(normalized):
+        return normalized if os.path.exists(normalized) else None
+    for directory in search_dirs:
+        candidate = os.path.join(directory, normalized)
+        if os.path.exists(candidate):
+            return candidate
+    return resolve_screenshot_path(shot)  # As recorded / relative to the current directory, like the player.
+
+
+def check_file(path, root=None):
+    """
+    Checks one file (runs in a worker process).
+
+    Args:
+        path (str): Sequence (or other JSON) file.
+        root (str): Library root; screenshot references are also resolved against
+                    the directories between the file and the root's parent.
+
+    Returns:
+        dict: 'path', 'kind' ('sequence', 'chain' or 'other'), 'format', 'bytes',
+              'problems', and for sequences 'actions', 'types', 'duration_sec',
+              'screenshots' (resolved, normalized paths) and 'missing_screenshots'.
+    """
+    entry = {'path': path, 'kind': 'sequence', 'format': 'json', 'bytes': 0, 'problems': []}
+    try:
+        # A file that vanished, is truncated or is corrupt becomes a problem on its own
+        # entry; decode_binary reports any malformed body as ValueError.
+        with open(path, 'rb') as f:
+            payload = f.read()
+        entry['bytes'] = len(payload)
+        if is_binary_payload(payload):
+            entry['format'] = 'binary'
+            data = decode_binary(payload)
+        else:
+            data = json.loads(payload)
+    except (OSError, ValueError) as e:
+        entry['problems'].append(f"{path}: unreadable: {e}")
+        return entry
+    if isinstance(data, list):
+        entry['kind'] = 'chain'  # Chain configs live next to sequences; checked by 'estimate' / 'chain'.
+        return entry
+    if not isinstance(data, dict) or 'actions' not in data:
+        entry['kind'] = 'other'
+        return entry
+    entry['problems'] = sequence_problems(data, source=path)
+    actions = data['actions'] if isinstance(data['actions'], (list, ActionColumns)) else []
+    search_dirs = _search_dirs(path, root)
+    resolved = {}  # Each distinct reference is resolved once.
+    screenshots, missing = set(), []
+    for shot in action_values(actions, 'screenshot'):
+        if not shot:
+            continue
+        if shot not in resolved:
+            resolved[shot] = _resolve_reference(shot, search_dirs)
+        if resolved[shot]:
+            screenshots.add(_normalized(resolved[shot]))
+        else:
+            missing.append(shot)
+    types = collections.Counter(t for t in action_values(actions, 'type') if t is not None)
+    entry.update({
+        'actions': len(actions),
+        'types': dict(types),
+        'duration_sec': (data.get('metadata') or {}).get('duration_sec'),
+        'screenshots': sorted(set(screenshots)),
+        'missing_screenshots': missing,
+    })
+    return entry
+
+
+def scan_library(root, workers=None, prune=False):
+    """
+    Checks every sequence under `root`.
+
+    Args:
+        root (str): Library directory.
+        workers (int): Worker processes (default: one per CPU).
+        prune (bool): Delete screenshots that no sequence references. Nothing is
+                      deleted while any reference is unresolved or any sequence
+                      is unreadable ('prune_refused').
+
+    Returns:
+        dict: 'root', 'files' (check_file() results), 'unused_screenshots',
+              'pruned', 'prune_refused' and 'totals'.
+    """
+    sequence_files, screenshot_files = find_files(root)
+    if len(sequence_files) < INLINE_LIMIT or workers == 1:
+        files = [check_file(path, root) for path in sequence_files]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            files = list(pool.map(check_file, sequence_files, itertools.repeat(root), chunksize=POOL_CHUNK))
+
+    sequences = [f for f in files if f['kind'] == 'sequence']
+    # Unreadable sequences have no 'screenshots': their references are unknown.
+    unreadable = sum(1 for f in sequences if 'screenshots' not in f)
+    referenced = {shot for f in sequences for shot in f.get('screenshots', ())}
+    unused = [path for path in screenshot_files if _normalized(path) not in referenced]
+    unresolved = sum(len(f.get('missing_screenshots', ())) for f in sequences)
+    pruned = []
+    prune_refused = prune and (unresolved > 0 or unreadable > 0) and bool(unused)
+    if prune and not prune_refused:
+        for path in unused:
+            try:
+                os.remove(path)
+                pruned.append(path)
+            except OSError:
+                pass
+
+    types = collections.Counter()
+    for f in sequences:
+        types.update(f.get('types', {}))
+    totals = {
+        'sequences': len(sequences),
+        'chains': sum(1 for f in files if f['kind'] == 'chain'),
+        'other_json': sum(1 for f in files if f['kind'] == 'other'),
+        'invalid': sum(1 for f in files if f['problems']),
+        'unreadable': unreadable,
+        'actions': sum(f.get('actions', 0) for f in sequences),
+        'action_types': dict(types.most_common()),
+        'bytes': sum(f['bytes'] for f in sequences),
+        'binary': sum(1 for f in sequences if f['format'] == 'binary'),
+        'screenshots': len(screenshot_files),
+        'missing_screenshots': unresolved,
+        'unused_screenshots': len(unused),
+    }
+    return {'root': os.path.abspath(root), 'files': files, 'unused_screenshots': unused,
+            'pruned': pruned, 'prune_refused': prune_refused, 'totals': totals}
+
+
+def write_index(report, path):
+    """Writes the scan results as a JSON index (atomically)."""
+    atomic_write_json(path, report)
+
+
+def format_report(report, max_listed=20):
+    """
+    Human-readable summary: totals, then problems, missing and unused screenshots
+    (each list capped at `max_listed` lines).
+    """
+    totals = report['totals']
+    lines = [
+        f"Library {report['root']}",
+        f"  {totals['sequences']} sequences ({totals['binary']} binary), {totals['chains']} chains, "
+        f"{totals['actions']} actions, {totals['bytes'] / 1024:.1f} KiB",
+        f"  {totals['invalid']} invalid, {totals['missing_screenshots']} missing screenshots, "
+        f"{totals['unused_screenshots']} unused of {totals['screenshots']} screenshots",
+    ]
+    if totals['action_types']:
+        lines.append("  Actions by type: " + ", ".join(f"{t}={n}" for t, n in totals['action_types'].items()))
+
+    def section(title, items):
+        if not items:
+            return
+        lines.append(f"{title} ({len(items)}):")
+        lines.extend(f"  {item}" for item in items[:max_listed])
+        if len(items) > max_listed:
+            lines.append(f"  ... {len(items) - max_listed} more")
+
+    section("Problems", [p for f in report['files'] for p in f['problems']])
+    section("Missing screenshots", [f"{f['path']}: {shot}" for f in report['files']
+                                    for shot in f.get('missing_screenshots', ())])
+    section("Pruned screenshots" if report['pruned'] else "Unused screenshots",
+            report['pruned'] or report['unused_screenshots'])
+    if report.get('prune_refused'):
+        lines.append(f"Prune refused: {totals['missing_screenshots']} screenshot references could not be "
+                     f"resolved and {totals['unreadable']} sequences could not be read, so unused "
+                     f"screenshots may still be in use (nothing was deleted)")
+    return "\n".join(lines)
@@ -0,0 +1,109 @@
+
+# log_setup.py
+
+"""
+Logging configuration shared by player.py and the GUI.
+
+Log records are put on an in-memory queue by a QueueHandler. A background
+QueueListener thread does the actual file and console writes, so the playback
+thread never waits on disk I/O. The log file rotates by size (default) or by
+time, and can be written as JSON lines for machine analysis.
+"""
+
+import atexit                       # Flushes the queue when the process exits.
+import json                         # JSON-lines formatter.
+import logging                      # Standard logging framework.
+import logging.handlers             # QueueHandler/QueueListener and rotating file handlers.
+import queue                        # Unbounded queue between callers and the writer thread.
+import sys                          # Console output.
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Extra attributes the player attaches to records (logger.info(..., extra={...}));
+# the JSON formatter copies any of them that are present. 'sequence' and 'loop'
+# are set for every line logged while a SequencePlayer plays a loop.
+STRUCTURED_FIELDS = ('action_index', 'action_type', 'duration', 'confidence', 'loop', 'sequence')
+
+_listener = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line, with the standard fields
+    plus any STRUCTURED_FIELDS the caller attached.
+    """
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(log_file="automation.log", level=logging.INFO, structured=False,
+                  max_bytes=10 * 1024 * 1024, backup_count=5, rotate_when=None, console=True):
+    """
+    Routes all logging through a background writer thread.
+
+    Args:
+        log_file (str): Path of the log file.
+        level (int): Minimum level logged.
+        structured (bool): Write the file as JSON lines instead of plain text.
+        max_bytes (int): Rotate the file when it reaches this size (ignored with rotate_when).
+        backup_count (int): Number of rotated files to keep.
+        rotate_when (str): Rotate by time instead of size ('midnight', 'H', 'D', ...,
+                           as accepted by TimedRotatingFileHandler).
+        console (bool): Also print plain-text log lines to stdout.
+
+    Returns:
+        logging.handlers.QueueListener: The running listener (stopped automatically at exit).
+    """
+    global _listener
+    shutdown_logging()  # Reconfiguring replaces the previous listener.
+
+    if rotate_when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=rotate_when, backupCount=backup_count, encoding='utf-8')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    file_handler.setFormatter(JsonLinesFormatter() if structured else logging.Formatter(TEXT_FORMAT))
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Drains the queue and closes the log files. Safe to call more than once."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -2,16 +2,22 @@ import customtkinter as ctk
 import threading
 from tkinter import filedialog, messagebox, simpledialog
 import os
-import time
 import queue
-import random
-import json
+import logging
 # Import pynput at the top, as it's needed for the recorder's listeners
 from pynput import keyboard, mouse
-from player import SequencePlayer
-from recorder import ElementRecorder
+from player import SequencePlayer, TIMING_MODES
+from recorder import ElementRecorder, EventPump
+from log_setup import setup_logging
+from sequences import BINARY_EXTENSION
+from memory import MemoryTracker
+from profiling import RunProfiler, profile_prefix
    
 
+# Log to automation.log (rotated) from a background thread, off the playback thread
+setup_logging()
+logger = logging.getLogger(__name__)
+
 # Set color theme
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("dark-blue")
@@ -25,40 +31,111 @@ LIGHT_GREY = "#3A3A3A"
 TEXT_COLOR = "#F0F0F0"
 
 # Animation settings
-ANIMATION_SPEED = 0.05
-loading_active = False
-update_queue = queue.Queue()
+ANIMATION_INTERVAL_MS = 125          # Busy animation redraw interval (capped at 8 frames per second)
+WAVE_CHARS = "▁▂▃▄▅▆▇█▇▆▅▄▃▂▁"
+WAVE_WIDTH = 12
+
+# Sequences can be JSON or the compact binary format
+SEQUENCE_FILETYPES = [("Sequence Files", f"*.json *{BINARY_EXTENSION}"), ("JSON Files", "*.json"),
+                      ("Binary Sequences", f"*{BINARY_EXTENSION}")]
+
+# Status pipeline: worker threads only put messages on status_queue (no Tk calls off
+# the main thread, so a busy UI can never block playback). The main thread drains the
+# queue every STATUS_POLL_MS and redraws once per batch; an empty poll is a single check.
+STATUS_POLL_MS = 50
+status_queue = queue.SimpleQueue()
+status_text = "Ready"
+busy = False
+animation_job = None
+animation_frame = 0
+
+def post_status(kind, *payload):
+    """Queue a status message from any thread; the main thread's poll picks it up."""
+    status_queue.put((kind, payload))
 
 def update_status(text):
-    update_queue.put(text)
-
-def animate_loading():
-    wave_chars = "▁▂▃▄▅▆▇█▇▆▅▄▃▂▁"
-    vibration_offset = 0
-    direction = 1
-    frame = 0
-    while loading_active:
-        status_label.update_idletasks()
-        bar_width = status_label.winfo_width()
-        char_count = max(10, bar_width // 8)
-        wave_pattern = (wave_chars * (char_count // len(wave_chars) + 1))[:char_count]
-        wave_shift = frame % len(wave_chars)
-        shifted_wave = wave_pattern[wave_shift:] + wave_pattern[:wave_shift]
-        vibrated_wave = shifted_wave[vibration_offset:] + shifted_wave[:vibration_offset]
-        app.after(0, lambda t=f"{vibrated_wave}": status_label.configure(text=t))
-        frame += 1
-        vibration_offset = (vibration_offset + direction) % len(wave_pattern)
-        if random.random() < 0.1: direction = -direction
-        time.sleep(ANIMATION_SPEED)
-
-def check_queue():
-    try:
-        while True:
-            msg = update_queue.get_nowait()
-            status_label.configure(text=msg)
-    except queue.Empty:
-        pass
-    app.after(50, check_queue)
+    post_status("text", text)
+
+def report_progress(progress):
+    """Progress callback for the players (called on the playback thread)."""
+    post_status("progress", progress)
+
+def report_error(title, message):
+    post_status("error", title, message)
+
+def finish_run(text="Ready"):
+    post_status("done", text)
+
+def format_eta(seconds):
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+def format_progress(progress):
+    parts = []
+    if progress.get('step'):
+        parts.append(progress['step'])
+    parts.append(f"Action {progress['action']}/{progress['actions']}")
+    parts.append(f"Loop {progress['loop']}/{progress['loops']}")
+    if progress.get('eta') is not None:
+        parts.append(f"ETA {format_eta(progress['eta'])}")
+    return " · ".join(parts)
+
+def render_status():
+    if busy:
+        shift = animation_frame % len(WAVE_CHARS)
+        wave = (WAVE_CHARS[shift:] + WAVE_CHARS[:shift])[:WAVE_WIDTH]
+        status_label.configure(text=f"{wave}  {status_text}")
+    else:
+        status_label.configure(text=status_text)
+
+def animate():
+    """Advance the busy animation one frame; reschedules itself only while busy."""
+    global animation_frame, animation_job
+    animation_frame += 1
+    render_status()
+    animation_job = app.after(ANIMATION_INTERVAL_MS, animate) if busy else None
+
+def start_busy():
+    global busy, animation_job
+    busy = True
+    if animation_job is None:
+        animation_job = app.after(ANIMATION_INTERVAL_MS, animate)
+
+def stop_busy():
+    global busy, animation_job
+    busy = False
+    if animation_job is not None:
+        app.after_cancel(animation_job)
+        animation_job = None
+
+def poll_status():
+    """Main-thread poll: drain the status queue, redraw once, and reschedule itself."""
+    if not status_queue.empty():
+        drain_status()
+    app.after(STATUS_POLL_MS, poll_status)
+
+def drain_status():
+    """Apply every queued status message, then redraw once."""
+    global status_text
+    errors = []
+    while True:
+        try:
+            kind, payload = status_queue.get_nowait()
+        except queue.Empty:
+            break
+        if kind == "text":
+            status_text = payload[0]
+        elif kind == "progress":
+            status_text = format_progress(payload[0])
+        elif kind == "done":
+            stop_busy()
+            status_text = payload[0]
+        elif kind == "error":
+            errors.append(payload)
+    render_status()
+    for title, message in errors:
+        messagebox.showerror(title, message)
 
 def browse_initial_file(entry_widget):
     """Browse for initial sequence/chain file"""
@@ -72,9 +149,6 @@ def browse_initial_file(entry_widget):
 
 def start_recording(sequence_name):
     def record_thread():
-        # Declare global at the very beginning of the function
-        global loading_active
-        
         directory = os.path.join(os.getcwd(), "sequences")
         os.makedirs(directory, exist_ok=True)
         # Construct the correct output path
@@ -89,108 +163,117 @@ def start_recording(sequence_name):
         try:
             update_status("Recording... (Press ESC to stop)")
             # Create an instance of the NEW recorder
-            recorder = ElementRecorder()
-            
-            # === Define the callback functions used by the new recorder ===
-            def on_click(x, y, button, pressed):
-                if pressed:
-                    recorder.on_mouse_press(x, y, button, pressed)
-                else:
-                    recorder.on_mouse_release(x, y, button)
-
-            def on_scroll(x, y, dx, dy):
-                recorder.record_scroll(x, y, dx, dy)
-
-            def on_press(key):
-                if key == keyboard.Key.esc:
-                    recorder.save_sequence()
-                    return False  # Stop listener
-                recorder.handle_keypress(key)
-
-            def on_release(key):
-                recorder.handle_keyrelease(key)
-            # === End of callback definitions ===
+            recorder = ElementRecorder(output_path=output_file, metadata={'sequence_name': sequence_name},
+                                       capture_motion=motion_var.get())
             
+            # The listener callbacks only queue raw events; the pump's own thread
+            # feeds them to the recorder, so slow handling never lags the input hooks.
+            pump = EventPump(recorder).start()
+
             # Start the listeners (this will block until ESC is pressed)
-            mouse_listener = mouse.Listener(on_click=on_click, on_scroll=on_scroll)
-            keyboard_listener = keyboard.Listener(on_press=on_press, on_release=on_release)
+            mouse_listener = mouse.Listener(on_click=pump.on_click, on_scroll=pump.on_scroll,
+                                            on_move=pump.on_move if recorder.capture_motion else None)
+            keyboard_listener = keyboard.Listener(on_press=pump.on_press, on_release=pump.on_release)
 
             mouse_listener.start()
             keyboard_listener.start()
             keyboard_listener.join()  # Blocks here until ESC
             mouse_listener.stop()
+            pump.join()  # Handles the remaining events, then saves
 
-            # The recorder saves to 'sequence.json'. Move it to the correct location.
-            temp_file = 'sequence.json'
-            if os.path.exists(temp_file):
-                # Read the data to update the metadata
-                with open(temp_file, 'r') as f:
-                    data = json.load(f)
-                # Update the metadata to reflect the sequence name
-                data['metadata']['sequence_name'] = sequence_name
-                # Save to the correct sequences folder
-                with open(output_file, 'w') as f:
-                    json.dump(data, f, indent=4)
-                # Clean up the temporary file
-                os.remove(temp_file)
-                update_status(f"Recording saved as {sequence_name}.json")
+            # The recorder writes the file straight to its destination, atomically.
+            if recorder.saved_path:
+                finish_run(f"Recording saved as {os.path.basename(recorder.saved_path)}")
             else:
-                update_status("Recording failed")
-                messagebox.showerror("Recording Error", "Recording file was not created.")
+                finish_run("Recording failed")
+                report_error("Recording Error", "Recording file was not created.")
                 
         except Exception as e:
-            update_status("Error occurred")
-            messagebox.showerror("Recording Error", str(e))
-        finally:
-            # The 'global' declaration at the top handles this
-            loading_active = False
-            update_queue.put("Ready")
+            finish_run("Error occurred")
+            report_error("Recording Error", str(e))
     
     # Start the recording thread
     threading.Thread(target=record_thread, daemon=True).start()
 
-def start_playback(sequence_file, loop_count, extra_delay):
+def start_memory_tracking(enabled):
+    """Starts a MemoryTracker for a run if memory reporting is ticked (None otherwise)."""
+    if not enabled:
+        return None
+    memory = MemoryTracker()
+    memory.start()
+    return memory
+
+def finish_memory_tracking(memory, text):
+    """Logs the memory report of a run and appends its one-line summary to the status text."""
+    if memory is None:
+        return text
+    logger.info(memory.report())
+    summary = memory.summary()
+    memory.stop()
+    return f"{text} ({summary})"
+
+def start_profiling(enabled, name):
+    """Starts a RunProfiler on the calling (playback) thread if profiling is ticked (None otherwise)."""
+    return RunProfiler(profile_prefix(name)).start() if enabled else None
+
+def finish_profiling(profiler):
+    """Writes the profile of a run and logs where it went."""
+    if profiler is None:
+        return
+    pstats_path, collapsed_path = profiler.stop()
+    logger.info(f"Profile written to {pstats_path} and {collapsed_path}\n{profiler.summary()}")
+
+def start_playback(sequence_file, loop_count, extra_delay, timing="humanized", memory_report=False, verify_clicks=False,
+                   profile=False):
     # Import the player from player.py
     
 
     def play_thread():
-        player = SequencePlayer(sequence_file=sequence_file)
+        memory = start_memory_tracking(memory_report)
+        profiler = start_profiling(profile, os.path.splitext(os.path.basename(sequence_file))[0])
         try:
+            player = SequencePlayer(sequence_file=sequence_file, progress_callback=report_progress)
+            player.timing = timing
+            player.memory = memory
+            player.verify_clicks = verify_clicks
+            player.profiler = profiler
             update_status("Playing sequence...")
-            for _ in range(loop_count):
-                player.play_sequence()
-                time.sleep(extra_delay)
-            update_status("Playback completed")
+            player.play(loop_count, extra_delay)
+            finish_profiling(profiler)
+            finish_run(finish_memory_tracking(memory, "Playback completed"))
         except Exception as e:
-            update_status("Error occurred")
-            messagebox.showerror("Playback Error", str(e))
-        finally:
-            global loading_active
-            loading_active = False
-            update_queue.put("Ready")
+            finish_profiling(profiler)
+            finish_run(finish_memory_tracking(memory, "Error occurred"))
+            report_error("Playback Error", str(e))
     threading.Thread(target=play_thread, daemon=True).start()
 
-def start_chain_playback(chain_config):
+def start_chain_playback(chain_config, resume=False, memory_report=False, verify_clicks=False, profile=False):
     # Import the player from player.py
     try:
         from player import MultiSequencePlayer
+        from checkpoint import Checkpoint, config_key
     except ImportError:
         messagebox.showerror("Import Error", "Could not import MultiSequencePlayer from player.py.")
         return
 
     def chain_thread():
-        player = MultiSequencePlayer(chain_config=chain_config)
+        memory = start_memory_tracking(memory_report)
+        profiler = start_profiling(profile, "chain")
         try:
+            player = MultiSequencePlayer(chain_config=chain_config, progress_callback=report_progress)
+            player.memory = memory
+            player.verify_clicks = verify_clicks
+            player.profiler = profiler
             update_status("Playing chain...")
-            player.play_chain()
-            update_status("Chain completed")
+            # The checkpoint is keyed by the chain config, so resuming only applies to the same chain.
+            checkpoint = Checkpoint(config_key(chain_config))
+            player.play_chain(checkpoint=checkpoint, resume=resume)
+            finish_profiling(profiler)
+            finish_run(finish_memory_tracking(memory, "Chain completed"))
         except Exception as e:
-            update_status("Error occurred")
-            messagebox.showerror("Chain Playback Error", str(e))
-        finally:
-            global loading_active
-            loading_active = False
-            update_queue.put("Ready")
+            finish_profiling(profiler)
+            finish_run(finish_memory_tracking(memory, "Error occurred"))
+            report_error("Chain Playback Error", str(e))
     threading.Thread(target=chain_thread, daemon=True).start()
 
 # Rest of the GUI code (chain_config, update_chain_display, add_sequence, etc.) remains the same...
@@ -323,7 +406,7 @@ def export_chain_to_batch():
         messagebox.showerror("Export Error", f"Failed to export chain: {str(e)}")
 
 def add_sequence():
-    file_path = filedialog.askopenfilename(title="Select Sequence File", filetypes=[("JSON Files", "*.json")])
+    file_path = filedialog.askopenfilename(title="Select Sequence File", filetypes=SEQUENCE_FILETYPES)
     if not file_path: return
     try:
         loop_count = simpledialog.askinteger("Loop Count", "Enter loop count:", minvalue=1, initialvalue=1)
@@ -351,9 +434,7 @@ def on_record():
     if not name:
         messagebox.showwarning("Input Error", "Please enter a name.")
         return
-    global loading_active
-    loading_active = True
-    threading.Thread(target=animate_loading, daemon=True).start()
+    start_busy()
     start_recording(name)
 
 def on_play():
@@ -368,10 +449,9 @@ def on_play():
     except ValueError:
         messagebox.showwarning("Input Error", "Invalid numbers.")
         return
-    global loading_active
-    loading_active = True
-    threading.Thread(target=animate_loading, daemon=True).start()
-    start_playback(sequence_file, loop_count, extra_delay)
+    start_busy()
+    start_playback(sequence_file, loop_count, extra_delay, timing=timing_var.get(), memory_report=memory_var.get(),
+                   verify_clicks=verify_var.get(), profile=profile_var.get())
 
 def on_chain_play():
     """Callback for start chain button"""
@@ -381,14 +461,13 @@ def on_chain_play():
     if not chain_config:
         messagebox.showwarning("Input Error", "Add sequences first.")
         return
-    global loading_active
-    loading_active = True
-    threading.Thread(target=animate_loading, daemon=True).start()
-    start_chain_playback(chain_config)
+    start_busy()
+    start_chain_playback(chain_config, resume=resume_var.get(), memory_report=memory_var.get(),
+                         verify_clicks=verify_var.get(), profile=profile_var.get())
 
 def browse_file():
     """Callback for file browse button"""
-    file_path = filedialog.askopenfilename(title="Select Sequence File", filetypes=[("JSON Files", "*.json")])
+    file_path = filedialog.askopenfilename(title="Select Sequence File", filetypes=SEQUENCE_FILETYPES)
     if file_path:
         sequence_file_entry.delete(0, ctk.END)
         sequence_file_entry.insert(0, file_path)
@@ -416,6 +495,9 @@ ctk.CTkLabel(name_box, text="Sequence Name:", text_color=TEXT_COLOR).pack(side="
 sequence_name_entry = ctk.CTkEntry(name_box, width=150, fg_color=LIGHT_GREY, text_color=TEXT_COLOR, 
                                placeholder_text="sequence_name")
 sequence_name_entry.pack(side="left", padx=5)
+motion_var = ctk.BooleanVar(value=False)
+ctk.CTkCheckBox(name_box, text="Mouse paths", variable=motion_var, fg_color=RED_PRIMARY, hover_color=RED_DARK,
+                text_color=TEXT_COLOR, checkbox_width=16, checkbox_height=16).pack(side="left", padx=5)
 initial_box = ctk.CTkFrame(record_box, fg_color="transparent")
 initial_box.pack(fill="x", pady=2)
 ctk.CTkLabel(initial_box, text="Initial:", text_color=TEXT_COLOR).pack(side="left", padx=5)
@@ -445,6 +527,10 @@ ctk.CTkLabel(params_box, text="Delay:", text_color=TEXT_COLOR).pack(side="left",
 extra_delay_entry = ctk.CTkEntry(params_box, width=40, fg_color=LIGHT_GREY, text_color=TEXT_COLOR)
 extra_delay_entry.insert(0, "1")
 extra_delay_entry.pack(side="left")
+ctk.CTkLabel(params_box, text="Timing:", text_color=TEXT_COLOR).pack(side="left", padx=(10,5))
+timing_var = ctk.StringVar(value="humanized")
+ctk.CTkOptionMenu(params_box, values=list(TIMING_MODES), variable=timing_var, width=95, height=24,
+                  fg_color=RED_DARK, button_color=RED_DARK, button_hover_color=RED_PRIMARY).pack(side="left")
 
 # Chain Tab
 chain_frame = tab_view.tab("Chain")
@@ -456,6 +542,9 @@ ctk.CTkButton(chain_tools, text="-", command=remove_sequence, fg_color=RED_DARK,
               width=25, height=24).pack(side="left", padx=2)
 ctk.CTkButton(chain_tools, text="Export", command=export_chain_to_batch, fg_color=RED_DARK, hover_color=RED_PRIMARY, 
               width=60, height=24).pack(side="right", padx=5)
+resume_var = ctk.BooleanVar(value=False)
+ctk.CTkCheckBox(chain_tools, text="Resume", variable=resume_var, fg_color=RED_PRIMARY, hover_color=RED_DARK,
+                text_color=TEXT_COLOR, checkbox_width=16, checkbox_height=16).pack(side="right", padx=5)
 chain_display = ctk.CTkTextbox(chain_frame, width=390, height=60, fg_color=LIGHT_GREY, text_color=TEXT_COLOR)
 chain_display.pack(pady=(2,0), fill="both", expand=True)
 # Keep textbox editable for manual editing
@@ -473,6 +562,18 @@ start_button = ctk.CTkButton(status_container, text="Start", command=lambda:
                            fg_color=RED_PRIMARY, hover_color=RED_DARK,
                            height=24, width=60)
 start_button.pack(side="right", padx=5, pady=2)
-
-app.after(50, check_queue)
+# cProfile + sampled stacks of play and chain runs, written to profiles/
+profile_var = ctk.BooleanVar(value=False)
+ctk.CTkCheckBox(status_container, text="Profile", variable=profile_var, fg_color=RED_PRIMARY, hover_color=RED_DARK,
+                text_color=TEXT_COLOR, checkbox_width=16, checkbox_height=16).pack(side="right", padx=5)
+# Fail fast when a click has no visible effect (play and chain runs)
+verify_var = ctk.BooleanVar(value=False)
+ctk.CTkCheckBox(status_container, text="Verify", variable=verify_var, fg_color=RED_PRIMARY, hover_color=RED_DARK,
+                text_color=TEXT_COLOR, checkbox_width=16, checkbox_height=16).pack(side="right", padx=5)
+# Opt-in tracemalloc report for play and chain runs (written to the log, summary in the status bar)
+memory_var = ctk.BooleanVar(value=False)
+ctk.CTkCheckBox(status_container, text="Memory", variable=memory_var, fg_color=RED_PRIMARY, hover_color=RED_DARK,
+                text_color=TEXT_COLOR, checkbox_width=16, checkbox_height=16).pack(side="right", padx=5)
+
+app.after(STATUS_POLL_MS, poll_status)
 app.mainloop()
\ No newline at end of file
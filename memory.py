@@ -0,0 +1,191 @@
+
+# memory.py
+
+"""
+Memory bounds and allocation tracking for long-running players.
+
+LRUCache is the size-capped mapping behind every cache that lives as long as a
+player or the GUI process (compiled sequences, decoded templates, delay
+profiles), so a session left running for days holds at most a fixed number of
+entries no matter how many files it has touched.
+
+MemoryTracker is the opt-in proof: it runs tracemalloc, takes a sample after
+every loop and reports the traced size per loop, the steady-state growth per
+loop (ignoring the first, cache-warming loop) and the source lines that
+allocated the most since tracking started. A player with a flat memory profile
+shows a growth per loop close to zero.
+"""
+
+import collections                  # OrderedDict for LRU order, deque for bounded sample history.
+import linecache                    # Source lines for the top-allocators report.
+import tracemalloc                  # Allocation tracking.
+
+MEMORY_TRACE_FRAMES = 1         # Stack frames kept per allocation (1 = the allocating line only).
+MEMORY_TOP_ALLOCATORS = 10      # Source lines listed in the report.
+MEMORY_MAX_SAMPLES = 10000      # Per-loop samples kept; older ones are dropped.
+MEMORY_REPORT_HEAD = 5          # Loops listed at the start of the report...
+MEMORY_REPORT_TAIL = 10         # ...and at the end; the ones in between are elided.
+
+# Allocations made by the tracking itself or by the import machinery are not the player's.
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class LRUCache:
+    """
+    Mapping that keeps at most `max_entries` items, evicting the least recently
+    used one first. Not thread-safe on its own: callers that share a cache
+    between threads hold their own lock around it (see SequenceRegistry).
+    """
+    def __init__(self, max_entries):
+        """
+        Args:
+            max_entries (int): Entries kept before the oldest is evicted.
+        """
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._items = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        """Returns the cached value (marking it recently used), or `default`."""
+        try:
+            self._items.move_to_end(key)
+        except KeyError:
+            return default
+        return self._items[key]
+
+    def __setitem__(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def pop(self, key, default=None):
+        return self._items.pop(key, default)
+
+    def clear(self):
+        self._items.clear()
+
+
+def format_bytes(size):
+    """Formats a byte count (possibly negative) as B, KiB or MiB."""
+    for unit in ('B', 'KiB'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} MiB"
+
+
+class MemoryTracker:
+    """
+    tracemalloc-based memory report for a run: traced size after every loop,
+    growth per loop and the top allocating source lines.
+    """
+    def __init__(self, frames=MEMORY_TRACE_FRAMES, top=MEMORY_TOP_ALLOCATORS, max_samples=MEMORY_MAX_SAMPLES):
+        """
+        Args:
+            frames (int): Stack frames stored per allocation. More frames give
+                          better attribution but slow the traced process down more.
+            top (int): Number of source lines listed by report().
+            max_samples (int): Per-loop samples kept.
+        """
+        self.frames = frames
+        self.top = top
+        self.samples = collections.deque(maxlen=max_samples)  # (label, traced bytes)
+        self._baseline = None
+        self._owns_tracing = False
+
+    def start(self):
+        """Starts tracemalloc (unless already running) and takes the baseline snapshot."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._owns_tracing = True
+        self._baseline = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        self.samples.clear()
+
+    @property
+    def active(self):
+        return self._baseline is not None and tracemalloc.is_tracing()
+
+    def sample(self, label):
+        """Records the traced size now, e.g. after a loop finished."""
+        if self.active:
+            self.samples.append((label, tracemalloc.get_traced_memory()[0]))
+
+    def growth_per_loop(self):
+        """
+        Average growth between samples, in bytes, leaving out the first sample
+        (the first loop fills caches and is expected to grow). None with fewer
+        than three samples.
+        """
+        if len(self.samples) < 3:
+            return None
+        first, last = self.samples[1][1], self.samples[-1][1]
+        return (last - first) / (len(self.samples) - 2)
+
+    def top_allocators(self):
+        """
+        Returns:
+            list: (location, size bytes, size growth bytes, block count) for the
+                  source lines whose allocations grew the most since start().
+        """
+        if not self.active:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        stats = snapshot.compare_to(self._baseline, 'lineno')
+        result = []
+        for stat in stats[:self.top]:
+            frame = stat.traceback[0]
+            result.append((f"{frame.filename}:{frame.lineno}", stat.size, stat.size_diff, stat.count))
+        return result
+
+    def summary(self):
+        """One line: current and peak traced size, and the growth per loop."""
+        if not self.active:
+            return "Memory tracking is not active"
+        current, peak = tracemalloc.get_traced_memory()
+        growth = self.growth_per_loop()
+        per_loop = "n/a (fewer than 3 loops)" if growth is None else f"{format_bytes(growth)}/loop"
+        return f"traced {format_bytes(current)}, peak {format_bytes(peak)}, growth {per_loop}"
+
+    def report(self):
+        """Multi-line report: summary, per-loop sizes and top allocators."""
+        lines = [f"Memory: {self.summary()}"]
+        if self.samples:
+            lines.append("Traced size after each loop:")
+            previous = None
+            hidden_from, hidden_to = MEMORY_REPORT_HEAD, len(self.samples) - MEMORY_REPORT_TAIL
+            for i, (label, size) in enumerate(self.samples):
+                if i == hidden_from and hidden_from < hidden_to:
+                    lines.append(f"  ... {hidden_to - hidden_from} loops not shown ...")
+                if not hidden_from <= i < hidden_to:
+                    delta = "" if previous is None else f"  ({'+' if size >= previous else ''}{format_bytes(size - previous)})"
+                    lines.append(f"  {label:<40} {format_bytes(size):>12}{delta}")
+                previous = size
+        allocators = self.top_allocators()
+        if allocators:
+            lines.append("Top allocators since start:")
+            for location, size, diff, count in allocators:
+                lines.append(f"  {location:<60} {format_bytes(size):>12}  "
+                             f"({'+' if diff >= 0 else ''}{format_bytes(diff)}, {count} blocks)")
+        return "\n".join(lines)
+
+    def stop(self):
+        """Stops tracemalloc if this tracker started it."""
+        if self._owns_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._owns_tracing = False
+        self._baseline = None
@@ -0,0 +1,224 @@
+
+# metrics.py
+
+"""
+Prometheus metrics for the player.
+
+PlayerMetrics keeps counters, gauges and histograms about a replay (actions by
+type, action and template-match latency, match confidence, fallbacks to
+recorded coordinates, loops, failures). MetricsServer serves them in the
+Prometheus text exposition format on a local HTTP endpoint. Scrapers read them
+from there to alert on slowdowns and match-rate drops across replay machines.
+
+Like a disabled Tracer, PlayerMetrics(enabled=False) makes every call return
+immediately, so the player can call it unconditionally.
+"""
+
+import http.server                  # The /metrics endpoint.
+import threading                    # Metric lock and the server thread.
+import time                         # Last-activity gauge.
+from tracing import HISTOGRAM_BOUNDS  # Same latency buckets as the trace summary.
+
+METRICS_HOST = '127.0.0.1'          # Only local scrapers (or a local agent) can read the endpoint by default.
+METRICS_PORT = 9464
+METRIC_PREFIX = 'automatron_'
+CONFIDENCE_BOUNDS = (0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 0.99)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """A labelled metric family; `kind` is the Prometheus TYPE."""
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = METRIC_PREFIX + name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}  # Label values tuple -> value (or histogram state).
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, *label_values):
+        self.values[label_values] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram, as Prometheus expects (le buckets, _sum, _count)."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), bounds=HISTOGRAM_BOUNDS):
+        super().__init__(name, help_text, labels)
+        self.bounds = tuple(bounds)
+
+    def observe(self, value, *label_values):
+        state = self.values.get(label_values)
+        if state is None:
+            state = self.values[label_values] = [[0] * len(self.bounds), 0.0, 0]
+        buckets = state[0]
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                buckets[i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, (buckets, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.bounds, buckets):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class PlayerMetrics:
+    """
+    The metrics one player process reports. Methods are called from the playback
+    thread and render() from the server thread, so updates go through a lock.
+    """
+    def __init__(self, enabled=True):
+        """
+        Args:
+            enabled (bool): When False, every method returns immediately.
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.actions = Counter('actions_total', "Actions executed, by action type.", ('type',))
+        self.action_failures = Counter('action_failures_total', "Actions that raised, by action type.", ('type',))
+        self.action_seconds = Histogram('action_duration_seconds', "Time per action, including waits.", ('type',))
+        self.match_seconds = Histogram('template_match_duration_seconds', "Time per template lookup.")
+        self.match_confidence = Histogram('template_match_confidence',
+                                          "Confidence level met by matched templates, or best score of misses.",
+                                          ('result',), bounds=CONFIDENCE_BOUNDS)
+        self.fallbacks = Counter('coordinate_fallbacks_total',
+                                 "Clicks that used recorded coordinates because the screenshot was not usable.",
+                                 ('reason',))
+        self.verification_failures = Counter('click_verification_failures_total',
+                                             "Clicks that had no visible effect with verification on.")
+        self.loops = Counter('loops_total', "Sequence loops played, by result.", ('result',))
+        self.last_action = Gauge('last_action_timestamp_seconds', "Unix time the last action finished.")
+        self._metrics = (self.actions, self.action_failures, self.action_seconds, self.match_seconds,
+                         self.match_confidence, self.fallbacks, self.verification_failures, self.loops,
+                         self.last_action)
+
+    def action_done(self, action_type, duration):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.actions.inc(action_type)
+            self.action_seconds.observe(duration, action_type)
+            self.last_action.set(time.time())
+
+    def action_failed(self, action_type):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.action_failures.inc(action_type)
+
+    def template_match(self, duration, confidence, matched):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.match_seconds.observe(duration)
+            self.match_confidence.observe(confidence, 'matched' if matched else 'missed')
+
+    def fallback(self, reason):
+        """reason: 'not_found', 'missing_file', 'error' or 'ambiguous' (flagged at record time)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.fallbacks.inc(reason)
+
+    def verification_failed(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.verification_failures.inc()
+
+    def loop_finished(self, completed):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.loops.inc('completed' if completed else 'failed')
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            lines = [line for metric in self._metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves PlayerMetrics at http://<host>:<port>/metrics from a daemon thread.
+    """
+    def __init__(self, metrics, host=METRICS_HOST, port=METRICS_PORT):
+        """
+        Args:
+            metrics (PlayerMetrics): What to serve.
+            host (str): Interface to bind; the loopback interface by default.
+            port (int): TCP port (0 picks a free one, see `port` after start()).
+        """
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        metrics = self.metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the log.
+
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
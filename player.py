@@ -2,38 +2,180 @@
 # player.py
 
 # Import necessary libraries
-from bs4 import BeautifulSoup       # Used for parsing HTML and XML, though not actively used in this script's logic.
-from numpy import random            # Used for generating random numbers, especially for human-like delays.
-import time                         # Provides time-related functions, essential for delays and timestamps.
-import pyautogui                    # Core library for GUI automation: controls mouse and keyboard.
-import pandas as pd                 # Data analysis library, not actively used in this script's logic.
 import json                         # Used for reading and writing JSON files (for action sequences).
 import sys                          # Provides access to system-specific parameters and functions, like command-line arguments.
-from pynput import keyboard, mouse  # Used to listen for and record keyboard and mouse events.
+import argparse                     # Parses command-line options for the entry point.
 import functools                    # Used for creating decorators, like the retry mechanism.
 import logging                      # Library for logging events, errors, and debugging information.
-import hashlib                      # Used to generate a unique session ID for recordings.
-import cv2                          # OpenCV library for computer vision, not actively used in this script's logic.
+import cv2                          # OpenCV: screen samples for the adaptive settle wait.
 import numpy as np                  # Fundamental package for scientific computing with Python.
 import os                           # Provides a way of using operating system dependent functionality.
-from datetime import datetime       # Used for timestamping, not actively used in this script's logic.
+import collections                  # Bounded ring buffers for per-run histories.
+from datetime import datetime       # Timestamps in diagnostic frame file names.
+from backends import create_backend, read_template, PyAutoGUIBackend, TEMPLATE_CACHE_SIZE  # Input/screen backends (real desktop or simulator).
+from tracing import Tracer          # Per-action timing spans, histograms and Chrome-trace export.
+from log_setup import setup_logging # Queue-backed, rotating (optionally JSON-lines) logging.
+from sequences import read_sequence, plan_chain, resolve_screenshot_path, default_registry  # Load/validate/compile.
+from sequences import action_offset  # Recorded action times, for timing-faithful replay.
+from sequences import template_ambiguous  # Screenshots the recorder flagged as unreliable.
+from profiles import DelayProfile, profile_path  # Learned UI response times for adaptive timing.
+from sequences import BINARY_EXTENSION, convert_sequence, is_binary_sequence  # Binary sequence format.
+from checkpoint import Checkpoint, config_key  # Durable progress for resuming interrupted runs.
+from memory import LRUCache, MemoryTracker  # Capped caches and the opt-in tracemalloc report.
+from metrics import PlayerMetrics, MetricsServer, METRICS_HOST  # Opt-in Prometheus endpoint.
+from screenhash import ScreenHashRecorder, HASH_EVERY  # Perceptual-hash checkpoints for run-to-run diffs.
+from profiling import RunProfiler, profile_prefix, PROFILE_DIR  # Opt-in cProfile + sampled stacks.
+from batch import SequenceTemplate, BatchResults, RowValueError, read_columns, read_rows, count_rows, results_path  # CSV-driven replay.
 
-# --- PyAutoGUI Configuration ---
-# Configure PyAutoGUI settings for batch execution
-pyautogui.FAILSAFE = False  # Disable fail-safe for batch execution
-pyautogui.PAUSE = 0.1       # Small pause between PyAutoGUI calls
+# --- Timing Defaults ---
+# Fixed waits and random-delay bounds used during playback. The dry-run estimator
+# (estimator.py) reads the same values, so its predictions follow any change here.
+START_DELAY = 2.0                  # Seconds given to switch to the target window before playback.
+DEFAULT_DELAY_BEFORE = (0.5, 1.5)  # Uniform range used when an action has no 'delay_before'.
+DELAY_BEFORE_LIMITS = (0.1, 5.0)   # 'delay_before' is clamped to this range.
+CLICK_DELAY_BEFORE = (0.5, 1.0)    # random_delay() bounds before locating a click target.
+CLICK_DELAY_AFTER = (0.1, 0.3)     # random_delay() bounds after a click.
+CLICK_SETTLE = 0.2                 # Pause between reaching the target and clicking.
+TYPE_CHAR_DELAY = (0.05, 0.15)     # Uniform pause after each typed character.
+HOTKEY_SETTLE = 0.1                # Pause before clipboard hotkeys.
+MOUSE_PATH_POINTS = 10             # Bézier points per human_mouse_move.
+MOUSE_STEP_DURATION = 0.01         # Move duration for each Bézier point.
+MOUSE_STEP_SLEEP = 0.01            # Sleep after each Bézier point.
+MOUSE_FINAL_DURATION = 0.1         # Move duration for the final, exact move.
+CONFIDENCE_LEVELS = (0.9, 0.8, 0.7, 0.6, 0.5)  # Acceptable template match confidences, best first.
+# 'humanized' waits a (random) delay_before before each action; 'recorded' replays
+# each action at its recorded offset from the start of the loop, against absolute deadlines;
+# 'adaptive' waits until the screen settles, capped by the latency learned on earlier runs.
+TIMING_MODES = ('humanized', 'recorded', 'adaptive')
+SETTLE_POLL_INTERVAL = 0.05        # Seconds between screen samples while waiting for the UI to settle.
+SETTLE_THRESHOLD = 2.0             # Mean absolute grey-level change below which two samples count as equal.
+SETTLE_POLLS = 2                   # Consecutive equal samples that mean the screen has settled.
+SETTLE_SAMPLE_WIDTH = 160          # Width the samples are shrunk to before comparing.
+FRAME_MAX_AGE = 0.15               # Seconds a captured frame may be reused for template lookups.
+MOUSE_HISTORY_LIMIT = 1000         # Mouse moves remembered in mouse_movement_history (a ring buffer).
+PROFILE_CACHE_SIZE = 16            # Delay profiles kept in memory by one player.
+# Click verification: after a click, the screen must change within VERIFY_WINDOW,
+# either near the click (VERIFY_MIN_PIXELS pixels differing by more than
+# VERIFY_PIXEL_DELTA) or across the whole screen (mean change above SETTLE_THRESHOLD).
+VERIFY_WINDOW = 1.0                # Seconds a click gets to show a visible effect.
+VERIFY_POLL_INTERVAL = 0.05        # Seconds between screen checks while verifying.
+VERIFY_REGION = 160                # Side of the square around the click point that is compared.
+VERIFY_PIXEL_DELTA = 24            # Per-channel change for a pixel to count as changed.
+VERIFY_MIN_PIXELS = 8              # Changed pixels near the click that count as an effect.
+VERIFY_RELOCATE_DISTANCE = 5       # Pixels the target must have moved to be clicked again.
+DIAGNOSTICS_DIR = 'diagnostics'    # Where frames of failed click verifications are saved.
+
+# Map pynput key names to pyautogui key names.
+KEY_MAPPING = {
+    'space': 'space', 'enter': 'enter', 'backspace': 'backspace',
+    'tab': 'tab', 'esc': 'escape', 'up': 'up', 'down': 'down',
+    'left': 'left', 'right': 'right', 'delete': 'delete',
+    'shift': 'shift', 'ctrl': 'ctrl', 'alt': 'alt'
+}
+
+# --- Scroll Helpers ---
+
+def scroll_delta(action):
+    """
+    Returns the vertical scroll amount of a scroll action.
+    Reads 'total_delta' from recordings, falling back to the older 'delta' structure.
+    """
+    dy = action.get('total_delta', 0)
+    if dy == 0 and 'delta' in action and isinstance(action['delta'], dict):
+        dy = action['delta'].get('y', 0)
+    return dy
+
+
+def split_scroll(dy, num_steps):
+    """
+    Splits a scroll amount into integer per-step amounts that add up exactly to dy.
+
+    Args:
+        dy (int): Total scroll amount.
+        num_steps (int): Number of steps to spread it over.
+
+    Returns:
+        list: One integer amount per step (some may be zero).
+    """
+    step_dy = dy / num_steps
+    amounts = []
+    accumulated = 0.0
+    for i in range(num_steps):
+        # Calculate exact step amount (avoids precision loss)
+        rounded_target = round((i + 1) * step_dy)
+        amounts.append(int(rounded_target - accumulated))
+        accumulated = rounded_target
+    return amounts
+
+def scroll_schedule(dy, num_steps, duration):
+    """
+    Plans a recorded scroll burst: when each notch is sent, relative to the burst start.
+    The recorder measures duration from the first notch to the last, so notch i
+    falls at i * duration / (num_steps - 1).
+
+    Args:
+        dy (int): Total scroll amount.
+        num_steps (int): Notches in the burst.
+        duration (float): Recorded seconds from first to last notch.
+
+    Returns:
+        list: (offset_seconds, amount) for every non-zero notch, in order.
+    """
+    interval = duration / (num_steps - 1) if num_steps > 1 and duration > 0 else 0.0
+    return [(i * interval, amount) for i, amount in enumerate(split_scroll(dy, num_steps)) if amount != 0]
+
+# --- Frame Capture ---
+
+class FrameCache:
+    """
+    Shared screen capture for one bot. Template lookups, the adaptive settle wait
+    and any other check get the latest frame as a BGR NumPy array when it is
+    younger than max_age, and a new capture only when it is not. Frames are also
+    dropped whenever the bot sends input, since the screen is about to change.
+    """
+    def __init__(self, backend, max_age=FRAME_MAX_AGE):
+        """
+        Args:
+            backend (InputBackend): Where frames are captured from.
+            max_age (float): Seconds a frame stays reusable (0 disables reuse).
+        """
+        self.backend = backend
+        self.max_age = max_age
+        self._frame = None
+        self._captured_at = None
+        self.captures = 0
+        self.hits = 0
+
+    def get(self, max_age=None):
+        """
+        Returns a frame no older than max_age seconds (default: the cache's budget).
+        """
+        limit = self.max_age if max_age is None else max_age
+        now = self.backend.now()
+        if self._frame is not None and now - self._captured_at <= limit:
+            self.hits += 1
+            return self._frame
+        self._frame = self.backend.screenshot()
+        self._captured_at = now  # Age counts from the request: the frame is at least this fresh.
+        self.captures += 1
+        return self._frame
+
+    def invalidate(self):
+        """Forgets the current frame (called after input is sent)."""
+        self._frame = None
+
+    def stats(self):
+        """Capture count, reuse count and hit rate."""
+        requests = self.captures + self.hits
+        return {'captures': self.captures, 'hits': self.hits,
+                'hit_rate': round(self.hits / requests, 3) if requests else 0.0}
+
+class ClickVerificationError(RuntimeError):
+    """A verified click had no visible effect, even after locating its target again."""
 
 # --- Logging Configuration ---
-# Sets up how the script will log information. It will both save to a file ('automation.log')
-# and print to the console.
-logging.basicConfig(
-    level=logging.INFO,  # Sets the minimum level of messages to log (INFO, DEBUG, WARNING, ERROR).
-    format='%(asctime)s - %(levelname)s - %(message)s',  # Defines the format of the log messages.
-    handlers=[
-        logging.FileHandler("automation.log"),  # Handler to write logs to a file.
-        logging.StreamHandler(sys.stdout)       # Handler to print logs to the console.
-    ]
-)
+# Handlers are installed by setup_logging() (log_setup.py), called from the entry
+# points: the command line below and the GUI. Writes happen on a background thread.
 # Creates a logger instance for the script.
 logger = logging.getLogger(__name__)
 
@@ -44,20 +186,45 @@ class SeleniumBot:
     A base class for automation bots.
     Despite the name, it does not use Selenium. It provides foundational
     functionalities like human-like delays, mouse movements, and action execution
-    using pyautogui.
+    through an input backend (pyautogui on a real desktop, or the headless simulator).
     """
-    def __init__(self):
+    def __init__(self, backend=None, tracer=None):
         """
         Initializes the bot's attributes.
+
+        Args:
+            backend (InputBackend): Backend used for all input, screen and clock calls.
+                                    Defaults to the real desktop through pyautogui.
+            tracer (Tracer): Records per-action and per-phase timings. Disabled by default.
         """
+        self.backend = backend or PyAutoGUIBackend()  # Where every mouse/keyboard/screen call goes.
+        self.tracer = tracer or Tracer(enabled=False, clock=self.backend.now) # Timing spans (no-op unless enabled).
+        self.metrics = PlayerMetrics(enabled=False)   # Prometheus metrics (no-op unless replaced by an enabled one).
+        self.random = self.backend.random    # Random source for human-like jitter (seedable in the simulator).
         self.wait = None                     # Placeholder for a Selenium-like wait object.
         self.default_timeout = 10            # Default timeout in seconds for operations.
         self.retry_attempts = 5              # Number of times to retry a failed action.
         self.ignored_exceptions = (Exception,) # Placeholder for exceptions to ignore during retries.
         self.action_count = 0                # Counter for the number of actions performed.
-        self.last_action_time = time.time()  # Timestamp of the last action.
-        self.last_click_time = time.time()   # Timestamp of the last click, for timing subsequent actions.
-        self.mouse_movement_history = []     # Stores a history of mouse movements.
+        self.last_action_time = self.backend.now()  # Timestamp of the last action.
+        self.last_click_time = self.backend.now()   # Timestamp of the last click, for timing subsequent actions.
+        self.mouse_movement_history = collections.deque(maxlen=MOUSE_HISTORY_LIMIT) # Most recent mouse movements.
+        self.last_match_confidence = None    # Confidence of the last screenshot match (None if no match).
+        self.screenshot_paths = None         # Pre-resolved screenshot path per action of the current sequence.
+        self.frames = FrameCache(self.backend) # Latest screen capture, shared by lookups and checks.
+        self._templates = LRUCache(TEMPLATE_CACHE_SIZE) # Template path -> (file stamp, decoded image).
+        self.timing = 'humanized'            # One of TIMING_MODES.
+        self.merge_scrolls = False           # Replay each scroll burst as one call (speed over fidelity).
+        self.schedule = None                 # (clock origin, recorded offset) of the current loop in 'recorded' timing.
+        self.on_schedule = False             # Current action was started at its recorded time: no humanized waits.
+        self.log_context = {}                # Extra log fields of the current loop ('sequence', 'loop').
+        self.profile = None                  # DelayProfile of the current sequence in 'adaptive' timing.
+        self.settled = False                 # Whether the adaptive wait saw the screen settle before this action.
+        self.memory = None                   # MemoryTracker sampled after every loop, if memory reporting is on.
+        self.verify_clicks = False           # Check that every click changes the screen (an action's 'verify' overrides).
+        self.diagnostics_dir = DIAGNOSTICS_DIR # Frames of failed click verifications are saved here.
+        self.screen_hashes = None            # ScreenHashRecorder for run-to-run comparison, if enabled.
+        self.profiler = None                 # RunProfiler tagged with the sequence and loop, if profiling.
 
     def random_delay(self, min_seconds=0.5, max_seconds=3.0):
         """
@@ -70,9 +237,10 @@ class SeleniumBot:
         """
         mu = (min_seconds + max_seconds) / 2      # Calculate the mean (center) of the distribution.
         sigma = (max_seconds - min_seconds) / 6   # Calculate the standard deviation.
-        delay = random.normal(mu, sigma)          # Generate a delay from the normal distribution.
+        delay = self.random.normal(mu, sigma)     # Generate a delay from the normal distribution.
         delay = max(min_seconds, min(max_seconds, delay)) # Ensure the delay is within the specified bounds.
-        time.sleep(delay)                         # Pause the script execution.
+        with self.tracer.span('random_delay', 'delay'):
+            self.backend.sleep(delay)             # Pause the script execution.
         logger.debug(f"Random delay: {delay:.2f}s")
 
     def retry_on_exception(f):
@@ -88,14 +256,14 @@ class SeleniumBot:
                     return f(self, *args, **kwargs)
                 except Exception as e:
                     # Calculate wait time with exponential backoff plus some randomness.
-                    wait_time = 2 ** attempt + random.uniform(0, 1)
+                    wait_time = 2 ** attempt + self.random.uniform(0, 1)
                     if attempt == self.retry_attempts - 1:
                         # If this was the last attempt, log the final failure and re-raise the exception.
                         logger.error(f"Final attempt failed: {str(e)}")
                         raise
                     # Log the failure and the upcoming retry attempt.
                     logger.warning(f"Attempt {attempt+1} failed: {str(e)}. Retrying in {wait_time:.1f}s...")
-                    time.sleep(wait_time)
+                    self.backend.sleep(wait_time)
             return None # Should not be reached if an exception is always raised.
         return wrapper
 
@@ -108,153 +276,448 @@ class SeleniumBot:
             x (int): The target x-coordinate.
             y (int): The target y-coordinate.
         """
-        logger.debug(f"Moving mouse to ({x}, {y})")
-        start_x, start_y = pyautogui.position() # Get the current mouse position.
-        distance = ((x - start_x)**2 + (y - start_y)**2)**0.5 # Calculate the distance to the target.
+        with self.tracer.span('mouse_move', 'move', x=x, y=y):
+            logger.debug(f"Moving mouse to ({x}, {y})")
+            start_x, start_y = self.backend.position() # Get the current mouse position.
+            distance = ((x - start_x)**2 + (y - start_y)**2)**0.5 # Calculate the distance to the target.
+
+            # Calculate a random control point for the Bézier curve.
+            # This point pulls the curve away from a straight line.
+            ctrl_x = (start_x + x) / 2 + self.random.uniform(-distance/3, distance/3)
+            ctrl_y = (start_y + y) / 2 + self.random.uniform(-distance/3, distance/3)
+
+            points = []
+            # Generate points along the Bézier curve.
+            for t in [i/MOUSE_PATH_POINTS for i in range(1, MOUSE_PATH_POINTS + 1)]: # t goes from 0.1 to 1.0.
+                # Quadratic Bézier formula: B(t) = (1-t)^2*P0 + 2(1-t)t*P1 + t^2*P2
+                bx = (1-t)**2*start_x + 2*(1-t)*t*ctrl_x + t**2*x
+                by = (1-t)**2*start_y + 2*(1-t)*t*ctrl_y + t**2*y
+                points.append((bx, by))
+
+            # Move the mouse through the generated points.
+            for point in points:
+                self.backend.move_to(point[0], point[1], duration=MOUSE_STEP_DURATION)
+                self.backend.sleep(MOUSE_STEP_SLEEP) # Small sleep to make movement smoother.
+
+            # Final move to the exact target coordinate.
+            self.backend.move_to(x, y, duration=MOUSE_FINAL_DURATION)
+            self.mouse_movement_history.append((start_x, start_y, x, y))
+
+    def move_to_target(self, x, y):
+        """
+        Moves the mouse to (x, y) for an action: a human-like curve normally, a
+        single direct move when the action runs on its recorded deadline (the
+        curve's per-point pauses would push it past the deadline).
+        """
+        if not self.on_schedule:
+            self.human_mouse_move(x, y)
+            return
+        with self.tracer.span('mouse_move', 'move', x=x, y=y):
+            start_x, start_y = self.backend.position()
+            self.backend.move_to(x, y, pause=False)
+            self.mouse_movement_history.append((start_x, start_y, x, y))
+
+    def follow_path(self, path):
+        """
+        Moves the mouse along a recorded path, keeping its original timing.
+        Each point is [x, y, t] with t in seconds since the first point; moves are
+        scheduled against deadlines, so a slow move call is caught up on rather
+        than delaying every later point. Moves skip the backend's per-call pause
+        (only the last one pays it, as settle time), like scroll bursts.
+
+        Args:
+            path (list): The recorded (simplified) path.
+        """
+        with self.tracer.span('mouse_path', 'move', points=len(path)):
+            started = self.backend.now()
+            last = len(path) - 1
+            for i, (x, y, t) in enumerate(path):
+                self.backend.sleep_until(started + t)
+                self.backend.move_to(x, y, pause=i == last)
+            if path:
+                self.mouse_movement_history.append((path[0][0], path[0][1], path[-1][0], path[-1][1]))
+
+    def scroll_burst(self, dy, num_steps, duration):
+        """
+        Replays a recorded scroll burst in roughly its recorded time.
+
+        Notches are sent at deadlines measured from the burst start, without the
+        backend's per-call pause (only the last notch pays it, as settle time).
+        When a call overruns and notches fall due together, they are merged into
+        one call so the burst catches up instead of stretching out. With
+        merge_scrolls set, the whole burst is a single call.
+
+        Args:
+            dy (int): Total scroll amount.
+            num_steps (int): Notches in the recorded burst.
+            duration (float): Recorded seconds from first to last notch.
+        """
+        schedule = [(0.0, dy)] if self.merge_scrolls else scroll_schedule(dy, num_steps, duration)
+        with self.tracer.span('scroll', 'input', steps=num_steps, calls=len(schedule)):
+            started = self.backend.now()
+            i = 0
+            while i < len(schedule):
+                self.backend.sleep_until(started + schedule[i][0])
+                # Merge every notch that is already due.
+                elapsed = self.backend.now() - started
+                amount = schedule[i][1]
+                i += 1
+                while i < len(schedule) and schedule[i][0] <= elapsed:
+                    amount += schedule[i][1]
+                    i += 1
+                self.backend.scroll(amount, pause=i == len(schedule))
+
+    def _settle_sample(self, frame=None):
+        """A small greyscale copy of the screen (or of `frame`), cheap to compare."""
+        if frame is None:
+            frame = self.frames.get(max_age=0) # Always fresh, but left in the cache for the lookup that follows.
+        height, width = frame.shape[:2]
+        scale = SETTLE_SAMPLE_WIDTH / width
+        small = cv2.resize(frame, (SETTLE_SAMPLE_WIDTH, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def load_template(self, image_path):
+        """Decodes a template image once, and again only if the file changes."""
+        return read_template(self._templates, image_path)
+
+    def locate(self, image_path, confidences=CONFIDENCE_LEVELS):
+        """
+        Finds a template on the screen with a single matchTemplate pass: the best
+        score is compared against each confidence level in turn, instead of
+        searching the screen once per level.
+
+        Args:
+            image_path (str): Template image.
+            confidences (tuple): Acceptable confidences, highest first.
+
+        Returns:
+            tuple: ((x, y) center of the match, confidence level met), or (None, best score).
+        """
+        frame = self.frames.get()
+        template = self.load_template(image_path)
+        height, width = template.shape[:2]
+        if height > frame.shape[0] or width > frame.shape[1]:
+            return None, 0.0
+        scores = cv2.matchTemplate(frame, template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, best_loc = cv2.minMaxLoc(scores)
+        for confidence in confidences:
+            if best >= confidence:
+                return (best_loc[0] + width // 2, best_loc[1] + height // 2), confidence
+        return None, best
+
+    def wait_until_settled(self, timeout):
+        """
+        Samples the screen until it stops changing, or until `timeout` seconds.
+
+        Returns:
+            tuple: (seconds until the screen was stable, True) when it settled, or
+                   (timeout, False) when it was still changing.
+        """
+        started = self.backend.now()
+        previous, stable_since, stable = None, None, 0
+        while True:
+            sample = self._settle_sample()
+            sampled_at = self.backend.now() - started
+            if previous is not None and np.abs(sample - previous).mean() < SETTLE_THRESHOLD:
+                stable += 1
+                if stable >= SETTLE_POLLS:
+                    return stable_since, True
+            else:
+                stable, stable_since = 0, sampled_at
+            previous = sample
+            remaining = timeout - (self.backend.now() - started)
+            if remaining <= 0:
+                return timeout, False
+            self.backend.sleep(min(SETTLE_POLL_INTERVAL, remaining))
+
+    def wait_adaptive(self, idx, action):
+        """
+        In 'adaptive' timing, replaces delay_before with a wait for the screen to
+        settle. The wait is capped by the action's learned latency plus a margin
+        (or the usual delay while there is no history), and the observed latency
+        is fed back into the profile.
 
-        # Calculate a random control point for the Bézier curve.
-        # This point pulls the curve away from a straight line.
-        ctrl_x = (start_x + x) / 2 + random.uniform(-distance/3, distance/3)
-        ctrl_y = (start_y + y) / 2 + random.uniform(-distance/3, distance/3)
+        Returns:
+            bool: True if the action was scheduled this way (no delay_before is added).
+        """
+        if self.timing != 'adaptive' or self.profile is None:
+            return False
+        default = action.get('delay_before', self.random.uniform(*DEFAULT_DELAY_BEFORE))
+        default = max(DELAY_BEFORE_LIMITS[0], min(default, DELAY_BEFORE_LIMITS[1]))
+        budget = self.profile.budget(idx, default)
+        with self.tracer.span('settle_wait', 'delay', budget=round(budget, 3)):
+            latency, self.settled = self.wait_until_settled(budget)
+        self.profile.observe(idx, latency, self.settled)
+        logger.debug(f"Action {idx}: screen settled after {latency:.3f}s (budget {budget:.3f}s)"
+                     if self.settled else f"Action {idx}: screen still changing after {budget:.3f}s")
+        return True
 
-        points = []
-        # Generate points along the Bézier curve.
-        for t in [i/10 for i in range(1, 11)]: # t goes from 0.1 to 1.0.
-            # Quadratic Bézier formula: B(t) = (1-t)^2*P0 + 2(1-t)t*P1 + t^2*P2
-            bx = (1-t)**2*start_x + 2*(1-t)*t*ctrl_x + t**2*x
-            by = (1-t)**2*start_y + 2*(1-t)*t*ctrl_y + t**2*y
-            points.append((bx, by))
+    def wait_for_recorded_time(self, action):
+        """
+        In 'recorded' timing, waits until the action's recorded offset from the start
+        of the loop. The deadline is absolute (loop start + offset), so time spent
+        inside earlier actions is absorbed instead of accumulating as drift.
 
-        # Move the mouse through the generated points.
-        for point in points:
-            pyautogui.moveTo(point[0], point[1], duration=0.01)
-            time.sleep(0.01) # Small sleep to make movement smoother.
+        Returns:
+            bool: True if the action was scheduled this way (no delay_before is added).
+        """
+        if self.timing != 'recorded':
+            return False
+        offset = action_offset(action)
+        if offset is None:
+            return False
+        if self.schedule is None:
+            self.schedule = (self.backend.now(), offset) # The first action played starts the clock.
+        origin, base = self.schedule
+        with self.tracer.span('schedule_wait', 'delay'):
+            self.backend.sleep_until(origin + offset - base)
+        return True
 
-        # Final move to the exact target coordinate.
-        pyautogui.moveTo(x, y, duration=0.1)
-        self.mouse_movement_history.append((start_x, start_y, x, y))
+    def screen_changed(self, before, after, point):
+        """
+        Whether `after` differs visibly from `before`: near `point` (a button
+        press, a caret, a menu opening under the cursor) or on the screen as a whole.
+        """
+        if before.shape != after.shape:
+            return True
+        height, width = before.shape[:2]
+        x, y, half = int(point[0]), int(point[1]), VERIFY_REGION // 2
+        region = (slice(max(0, y - half), min(height, y + half)), slice(max(0, x - half), min(width, x + half)))
+        diff = cv2.absdiff(before[region], after[region])
+        if np.count_nonzero(diff.max(axis=2) > VERIFY_PIXEL_DELTA) >= VERIFY_MIN_PIXELS:
+            return True
+        return np.abs(self._settle_sample(after) - self._settle_sample(before)).mean() >= SETTLE_THRESHOLD
+
+    def wait_for_click_effect(self, before, point, window=VERIFY_WINDOW):
+        """
+        Polls the screen until it differs from `before` or `window` seconds pass.
+
+        Returns:
+            bool: True if a change was seen in time.
+        """
+        deadline = self.backend.now() + window
+        while True:
+            self.backend.sleep(min(VERIFY_POLL_INTERVAL, max(0.0, deadline - self.backend.now())))
+            if self.screen_changed(before, self.frames.get(max_age=0), point):
+                return True
+            if self.backend.now() >= deadline:
+                return False
+
+    def save_diagnostic_frame(self, idx, point):
+        """
+        Saves the current screen, with the click point marked, for a failed verification.
+
+        Returns:
+            str: Path of the saved PNG.
+        """
+        frame = self.frames.get(max_age=0).copy()
+        cv2.drawMarker(frame, (int(point[0]), int(point[1])), (0, 0, 255), cv2.MARKER_CROSS, 40, 2)
+        os.makedirs(self.diagnostics_dir, exist_ok=True)
+        path = os.path.join(self.diagnostics_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_action{idx}.png")
+        cv2.imwrite(path, frame)
+        return path
+
+    def verify_click(self, idx, before, target, template_path=None):
+        """
+        Checks that a click made the screen change. On a miss, the target is
+        located once more; if it has moved, it is clicked again and checked again.
+        If the screen still did not react, a diagnostic frame is saved and the
+        action fails, which ends the loop in about VERIFY_WINDOW seconds instead
+        of letting the remaining actions run against the wrong screen.
+
+        Args:
+            idx (int): Action index (for logs and the diagnostic file name).
+            before (np.ndarray): Frame captured just before the click.
+            target (tuple): (x, y) that was clicked.
+            template_path (str): The click's screenshot, if it has one, for the re-locate.
+
+        Raises:
+            ClickVerificationError: The click had no visible effect.
+        """
+        with self.tracer.span('verify_click', 'delay'):
+            if self.wait_for_click_effect(before, target):
+                return
+            logger.warning(f"[VERIFY] Click {idx} at {target}: no screen change within {VERIFY_WINDOW}s")
+            if template_path:
+                location, confidence = self.locate(template_path)
+                if location and max(abs(location[0] - target[0]), abs(location[1] - target[1])) > VERIFY_RELOCATE_DISTANCE:
+                    logger.info(f"[VERIFY] Target found again at {location} (confidence {confidence}), clicking there")
+                    self.human_mouse_move(location[0], location[1])
+                    self.backend.sleep(CLICK_SETTLE)
+                    before = self.frames.get(max_age=0)
+                    self.backend.click()
+                    self.last_click_time = self.backend.now()
+                    target = location
+                    if self.wait_for_click_effect(before, target):
+                        return
+                elif location is None:
+                    logger.warning(f"[VERIFY] Target not found on screen (best score {confidence:.2f})")
+        self.metrics.verification_failed()
+        path = self.save_diagnostic_frame(idx, target)
+        raise ClickVerificationError(f"Click {idx} at {target} had no visible effect (diagnostic frame: {path})")
+
+    def wait_after_click(self, action, what):
+        """
+        Honors an action's 'delay_after_click': waits until at least that many
+        seconds have passed since the last click.
+
+        Args:
+            action (dict): The action being executed.
+            what (str): What is about to happen, for the debug log (e.g. 'typing').
+        """
+        if 'delay_after_click' not in action or self.settled or self.on_schedule:
+            return # An adaptive wait already saw the UI settle, or the recorded offset includes the gap.
+        time_since_click = self.backend.now() - self.last_click_time
+        required_delay = action['delay_after_click']
+        if time_since_click < required_delay:
+            wait_time = required_delay - time_since_click
+            logger.debug(f"Waiting {wait_time:.2f}s after click before {what}")
+            with self.tracer.span('delay_after_click', 'delay'):
+                self.backend.sleep(wait_time)
 
     def execute_with_timing(self, idx, action):
         """
         Executes a single action from a sequence (e.g., click, type, scroll).
         It handles timing, delays, and different action types based on the 'action' dictionary.
+        The whole action is timed as one trace span, with its phases as child spans.
+
+        Args:
+            idx (int): The index of the action in the sequence.
+            action (dict): A dictionary describing the action to be performed.
+        """
+        self.last_match_confidence = None
+        started = self.backend.now()
+        try:
+            with self.tracer.action(idx, action.get('type')):
+                self._execute_action(idx, action)
+        except Exception:
+            self.metrics.action_failed(action.get('type'))
+            raise
+        duration = self.backend.now() - started
+        self.metrics.action_done(action.get('type'), duration)
+        logger.info(f"Action {idx} ({action.get('type')}) finished in {duration:.3f}s",
+                    extra={'action_index': idx, 'action_type': action.get('type'),
+                           'duration': round(duration, 4), 'confidence': self.last_match_confidence,
+                           **self.log_context})
+
+    def _execute_action(self, idx, action):
+        """
+        Runs one action for execute_with_timing.
 
         Args:
             idx (int): The index of the action in the sequence.
             action (dict): A dictionary describing the action to be performed.
         """
-        # Get the delay before the action, or use a default random delay.
-        delay = action.get('delay_before', random.uniform(0.5, 1.5))
-        logger.debug(f"Action {idx}: Waiting {delay:.2f}s before action")
-        # Ensure the delay is within a reasonable range (0.1 to 5.0 seconds).
-        time.sleep(max(0.1, min(delay, 5.0)))
+        self.settled = False
+        # In 'recorded' timing the action starts at its recorded offset, and the
+        # humanized waits inside it (click delays, curved moves, typing jitter) are skipped.
+        self.on_schedule = self.wait_for_recorded_time(action)
+        # A recorded hover continues the previous motion: it gets no default delay_before.
+        continues_motion = action.get('type') == 'mouse_path' and 'delay_before' not in action
+        if not self.on_schedule and not continues_motion and not self.wait_adaptive(idx, action):
+            # Get the delay before the action, or use a default random delay.
+            delay = action.get('delay_before', self.random.uniform(*DEFAULT_DELAY_BEFORE))
+            logger.debug(f"Action {idx}: Waiting {delay:.2f}s before action")
+            # Ensure the delay is within a reasonable range (0.1 to 5.0 seconds).
+            with self.tracer.span('delay_before', 'delay'):
+                self.backend.sleep(max(DELAY_BEFORE_LIMITS[0], min(delay, DELAY_BEFORE_LIMITS[1])))
+        if self.screen_hashes is not None and self.screen_hashes.wants(idx):
+            # The screen this action starts from; a click's lookup reuses the same frame.
+            self.screen_hashes.add(idx, self.frames.get())
 
         try:
             # --- Handle CLICK action ---
             if action['type'] == 'click':
-                self.random_delay(0.5, 1.0)  # Add a small random delay before clicking.
+                if not self.on_schedule:
+                    self.random_delay(*CLICK_DELAY_BEFORE)  # Add a small random delay before clicking.
                 
                 abs_x = action['coordinates']['x']
                 abs_y = action['coordinates']['y']
                 target_coords = (abs_x, abs_y)
 
                 # Prioritize screenshot-based clicking when available
-                screenshot_found = False
-                if action.get('screenshot'):
+                found_path = None
+                if action.get('screenshot') and template_ambiguous(action):
+                    # The recorder found this crop flat or repeated on screen: matching would be slow or wrong
+                    logger.info("[INFO] Screenshot was flagged ambiguous when recorded, using coordinates.")
+                    self.metrics.fallback('ambiguous')
+                elif action.get('screenshot'):
                     screenshot_path = action['screenshot']
                     
-                    # Try multiple path variations to find the screenshot
-                    possible_paths = [
-                        screenshot_path,
-                        os.path.join(os.getcwd(), screenshot_path),
-                        os.path.join(os.path.dirname(__file__), screenshot_path),
-                        screenshot_path.replace('/', os.sep).replace('\\', os.sep)
-                    ]
-                    
-                    found_path = None
-                    for path in possible_paths:
-                        if os.path.exists(path):
-                            found_path = path
-                            break
+                    # Compiled sequences resolve screenshot paths once; otherwise try the path variations now
+                    if self.screenshot_paths is not None:
+                        found_path = self.screenshot_paths[idx]
+                    else:
+                        found_path = resolve_screenshot_path(screenshot_path)
                     
                     if found_path:
                         try:
                             logger.info(f"[SCREENSHOT] Attempting to match: {os.path.basename(found_path)}")
-                            # Try multiple confidence levels for better matching
-                            for confidence in [0.9, 0.8, 0.7, 0.6, 0.5]:
-                                try:
-                                    location = pyautogui.locateCenterOnScreen(found_path, confidence=confidence)
-                                    if location:
-                                        target_coords = location
-                                        screenshot_found = True
-                                        logger.info(f"[SUCCESS] Screenshot matched at {location} with confidence {confidence}")
-                                        break
-                                except pyautogui.ImageNotFoundException:
-                                    continue
-                            
-                            if not screenshot_found:
-                                logger.warning(f"[FALLBACK] Screenshot not found on screen with any confidence level. Using coordinates.")
+                            # One match over the latest frame, checked against every confidence level
+                            lookup_started = self.backend.now()
+                            with self.tracer.span('locate', 'locate', template=os.path.basename(found_path)):
+                                location, confidence = self.locate(found_path)
+                            self.metrics.template_match(self.backend.now() - lookup_started, confidence, bool(location))
+                            if location:
+                                target_coords = location
+                                self.last_match_confidence = confidence
+                                logger.info(f"[SUCCESS] Screenshot matched at {location} with confidence {confidence}",
+                                            extra={'action_index': idx, 'action_type': 'click', 'confidence': confidence})
+                            else:
+                                logger.warning(f"[FALLBACK] Screenshot not found on screen with any confidence level "
+                                               f"(best score {confidence:.2f}). Using coordinates.")
+                                self.metrics.fallback('not_found')
                         except Exception as e:
                             logger.error(f"[ERROR] Screenshot matching failed: {str(e)}. Using coordinates.")
+                            self.metrics.fallback('error')
                     else:
                         logger.warning(f"[MISSING] Screenshot file not found: {screenshot_path}. Checked multiple paths. Using coordinates.")
+                        self.metrics.fallback('missing_file')
                 else:
                     logger.info("[INFO] No screenshot available for this action, using coordinates.")
 
-                self.human_mouse_move(target_coords[0], target_coords[1])  # Move mouse to the target.
-                time.sleep(0.2)  # Short pause before the click.
-                pyautogui.click()  # Perform the click.
-                self.last_click_time = time.time()  # Record the time of the click.
+                self.move_to_target(target_coords[0], target_coords[1])  # Move mouse to the target.
+                verify = action.get('verify', self.verify_clicks)
+                with self.tracer.span('click', 'input'):
+                    if not self.on_schedule:
+                        self.backend.sleep(CLICK_SETTLE)  # Short pause before the click.
+                    before = self.frames.get(max_age=0) if verify else None  # Reference for the verification.
+                    self.backend.click()  # Perform the click.
+                self.last_click_time = self.backend.now()  # Record the time of the click.
                 logger.info(f"Clicked at {target_coords}")
+                if verify:
+                    self.verify_click(idx, before, target_coords, found_path)
 
             # --- Handle TYPE_STRING action ---
             elif action['type'] == 'type_string':
                 if 'text' in action:
                     # Check if a specific delay is required after a click before typing.
-                    if 'delay_after_click' in action:
-                        time_since_click = time.time() - self.last_click_time
-                        required_delay = action['delay_after_click']
-                        if time_since_click < required_delay:
-                            wait_time = required_delay - time_since_click
-                            logger.debug(f"Waiting {wait_time:.2f}s after click before typing")
-                            time.sleep(wait_time)
+                    self.wait_after_click(action, 'typing')
                     # Type the text character by character with small random delays.
-                    for char in action['text']:
-                        pyautogui.write(char)
-                        time.sleep(random.uniform(0.05, 0.15))
+                    with self.tracer.span('type', 'input', chars=len(action['text'])):
+                        if self.on_schedule:
+                            self.backend.write(action['text'])  # At the recorded time, without per-character jitter.
+                        else:
+                            for char in action['text']:
+                                self.backend.write(char)
+                                self.backend.sleep(self.random.uniform(*TYPE_CHAR_DELAY))
                     logger.info(f"Typed text: {action['text']}")
 
             # --- Handle KEYSTROKE action (for special keys like Enter, Tab, etc.) ---
             elif action['type'] == 'keystroke':
                 # Similar to typing, check for a required delay after a click.
-                if 'delay_after_click' in action:
-                    time_since_click = time.time() - self.last_click_time
-                    required_delay = action['delay_after_click']
-                    if time_since_click < required_delay:
-                        wait_time = required_delay - time_since_click
-                        logger.debug(f"Waiting {wait_time:.2f}s after click before keystroke")
-                        time.sleep(wait_time)
+                self.wait_after_click(action, 'keystroke')
                 # Clean the key name (e.g., 'Key.enter' -> 'enter').
                 key = action['key'].replace('Key.', '')
-                # Map pynput key names to pyautogui key names.
-                key_mapping = {
-                    'space': 'space', 'enter': 'enter', 'backspace': 'backspace',
-                    'tab': 'tab', 'esc': 'escape', 'up': 'up', 'down': 'down',
-                    'left': 'left', 'right': 'right', 'delete': 'delete',
-                    'shift': 'shift', 'ctrl': 'ctrl', 'alt': 'alt'
-                }
-                if key in key_mapping:
-                    pyautogui.press(key_mapping[key]) # Press the special key.
+                if key in KEY_MAPPING:
+                    with self.tracer.span('press', 'input', key=key):
+                        self.backend.press(KEY_MAPPING[key]) # Press the special key.
                     logger.info(f"Pressed special key: {key}")
 
             # --- Handle SCROLL action ---
             elif action['type'] == 'scroll':
-                # Extract vertical scroll amount from correct field
-                dy = action.get('total_delta', 0)  # Use total_delta from recordings
-                
-                # Fallback to old 'delta' structure for backward compatibility
-                if dy == 0 and 'delta' in action and isinstance(action['delta'], dict):
-                    dy = action['delta'].get('y', 0)
+                # Extract vertical scroll amount (total_delta, or the older 'delta' structure)
+                dy = scroll_delta(action)
                 
                 if dy == 0:
                     logger.info("Scroll action with zero delta, skipping.")
@@ -263,28 +726,8 @@ class SeleniumBot:
                 # Get step count and duration from recording
                 num_steps = max(1, int(action.get('steps', 1)))  # Ensure at least 1 step
                 total_duration = action.get('duration_sec', 0.0)
-                
-                # Calculate per-step scroll amount and timing
-                step_dy = dy / num_steps
-                step_duration = total_duration / num_steps if total_duration > 0 else 0
-                
                 logger.info(f"Simulating scroll: total_delta={dy}, steps={num_steps}, duration={total_duration:.3f}s")
-                
-                # Execute scroll in small steps (mimics real user behavior)
-                accumulated = 0.0
-                for i in range(num_steps):
-                    # Calculate exact step amount (avoids precision loss)
-                    current_target = (i + 1) * step_dy
-                    rounded_target = round(current_target)
-                    step_amount = int(rounded_target - accumulated)
-                    accumulated = rounded_target
-                    
-                    if step_amount != 0:
-                        pyautogui.scroll(step_amount)  # Execute small scroll
-                    
-                    # Pause between steps to match original timing
-                    if i < num_steps - 1 and step_duration > 0:
-                        time.sleep(step_duration)
+                self.scroll_burst(dy, num_steps, total_duration)
 
             # --- Handle CLIPBOARD actions (copy, paste, cut, select all) ---
             elif action['type'] in ['clipboard', 'copy', 'paste', 'cut', 'select_all']:
@@ -296,56 +739,71 @@ class SeleniumBot:
                     operation = action['type']
                 
                 # Execute the corresponding hotkey.
-                if operation == 'copy' or operation == 'c':
-                    time.sleep(0.1) # Small delay to ensure text is selected before copying.
-                    pyautogui.hotkey('ctrl', 'c')
-                    logger.info("Performed Ctrl+C operation")
-                elif operation == 'paste' or operation == 'v':
-                    time.sleep(0.1) # Small delay to ensure the input field is focused.
-                    pyautogui.hotkey('ctrl', 'v')
-                    logger.info("Performed Ctrl+V operation")
-                elif operation == 'cut' or operation == 'x':
-                    time.sleep(0.1)
-                    pyautogui.hotkey('ctrl', 'x')
-                    logger.info("Performed Ctrl+X operation")
-                elif operation == 'select_all' or operation == 'a':
-                    time.sleep(0.1)
-                    pyautogui.hotkey('ctrl', 'a')
-                    logger.info("Performed Ctrl+A operation")
+                with self.tracer.span('hotkey', 'input', operation=operation):
+                    if operation == 'copy' or operation == 'c':
+                        self.backend.sleep(HOTKEY_SETTLE) # Small delay to ensure text is selected before copying.
+                        self.backend.hotkey('ctrl', 'c')
+                        logger.info("Performed Ctrl+C operation")
+                    elif operation == 'paste' or operation == 'v':
+                        self.backend.sleep(HOTKEY_SETTLE) # Small delay to ensure the input field is focused.
+                        self.backend.hotkey('ctrl', 'v')
+                        logger.info("Performed Ctrl+V operation")
+                    elif operation == 'cut' or operation == 'x':
+                        self.backend.sleep(HOTKEY_SETTLE)
+                        self.backend.hotkey('ctrl', 'x')
+                        logger.info("Performed Ctrl+X operation")
+                    elif operation == 'select_all' or operation == 'a':
+                        self.backend.sleep(HOTKEY_SETTLE)
+                        self.backend.hotkey('ctrl', 'a')
+                        logger.info("Performed Ctrl+A operation")
 
             # --- Handle DRAG_START action ---
             elif action['type'] == 'drag_start':
                 abs_x = action['coordinates']['x']
                 abs_y = action['coordinates']['y']
-                self.human_mouse_move(abs_x, abs_y)
-                pyautogui.mouseDown() # Press and hold the mouse button.
+                self.move_to_target(abs_x, abs_y)
+                with self.tracer.span('mouse_down', 'input'):
+                    self.backend.mouse_down() # Press and hold the mouse button.
                 logger.info(f"Started drag at ({abs_x}, {abs_y})")
 
             # --- Handle DRAG_END action ---
             elif action['type'] == 'drag_end':
                 abs_x = action['coordinates']['x']
                 abs_y = action['coordinates']['y']
-                self.human_mouse_move(abs_x, abs_y)
-                pyautogui.mouseUp() # Release the mouse button.
+                self.move_to_target(abs_x, abs_y)
+                with self.tracer.span('mouse_up', 'input'):
+                    self.backend.mouse_up() # Release the mouse button.
                 logger.info(f"Ended drag at ({abs_x}, {abs_y})")
 
             # --- Handle DRAG_DROP action ---
             elif action['type'] == 'drag_drop':
                 start_x, start_y = action['from']['x'], action['from']['y']
                 end_x, end_y = action['to']['x'], action['to']['y']
-                self.human_mouse_move(start_x, start_y)
-                pyautogui.mouseDown()
-                self.human_mouse_move(end_x, end_y)
-                pyautogui.mouseUp()
+                self.move_to_target(start_x, start_y)
+                with self.tracer.span('mouse_down', 'input'):
+                    self.backend.mouse_down()
+                if action.get('path'):
+                    self.follow_path(action['path']) # Recorded drag path, when motion was captured.
+                else:
+                    self.move_to_target(end_x, end_y)
+                with self.tracer.span('mouse_up', 'input'):
+                    self.backend.mouse_up()
                 logger.info(f"Performed drag_drop from ({start_x}, {start_y}) to ({end_x}, {end_y})")
+
+            # --- Handle MOUSE_PATH action (recorded hover) ---
+            elif action['type'] == 'mouse_path':
+                self.follow_path(action['path'])
+                logger.info(f"Followed mouse path of {len(action['path'])} points")
             
             # After a click action, add a very short random delay.
-            if action['type'] == 'click':
-                self.random_delay(0.1, 0.3)
+            if action['type'] == 'click' and not self.on_schedule:
+                self.random_delay(*CLICK_DELAY_AFTER)
                 
         except Exception as e:
             logger.error(f"Failed to execute action {idx}: {str(e)}")
             raise # Re-raise the exception to be handled by the caller.
+        finally:
+            self.frames.invalidate() # Input was sent; the next lookup needs a new frame.
 
     def close(self):
         """
@@ -359,19 +817,170 @@ class SequencePlayer(SeleniumBot):
     """
     Plays back a sequence of recorded desktop actions from a JSON file.
     """
-    def __init__(self, sequence_file):
+    def __init__(self, sequence_file, backend=None, tracer=None, progress_callback=None, registry=None):
         """
         Initializes the player.
 
         Args:
             sequence_file (str): The path to the JSON file containing the actions.
+            backend (InputBackend): Backend to replay through. Defaults to the real desktop.
+            tracer (Tracer): Optional timing tracer.
+            progress_callback (callable): Called after every action with a progress dict
+                                          (see _report_progress). Runs on the playback thread.
+            registry (SequenceRegistry): Compiled-sequence cache. Defaults to the
+                                         process-wide registry shared by all players.
         """
-        super().__init__()
-        self.sequence_data = self.load_sequence(sequence_file)
+        super().__init__(backend, tracer)
+        self._init_progress(progress_callback, registry)
+        self.sequence_file = sequence_file
+        self.reload()
         self.running = True
-        self.loop_counter = 0
         logger.info(f"Loaded sequence for playback: {sequence_file}")
 
+    def _init_progress(self, progress_callback, registry=None):
+        """Sets up the loop counters, progress reporting state and sequence registry."""
+        self.registry = registry or default_registry
+        self.progress_callback = progress_callback
+        self.loop_counter = 0          # Current loop (1-based while playing).
+        self.loop_total = 1            # Loops in the current run.
+        self.step_label = None         # Chain step description, if playing a chain.
+        self._run_started = None       # Clock time the current run started.
+        self._run_actions_done = 0     # Actions executed in the current run, across loops.
+        self.step_index = 0            # 0-based chain step being played (0 for single sequences).
+        self._profiles = LRUCache(PROFILE_CACHE_SIZE) # Sequence path -> (CompiledSequence, DelayProfile), for adaptive timing.
+        self.checkpoint = None         # Checkpoint told about every action (writes are throttled), if any.
+        self.last_error = None         # Exception that stopped the last play_sequence(), if any.
+
+    def _save_checkpoint(self, action):
+        """
+        Records that the next work is `action` of the current step and loop.
+        Loop ends are written right away; positions within a loop are throttled.
+        """
+        if self.checkpoint is None:
+            return
+        loop = self.loop_counter - 1
+        loop_done = action >= len(self.sequence_data['actions'])
+        if loop_done:
+            # Loop finished: point at the start of the next loop, or of the next step.
+            loop, action = loop + 1, 0
+        step = self.step_index
+        if loop >= self.loop_total:
+            step, loop = step + 1, 0
+        self.checkpoint.save(force=loop_done, step=step, loop=loop, action=action)
+
+    def _resume_position(self, checkpoint, resume):
+        """
+        Returns the (step, loop, action) to start from: the checkpoint's saved
+        position when resuming, otherwise the beginning.
+        """
+        self.checkpoint = checkpoint
+        if checkpoint is None or not resume:
+            return 0, 0, 0
+        position = checkpoint.load()
+        if not position:
+            logger.info("No checkpoint to resume from, starting from the beginning")
+            return 0, 0, 0
+        logger.info(f"Resuming from checkpoint {checkpoint.path}: step {position['step'] + 1}, "
+                    f"loop {position['loop'] + 1}, action {position['action']}")
+        return position['step'], position['loop'], position['action']
+
+    def reload(self):
+        """
+        Picks up edits to the sequence file. Cheap when nothing changed: the
+        registry only stats the file and its screenshots.
+        """
+        compiled = self.registry.get(self.sequence_file)
+        if compiled is not getattr(self, 'compiled', None):
+            logger.info(f"Sequence contains {len(compiled)} actions")
+            self.set_sequence(compiled)
+
+    def _profile_for(self, compiled):
+        """The delay profile of a compiled sequence (None for in-memory sequences)."""
+        if not compiled.path:
+            return None
+        cached = self._profiles.get(compiled.path)
+        if cached is None or cached[0] is not compiled: # Reload after the file was recompiled.
+            cached = self._profiles[compiled.path] = (compiled, DelayProfile(profile_path(compiled.path), compiled.actions))
+        return cached[1]
+
+    def set_sequence(self, compiled):
+        """
+        Makes a compiled sequence the one play_sequence() replays.
+
+        Args:
+            compiled (CompiledSequence): The sequence, with its screenshots resolved.
+        """
+        self.compiled = compiled
+        self.sequence_data = compiled.data
+        self.screenshot_paths = compiled.screenshot_paths
+
+    def begin_run(self, loop_total, step_label=None):
+        """
+        Starts a new run of `loop_total` loops, resetting the ETA bookkeeping.
+
+        Args:
+            loop_total (int): Number of loops the run will play.
+            step_label (str): Optional description of the chain step being played.
+        """
+        self.loop_counter = 0
+        self.loop_total = loop_total
+        self.step_label = step_label
+        self._run_started = self.backend.now()
+        self._run_actions_done = 0
+
+    def _report_progress(self, action_number, action_total):
+        """
+        Sends a progress update to the progress callback, if any.
+
+        The dict carries 'action'/'actions' (1-based position in the current loop),
+        'loop'/'loops', 'step' (chain step label or None) and 'eta' (seconds left in
+        the current run, from the average action time so far; None until known).
+        """
+        self._run_actions_done += 1
+        if self.progress_callback is None:
+            return
+        eta = None
+        if self._run_started is not None:
+            elapsed = self.backend.now() - self._run_started
+            remaining = (action_total - action_number) + max(0, self.loop_total - self.loop_counter) * action_total
+            eta = elapsed / self._run_actions_done * remaining
+        self.progress_callback({
+            'action': action_number, 'actions': action_total,
+            'loop': self.loop_counter, 'loops': self.loop_total,
+            'step': self.step_label, 'eta': eta,
+        })
+
+    def play(self, loop_count=1, extra_delay=0.0, checkpoint=None, resume=False):
+        """
+        Plays the loaded sequence several times in a row. The start delay is paid
+        once; `extra_delay` separates loops and is skipped after the last one.
+        The sequence is the one loaded when the player was created; a player
+        kept around between runs calls reload() first to pick up edits.
+
+        Args:
+            loop_count (int): Number of loops.
+            extra_delay (float): Seconds to wait between loops (0 for none).
+            checkpoint (Checkpoint): Progress file (None to play without one).
+            resume (bool): Continue from the checkpoint's position instead of the start.
+        """
+        _, start_loop, start_action = self._resume_position(checkpoint, resume)
+        self.begin_run(loop_count)
+        try:
+            for i in range(start_loop, loop_count):
+                self.loop_counter = i + 1
+                first = i == start_loop
+                self.play_sequence(start_delay=START_DELAY if first else 0,
+                                   start_action=start_action if first else 0)
+                if i < loop_count - 1:
+                    with self.tracer.span('extra_delay', 'delay'):
+                        self.backend.sleep(extra_delay)
+        finally:
+            if checkpoint is not None:
+                checkpoint.flush() # An interrupted run keeps its latest position.
+        if checkpoint is not None:
+            checkpoint.clear()
+        logger.info(f"Frame cache: {self.frames.stats()}")
+
     def load_sequence(self, filename):
         """
         Loads and validates the action sequence from a JSON file.
@@ -382,29 +991,64 @@ class SequencePlayer(SeleniumBot):
         Returns:
             dict: The parsed JSON data.
         """
-        with open(filename, 'r') as f:
-            data = json.load(f)
-        if "actions" not in data:
-            raise ValueError("Invalid sequence format: Missing actions")
+        data = read_sequence(filename)
         logger.info(f"Sequence contains {len(data['actions'])} actions")
         return data
 
-    def play_sequence(self):
+    def play_sequence(self, start_delay=START_DELAY, start_action=0):
         """
         Iterates through the loaded sequence and executes each action.
+
+        Args:
+            start_delay (float): Seconds to wait first, giving the user time to switch
+                                 to the target window. Loops after the first pass 0.
+            start_action (int): Index of the first action to play (when resuming).
+
+        Returns:
+            bool: True if every action ran, False if playback stopped on a failure.
         """
-        logger.info("Starting desktop playback")
-        time.sleep(2) # Give the user time to switch to the target window.
-        self.last_action_time = time.time()
+        self.log_context = {'sequence': self.compiled.name, 'loop': self.loop_counter}
+        logger.info("Starting desktop playback", extra=self.log_context)
+        if start_delay > 0:
+            with self.tracer.span('start_delay', 'delay'):
+                self.backend.sleep(start_delay) # Give the user time to switch to the target window.
+        self.last_action_time = self.backend.now()
+        self.schedule = None # Recorded timing restarts from each loop's first action.
+        self.profile = self._profile_for(self.compiled) if self.timing == 'adaptive' else None
+        if self.screen_hashes is not None:
+            self.screen_hashes.begin_loop(self.step_index, self.loop_counter)
+        if self.profiler is not None:
+            self.profiler.tag(self.compiled.name, self.loop_counter)
+        actions = self.sequence_data['actions']
+        completed = True
+        self.last_error = None
         # Loop through each action in the sequence.
-        for idx, action in enumerate(self.sequence_data['actions']):
+        for idx in range(start_action, len(actions)):
+            action = actions[idx]
             try:
                 # Use the execute_with_timing method from the base class.
                 self.execute_with_timing(idx, action)
             except Exception as e:
-                logger.error(f"Action {idx} failed: {str(e)}")
+                logger.error(f"Action {idx} failed: {str(e)}",
+                             extra={'action_index': idx, 'action_type': action.get('type'), **self.log_context})
+                if self.checkpoint is not None:
+                    self.checkpoint.record_failure(e, step=self.step_index, loop=self.loop_counter - 1, action=idx)
+                    # Saved (durably) with the loop-end position just below.
+                completed = False
+                self.last_error = e
                 break # Stop playback on failure.
-        logger.info("Playback completed")
+            self._save_checkpoint(idx + 1)
+            self._report_progress(idx + 1, len(actions))
+        if not completed:
+            # The loop is abandoned; the checkpoint moves on to the next loop.
+            self._save_checkpoint(len(actions))
+        if self.profile is not None:
+            self.profile.save()
+        self.metrics.loop_finished(completed)
+        if self.memory is not None:
+            self.memory.sample(f"{self.step_label or 'Sequence'}, loop {self.loop_counter}")
+        logger.info("Playback completed", extra=self.log_context)
+        return completed
 
 # --- Multi-Sequence Player Class ---
 
@@ -413,7 +1057,7 @@ class MultiSequencePlayer(SequencePlayer):
     Plays multiple sequences back-to-back, as defined in a chain configuration file.
     This allows for looping and chaining different automation tasks.
     """
-    def __init__(self, chain_config):
+    def __init__(self, chain_config, backend=None, tracer=None, progress_callback=None, registry=None):
         """
         Initializes the multi-sequence player.
 
@@ -421,91 +1065,430 @@ class MultiSequencePlayer(SequencePlayer):
             chain_config (list): A list of dictionaries, where each dictionary
                                  defines a sequence file to play, the number of loops,
                                  and any extra delay.
+            backend (InputBackend): Backend to replay through. Defaults to the real desktop.
+            tracer (Tracer): Optional timing tracer.
+            progress_callback (callable): Receives a progress dict after every action.
+            registry (SequenceRegistry): Compiled-sequence cache shared across runs.
         """
-        SeleniumBot.__init__(self) # Directly initialize the base class.
+        SeleniumBot.__init__(self, backend, tracer) # Directly initialize the base class.
+        self._init_progress(progress_callback, registry)
         self.chain_config = chain_config
-        logger.info(f"Loaded chain with {len(chain_config)} sequences")
+        # Validate the whole chain and compile each distinct sequence file once, up front.
+        self.plan = plan_chain(chain_config, loader=self.registry.get)
+        logger.info(f"Loaded chain with {len(chain_config)} sequences "
+                    f"({len(self.plan.sequences)} distinct files, {self.plan.total_actions} actions in total)")
 
-    def play_chain(self):
+    def play_chain(self, checkpoint=None, resume=False):
         """
         Executes the entire chain of sequences.
+        The start delay is paid once; each step's extra_delay is honored exactly
+        (including 0) between loops, and skipped after the very last loop.
+
+        Args:
+            checkpoint (Checkpoint): Progress file (None to play without one),
+                                     removed when the chain finishes.
+            resume (bool): Skip the work recorded as done in the checkpoint.
         """
+        # Re-plan through the registry: unchanged files are reused, edited ones recompiled.
+        self.plan = plan_chain(self.chain_config, loader=self.registry.get)
+        start_step, start_loop, start_action = self._resume_position(checkpoint, resume)
         logger.info("Starting chain playback")
-        time.sleep(2) # Initial delay.
-        # Iterate through each item in the chain configuration.
-        for item in self.chain_config:
-            seq_file = item['sequence_file']
-            loops = item['loop_count']
-            extra_delay = item.get('extra_delay', 1) # Delay between loops.
-            try:
-                # Load the sequence data for the current item.
-                with open(seq_file, 'r') as f:
-                    sequence_data = json.load(f)
+        with self.tracer.span('start_delay', 'delay'):
+            self.backend.sleep(START_DELAY) # Initial delay.
+        steps = self.plan.steps
+        try:
+            # Iterate through each step of the compiled plan.
+            for step_index, step in enumerate(steps):
+                if step_index < start_step:
+                    continue # Already done in the run being resumed.
+                resuming_step = step_index == start_step
+                self.step_index = step_index
+                seq_file = step.sequence.path
+                loops = step.loop_count
                 logger.info(f"Playing {seq_file} for {loops} loops")
-            except Exception as e:
-                logger.error(f"Failed to load {seq_file}: {str(e)}")
-                continue # Skip to the next item in the chain if loading fails.
-            
-            # Play the loaded sequence for the specified number of loops.
-            for i in range(loops):
-                logger.info(f"Loop {i+1}/{loops}")
-                self.sequence_data = sequence_data # Set the current sequence for the player.
-                self.play_sequence() # Call the inherited play_sequence method.
-                time.sleep(max(1, extra_delay)) # Wait before the next loop or sequence.
+                self.set_sequence(step.sequence) # Already parsed and compiled by the planner.
+
+                # Play the loaded sequence for the specified number of loops.
+                self.begin_run(loops, step_label=f"Step {step.position}/{len(self.chain_config)}: {os.path.basename(seq_file)}")
+                for i in range(start_loop if resuming_step else 0, loops):
+                    logger.info(f"Loop {i+1}/{loops}")
+                    self.loop_counter = i + 1
+                    first_action = start_action if resuming_step and i == start_loop else 0
+                    self.play_sequence(start_delay=0, start_action=first_action) # Call the inherited play_sequence method.
+                    last_loop = step is steps[-1] and i == loops - 1
+                    if not last_loop and step.extra_delay > 0:
+                        with self.tracer.span('extra_delay', 'delay'):
+                            self.backend.sleep(step.extra_delay) # Wait before the next loop or sequence.
+        finally:
+            if checkpoint is not None:
+                checkpoint.flush() # An interrupted chain keeps its latest position.
+        if checkpoint is not None:
+            checkpoint.clear()
+        logger.info(f"Frame cache: {self.frames.stats()}")
         logger.info("Chain playback completed")
 
 
+# --- Batch Player Class ---
+
+class BatchPlayer(SequencePlayer):
+    """
+    Replays one sequence once per record of a CSV file, filling the {{column}}
+    placeholders of its actions from each row (see batch.py). The sequence is
+    compiled once; each row only copies the actions that contain placeholders.
+    """
+    def __init__(self, sequence_file, data_file, backend=None, tracer=None, progress_callback=None, registry=None):
+        """
+        Args:
+            sequence_file (str): Sequence with placeholders.
+            data_file (str): CSV file with one record per row and a column per placeholder.
+            backend (InputBackend): Backend to replay through. Defaults to the real desktop.
+            tracer (Tracer): Optional timing tracer.
+            progress_callback (callable): Receives a progress dict after every action.
+            registry (SequenceRegistry): Compiled-sequence cache shared across runs.
+        """
+        SequencePlayer.__init__(self, sequence_file, backend, tracer, progress_callback, registry)
+        self.data_file = data_file
+        self.template = SequenceTemplate(self.compiled)
+        self.template.check_columns(read_columns(data_file), source=data_file)
+        logger.info(f"Batch template uses {len(self.template.placeholders)} columns: {', '.join(self.template.placeholders)}")
+
+    def play_batch(self, extra_delay=0.0, checkpoint=None, resume=False, output=None):
+        """
+        Plays the sequence for every row, from the first unprocessed one when
+        resuming. A failed row is recorded and the batch moves on to the next.
+
+        Args:
+            extra_delay (float): Seconds to wait between rows.
+            checkpoint (Checkpoint): Holds the next row to process; removed when the batch finishes.
+            resume (bool): Start at the checkpoint's row and append to the existing results.
+            output (str): Per-row results CSV (default: <data>.results.csv).
+
+        Returns:
+            BatchResults: Counts of succeeded and failed rows (the file is closed).
+        """
+        start_row = 0
+        if checkpoint is not None and resume:
+            position = checkpoint.load()
+            if position:
+                start_row = position['row']
+                logger.info(f"Resuming batch from checkpoint {checkpoint.path} at row {start_row + 1}")
+        total = count_rows(self.data_file)
+        results = BatchResults(output or results_path(self.data_file), append=resume)
+        logger.info(f"Starting batch of {total - start_row} rows from {self.data_file} (results: {results.path})")
+        self.begin_run(total)
+        self.loop_counter = start_row
+        started = self.backend.now()
+        template_data = self.sequence_data
+        try:
+            for row_index, row in read_rows(self.data_file, start_row):
+                if row_index > start_row and extra_delay > 0:
+                    with self.tracer.span('extra_delay', 'delay'):
+                        self.backend.sleep(extra_delay)
+                self.loop_counter = row_index + 1
+                self.step_label = f"Row {row_index + 1}/{total}"
+                row_started = self.backend.now()
+                try:
+                    actions = self.template.bind(row)
+                except RowValueError as e:
+                    logger.error(f"Row {row_index + 1}: {e}")
+                    self.last_error = e  # Not played; recorded as failed like any other row.
+                else:
+                    self.sequence_data = dict(template_data, actions=actions)
+                    try:
+                        self.play_sequence(start_delay=START_DELAY if row_index == start_row else 0)
+                    finally:
+                        self.sequence_data = template_data
+                results.add(row_index + 1, self.last_error, self.backend.now() - row_started)
+                if checkpoint is not None:
+                    if self.last_error is not None:
+                        checkpoint.record_failure(self.last_error, row=row_index)
+                    # Rows are whole sequences with side effects in the target app, so every
+                    # row is written durably: a resume must never replay a finished row.
+                    checkpoint.save(force=True, row=row_index + 1)
+                done = results.succeeded + results.failed
+                rate = done / max(self.backend.now() - started, 1e-9) * 60
+                logger.info(f"Row {row_index + 1}/{total} {'ok' if self.last_error is None else 'failed'} "
+                            f"({done} done, {results.failed} failed, {rate:.1f} rows/min)")
+        finally:
+            results.close()
+        if checkpoint is not None:
+            checkpoint.clear()
+        elapsed = self.backend.now() - started
+        done = results.succeeded + results.failed
+        logger.info(f"Batch completed: {results.succeeded} ok, {results.failed} failed in {elapsed:.1f}s "
+                    f"({done / max(elapsed, 1e-9) * 60:.1f} rows/min)")
+        return results
+
+
 # --- Main Execution Block ---
 
+def build_backend(args):
+    """
+    Creates the input backend selected on the command line.
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+
+    Returns:
+        InputBackend: The real desktop backend, or a simulator sized by --screen.
+    """
+    if args.backend == "simulator":
+        width, height = (int(v) for v in args.screen.lower().split('x'))
+        return create_backend("simulator", width=width, height=height, seed=args.seed)
+    return create_backend("pyautogui")
+
+
 if __name__ == "__main__":
     """
     This is the entry point of the script when run from the command line.
-    It parses command-line arguments to determine whether to record, play a single
-    sequence, or play a chain of sequences.
+    It parses command-line arguments to determine whether to play a single
+    sequence, play a chain of sequences, or estimate how long either would take.
     
     Usage:
-        python player.py record <output_file.json>
-        python player.py play <input_file.json>
-        python player.py chain <chain_config.json>
+        python player.py play <input_file.json> [--loops N] [--checkpoint [PATH]] [--resume] [--backend simulator] [--trace trace.json]
+        python player.py chain <chain_config.json> [--resume] [--backend simulator] [--trace trace.json] [--memory-report] [--profile]
+        python player.py estimate <input_file.json | chain_config.json> [--loops N] [--json]
+        python player.py convert <input_file.json | input_file.atseq> [--output PATH]
+        python player.py library <directory> [--workers N] [--prune] [--output index.json] [--json]
+        python player.py compare <baseline.hashes.json> <run.hashes.json> [--json]
+        python player.py batch <input_file.json> <data.csv> [--resume] [--extra-delay S] [--output results.csv]
     """
-    # Check for the minimum number of arguments.
-    if len(sys.argv) < 2:
-        print("Usage: python script.py <mode> <file>")
-        print("Modes: play, chain")
-        sys.exit(1)
-        
-    mode = sys.argv[1]
-    file = sys.argv[2] if len(sys.argv) > 2 else None
-    
+    parser = argparse.ArgumentParser(description="Replay recorded desktop sequences.")
+    parser.add_argument("mode", choices=["play", "chain", "estimate", "convert", "batch", "library", "compare"],
+                        help="play a single sequence, a chain of sequences, estimate replay time, "
+                             "convert a sequence between JSON and the binary format, "
+                             "play a sequence once per row of a CSV file, check a whole sequence library, "
+                             "or find where two runs' screen hashes first diverge")
+    parser.add_argument("file", help="sequence file (play, batch) or chain config file (chain); either for estimate; "
+                                     "directory for library; baseline screen hashes for compare")
+    parser.add_argument("data", nargs="?",
+                        help="batch: CSV file with a header and one record per row, filling {{column}} placeholders; "
+                             "compare: screen hashes of the run to check")
+    parser.add_argument("--backend", choices=["pyautogui", "simulator"], default="pyautogui",
+                        help="replay on the real desktop or headlessly against the in-memory simulator")
+    parser.add_argument("--screen", default="1920x1080",
+                        help="simulator framebuffer size as WIDTHxHEIGHT (default: 1920x1080)")
+    parser.add_argument("--seed", type=int, default=0, help="simulator random seed (default: 0)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="record per-action timings and write a Chrome trace / Perfetto JSON file")
+    parser.add_argument("--timing", choices=TIMING_MODES, default="humanized",
+                        help="humanized random delays (default), or replay each action at its recorded time")
+    parser.add_argument("--merge-scrolls", action="store_true",
+                        help="replay each scroll burst as a single scroll call instead of notch by notch")
+    parser.add_argument("--frame-max-age", type=float, default=FRAME_MAX_AGE,
+                        help=f"seconds a screen capture may be reused by template lookups (default: {FRAME_MAX_AGE})")
+    parser.add_argument("--verify-clicks", action="store_true",
+                        help=f"check that each click changes the screen within {VERIFY_WINDOW}s; on a miss, "
+                             f"re-locate once, then abort the loop and save a frame to {DIAGNOSTICS_DIR}/")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics at http://HOST:PORT/metrics while playing (off by default)")
+    parser.add_argument("--metrics-host", default=METRICS_HOST,
+                        help=f"interface for the metrics endpoint (default: {METRICS_HOST}, local scrapers only)")
+    parser.add_argument("--screen-hashes", metavar="PATH",
+                        help="record a perceptual hash of the screen every --hash-every actions to PATH, "
+                             "for comparing runs with the compare mode")
+    parser.add_argument("--hash-every", type=int, default=HASH_EVERY,
+                        help=f"actions between screen hash checkpoints (default: {HASH_EVERY})")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the replay: writes <name>_<time>.pstats (cProfile) and .collapsed "
+                             "(sampled stacks per sequence and loop, for flamegraphs)")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR,
+                        help=f"directory for --profile output (default: {PROFILE_DIR})")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="track allocations with tracemalloc and log per-loop memory growth and top allocators")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run from its checkpoint instead of starting over "
+                             "(also keeps a checkpoint for this run)")
+    parser.add_argument("--checkpoint", metavar="PATH", nargs="?", const="",
+                        help="keep a progress checkpoint so the run can be resumed, optionally at PATH "
+                             "(default: checkpoints/<kind>_<config hash>.json); off unless this or --resume is given")
+    log_group = parser.add_argument_group("logging options")
+    log_group.add_argument("--log-file", default="automation.log", help="log file path (default: automation.log)")
+    log_group.add_argument("--log-format", choices=["text", "json"], default="text",
+                           help="plain text or JSON lines with action index, type, duration and confidence")
+    log_group.add_argument("--log-max-bytes", type=int, default=10 * 1024 * 1024,
+                           help="rotate the log file at this size (default: 10 MiB)")
+    log_group.add_argument("--log-backups", type=int, default=5, help="rotated log files to keep (default: 5)")
+    log_group.add_argument("--log-rotate-when", metavar="WHEN",
+                           help="rotate by time instead of size, e.g. 'midnight' or 'H'")
+    loop_group = parser.add_argument_group("loop options (play and estimate of a single sequence; --extra-delay also separates batch rows)")
+    loop_group.add_argument("--loops", type=int, default=1, help="loops of a single sequence (default: 1)")
+    loop_group.add_argument("--extra-delay", type=float, default=0.0,
+                            help="delay between loops of a single sequence (default: 0)")
+    estimate_group = parser.add_argument_group("estimate options")
+    estimate_group.add_argument("--pause", type=float, default=0.1,
+                                help="seconds charged per input call, like pyautogui.PAUSE (default: 0.1)")
+    estimate_group.add_argument("--locate-cost", type=float, default=0.0,
+                                help="seconds charged per template lookup (default: 0)")
+    estimate_group.add_argument("--per-action", action="store_true", help="list every action of a sequence")
+    estimate_group.add_argument("--json", action="store_true", help="print the estimate (or library or compare report) as JSON")
+    library_group = parser.add_argument_group("library options")
+    library_group.add_argument("--workers", type=int, help="worker processes for library checks (default: one per CPU)")
+    library_group.add_argument("--prune", action="store_true",
+                               help="delete screenshots in 'screenshots' directories that no sequence references "
+                                    "(refused while any reference is unresolved)")
+    parser.add_argument("--output", metavar="PATH",
+                        help=f"convert: destination file (default: the input with .json and {BINARY_EXTENSION} swapped); "
+                             "batch: per-row results CSV (default: <data>.results.csv); "
+                             "library: JSON index of every file checked")
+    args = parser.parse_args()
+    setup_logging(log_file=args.log_file, structured=args.log_format == "json",
+                  max_bytes=args.log_max_bytes, backup_count=args.log_backups,
+                  rotate_when=args.log_rotate_when)
+    tracer = Tracer(enabled=bool(args.trace))
+    memory = MemoryTracker() if args.memory_report and args.mode in ("play", "chain", "batch") else None
+    checkpointing = args.resume or args.checkpoint is not None  # Checkpoint writes cost time; only when asked for.
+    if memory is not None:
+        memory.start() # Before the player exists, so loading the sequences is accounted for.
+    screen_hashes = None
+    if args.screen_hashes and args.mode in ("play", "chain", "batch"):
+        screen_hashes = ScreenHashRecorder(args.screen_hashes, every=args.hash_every,
+                                           metadata={'mode': args.mode, 'file': args.file, 'data': args.data})
+    profiler = None
+    if args.profile and args.mode in ("play", "chain", "batch"):
+        name = os.path.splitext(os.path.basename(args.file))[0]
+        profiler = RunProfiler(profile_prefix(name, args.profile_dir)).start() # Covers loading the sequences too.
+    metrics = PlayerMetrics(enabled=args.metrics_port is not None)
+    metrics_server = None
+    if metrics.enabled and args.mode in ("play", "chain", "batch"):
+        metrics_server = MetricsServer(metrics, host=args.metrics_host, port=args.metrics_port).start()
+        logger.info(f"Serving metrics at http://{args.metrics_host}:{metrics_server.port}/metrics")
+
+    # --- ESTIMATE MODE (dry run, never touches the screen) ---
+    if args.mode == "estimate":
+        from estimator import estimate_file, format_report
+        try:
+            report = estimate_file(args.file, loops=args.loops, extra_delay=args.extra_delay,
+                                   pause=args.pause, locate_cost=args.locate_cost,
+                                   timing=args.timing, verify=args.verify_clicks)
+        except Exception as e:
+            print(f"Estimate failed: {e}")
+            sys.exit(1)
+        print(json.dumps(report, indent=4) if args.json else format_report(report, per_action=args.per_action))
+        sys.exit(0)
+
+    # --- LIBRARY MODE (validate a directory tree of sequences in parallel) ---
+    if args.mode == "library":
+        from library import scan_library, write_index, format_report as format_library_report
+        try:
+            report = scan_library(args.file, workers=args.workers, prune=args.prune)
+            if args.output:
+                write_index(report, args.output)
+        except Exception as e:
+            print(f"Library check failed: {e}")
+            sys.exit(1)
+        print(json.dumps(report['totals'], indent=4) if args.json else format_library_report(report))
+        sys.exit(1 if report['totals']['invalid'] or report['totals']['missing_screenshots'] else 0)
+
+    # --- COMPARE MODE (first divergence between two runs' screen hashes) ---
+    if args.mode == "compare":
+        from screenhash import load_hashes, diff_runs, format_diff
+        if not args.data:
+            parser.error("compare mode needs two screen hash files")
+        try:
+            baseline = load_hashes(args.file)
+            diff = diff_runs(baseline, load_hashes(args.data))
+        except Exception as e:
+            print(f"Comparison failed: {e}")
+            sys.exit(2)
+        print(json.dumps(diff, indent=4) if args.json else format_diff(diff, every=baseline.get('every')))
+        sys.exit(0 if diff['first_divergence'] is None else 1)
+
+    # --- CONVERT MODE (JSON <-> binary, lossless) ---
+    if args.mode == "convert":
+        source_is_binary = is_binary_sequence(args.file)
+        output = args.output or os.path.splitext(args.file)[0] + (".json" if source_is_binary else BINARY_EXTENSION)
+        try:
+            convert_sequence(args.file, output)
+        except Exception as e:
+            print(f"Conversion failed: {e}")
+            sys.exit(1)
+        print(f"Wrote {output} ({os.path.getsize(args.file)} -> {os.path.getsize(output)} bytes)")
+        sys.exit(0)
+
     try:
+        backend = build_backend(args)
+        tracer.clock = backend.now  # Spans follow the backend's timeline (virtual time in the simulator).
+
         # --- PLAY MODE ---
-        if mode == "play":
-            if not file:
-                print("Sequence file required for playback")
-                sys.exit(1)
-            player = SequencePlayer(sequence_file=file)
-            player.play_sequence()
+        if args.mode == "play":
+            player = SequencePlayer(sequence_file=args.file, backend=backend, tracer=tracer)
+            player.timing = args.timing
+            player.merge_scrolls = args.merge_scrolls
+            player.frames.max_age = args.frame_max_age
+            player.memory = memory
+            player.metrics = metrics
+            player.screen_hashes = screen_hashes
+            player.profiler = profiler
+            player.verify_clicks = args.verify_clicks
+            if backend.name == "simulator":
+                backend.stage_sequence(player.sequence_data['actions'])
+            checkpoint = None
+            if checkpointing:
+                checkpoint = Checkpoint(config_key({'sequence_file': args.file, 'loop_count': args.loops,
+                                                    'extra_delay': args.extra_delay}),
+                                        path=args.checkpoint, kind='sequence')
+            player.play(args.loops, args.extra_delay, checkpoint=checkpoint, resume=args.resume)
             
         # --- CHAIN MODE ---
-        elif mode == "chain":
-            if not file:
-                print("Chain config file required")
-                sys.exit(1)
-            with open(file) as f:
+        elif args.mode == "chain":
+            with open(args.file) as f:
                 chain_config = json.load(f)
-            player = MultiSequencePlayer(chain_config=chain_config)
-            player.play_chain()
-            
-        # --- INVALID MODE ---
-        else:
-            print(f"Invalid mode: {mode}")
-            sys.exit(1)
+            player = MultiSequencePlayer(chain_config=chain_config, backend=backend, tracer=tracer)
+            player.timing = args.timing
+            player.merge_scrolls = args.merge_scrolls
+            player.frames.max_age = args.frame_max_age
+            player.memory = memory
+            player.metrics = metrics
+            player.screen_hashes = screen_hashes
+            player.profiler = profiler
+            player.verify_clicks = args.verify_clicks
+            if backend.name == "simulator":
+                for compiled in player.plan.sequences.values():
+                    backend.stage_sequence(compiled.actions)
+            checkpoint = Checkpoint(config_key(chain_config), path=args.checkpoint) if checkpointing else None
+            player.play_chain(checkpoint=checkpoint, resume=args.resume)
+
+        # --- BATCH MODE (one replay per CSV row) ---
+        elif args.mode == "batch":
+            if not args.data:
+                parser.error("batch mode needs a data CSV file")
+            player = BatchPlayer(sequence_file=args.file, data_file=args.data, backend=backend, tracer=tracer)
+            player.timing = args.timing
+            player.merge_scrolls = args.merge_scrolls
+            player.frames.max_age = args.frame_max_age
+            player.memory = memory
+            player.metrics = metrics
+            player.screen_hashes = screen_hashes
+            player.profiler = profiler
+            player.verify_clicks = args.verify_clicks
+            if backend.name == "simulator":
+                for _, row in read_rows(args.data, chunksize=1):
+                    backend.stage_sequence(player.template.bind(row)) # Targets of the first record.
+                    break
+            checkpoint = None
+            if checkpointing:
+                checkpoint = Checkpoint(config_key({'sequence_file': args.file, 'data_file': os.path.abspath(args.data)}),
+                                        path=args.checkpoint, kind='batch')
+            player.play_batch(args.extra_delay, checkpoint=checkpoint, resume=args.resume, output=args.output)
             
-    except Exception as e:
+    except Exception:
         # Log any fatal error that occurs during execution.
         logger.exception("Fatal error during execution")
         sys.exit(1)
         
     finally:
         # This block runs whether an error occurred or not.
-        pass # No cleanup needed as no browser is opened.
+        if args.trace:
+            tracer.export_chrome_trace(args.trace)
+            logger.info(f"Trace written to {args.trace}\n{tracer.summary()}")
+        if memory is not None:
+            logger.info(memory.report())
+            memory.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if profiler is not None:
+            pstats_path, collapsed_path = profiler.stop()
+            logger.info(f"Profile written to {pstats_path} and {collapsed_path}\n{profiler.summary()}")
+        if screen_hashes is not None:
+            logger.info(f"Screen hashes written to {screen_hashes.save()} ({len(screen_hashes.entries)} checkpoints)")
@@ -0,0 +1,110 @@
+
+# profiles.py
+
+"""
+Learned per-action timing profiles for adaptive playback.
+
+In 'adaptive' timing the player waits before each action until the screen has
+settled, instead of for a fixed guess, and records how long that took. The
+observations are kept per sequence, per action, in a small JSON file next to
+the sequence (<name>.profile.json). On later runs the wait before an action is
+capped at its learned latency plus a safety margin, so a sequence speeds up the
+more it runs, while a UI that becomes slower pushes the learned value back up.
+"""
+
+import json                         # Profile file format.
+import os                           # Profile paths.
+from sequences import action_values, atomic_write_json
+
+PROFILE_VERSION = 1
+EWMA_ALPHA = 0.3            # Weight of the newest observation in the moving average.
+SAFETY_MARGIN = 0.15        # Seconds added on top of the learned latency.
+SAFETY_FACTOR = 1.5         # The learned average is also scaled by this much.
+MIN_SAMPLES = 2             # Observations needed before the learned budget is used.
+
+
+def profile_path(sequence_path):
+    """Where the profile of a sequence file lives: next to it, as <name>.profile.json."""
+    return os.path.splitext(sequence_path)[0] + '.profile.json'
+
+
+class DelayProfile:
+    """
+    Observed UI response times for one sequence.
+
+    Each action index keeps a sample count, an exponentially weighted average and
+    the largest recent observation. Entries are tied to the action type at that
+    index, so a profile of an edited sequence never applies to a different step.
+    """
+    def __init__(self, path, actions):
+        """
+        Args:
+            path (str): Profile file (see profile_path()).
+            actions (list): The sequence's actions, used to match saved entries.
+        """
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self._types = action_values(actions, 'type')
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('version') != PROFILE_VERSION or state.get('actions') != len(self._types):
+            return  # Different format or the sequence changed length: start over.
+        for key, entry in state.get('entries', {}).items():
+            idx = int(key)
+            if idx < len(self._types) and entry.get('type') == self._types[idx]:
+                self.entries[idx] = entry
+
+    def budget(self, idx, default):
+        """
+        Maximum time to wait for the screen to settle before action `idx`.
+
+        Args:
+            idx (int): Action index.
+            default (float): Wait to use while there is not enough history.
+
+        Returns:
+            float: The learned latency plus the safety margin, never above `default`.
+        """
+        entry = self.entries.get(idx)
+        if entry is None or entry['samples'] < MIN_SAMPLES:
+            return default
+        learned = max(entry['ewma'] * SAFETY_FACTOR, entry['max']) + SAFETY_MARGIN
+        return min(default, learned)
+
+    def observe(self, idx, latency, settled):
+        """
+        Records how long the screen took to settle before action `idx`.
+
+        Args:
+            idx (int): Action index.
+            latency (float): Seconds until the screen was stable (or the budget, if not).
+            settled (bool): False when the wait hit its budget; such samples only
+                            count if they raise the estimate, never lower it.
+        """
+        entry = self.entries.get(idx)
+        if entry is None:
+            entry = self.entries[idx] = {'type': self._types[idx], 'samples': 0, 'ewma': latency, 'max': latency}
+        elif settled or latency > entry['ewma']:
+            entry['ewma'] += EWMA_ALPHA * (latency - entry['ewma'])
+            # The max decays slowly so one old outlier does not pin the budget forever.
+            entry['max'] = max(latency, entry['max'] * (1 - EWMA_ALPHA / 3))
+        entry['samples'] += 1
+        self.dirty = True
+
+    def save(self):
+        """Writes the profile (atomically) if anything changed."""
+        if not self.dirty:
+            return
+        atomic_write_json(self.path, {
+            'version': PROFILE_VERSION,
+            'actions': len(self._types),
+            'entries': {str(idx): entry for idx, entry in sorted(self.entries.items())},
+        }, indent=None, fsync=False)
+        self.dirty = False
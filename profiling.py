@@ -0,0 +1,125 @@
+
+# profiling.py
+
+"""
+Built-in profiler for replays.
+
+RunProfiler profiles the thread that plays a sequence in two ways at once:
+
+- cProfile, written as a .pstats file (open it with `python -m pstats`,
+  snakeviz or similar). It sees C functions too, such as cv2.matchTemplate,
+  PIL decoding and time.sleep.
+- A sampling thread that records the replay thread's Python stack every few
+  milliseconds. The samples are written as a .collapsed file (one
+  "frame;frame;frame count" line per distinct stack), ready for flamegraph.pl,
+  speedscope or inferno. Every stack is rooted at the sequence name and loop
+  being played, so slow loops and slow sequences stand out.
+
+Profile only while investigating: cProfile slows Python-heavy code down noticeably
+(sleep- and capture-bound replays much less so).
+"""
+
+import cProfile                     # Deterministic profile (.pstats).
+import collections                  # Collapsed stack counts.
+import io                           # pstats summary text.
+import os                           # Output paths and frame labels.
+import pstats                       # Summary of the cProfile data.
+import sys                          # sys._current_frames() for sampling.
+import threading                    # Sampling thread.
+import time                         # Output file timestamps.
+
+PROFILE_DIR = 'profiles'
+SAMPLE_INTERVAL = 0.005             # Seconds between stack samples.
+SUMMARY_LINES = 20                  # Functions listed in summary().
+
+
+def profile_prefix(name, directory=PROFILE_DIR):
+    """Output path prefix for a run: <directory>/<name>_<timestamp> (extensions are added)."""
+    return os.path.join(directory, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}")
+
+
+def _frame_label(code):
+    """module-ish file name and function, e.g. 'player.py:locate' or 'pyscreeze/__init__.py:locate'."""
+    path = code.co_filename.replace('\\', '/')
+    marker = path.rfind('-packages/')
+    short = path[marker + len('-packages/'):] if marker >= 0 else os.path.basename(path)
+    return f"{short}:{code.co_name}"
+
+
+class RunProfiler:
+    """
+    Profiles one replay thread. start() and stop() must be called from that thread.
+    """
+    def __init__(self, prefix, interval=SAMPLE_INTERVAL):
+        """
+        Args:
+            prefix (str): Output path without extension (see profile_prefix()).
+            interval (float): Seconds between stack samples.
+        """
+        self.prefix = prefix
+        self.interval = interval
+        self.stacks = collections.Counter()  # Collapsed stack -> sample count.
+        self.samples = 0
+        self._tag = 'startup'
+        self._labels = {}  # Code object -> frame label (computed once).
+        self._profile = cProfile.Profile()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._thread_id = None
+
+    def tag(self, sequence, loop):
+        """Roots the following samples at the sequence and loop being played."""
+        self._tag = f"{sequence};loop {loop}"
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+        return self
+
+    def _sample(self):
+        labels = self._labels
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                stack.append(self._tag)
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self):
+        """
+        Stops profiling and writes <prefix>.pstats and <prefix>.collapsed.
+
+        Returns:
+            tuple: (pstats path, collapsed stacks path).
+        """
+        self._profile.disable()
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        pstats_path, collapsed_path = self.prefix + '.pstats', self.prefix + '.collapsed'
+        self._profile.dump_stats(pstats_path)
+        with open(collapsed_path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        return pstats_path, collapsed_path
+
+    def summary(self, lines=SUMMARY_LINES):
+        """The functions with the most cumulative time, as pstats prints them."""
+        out = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=out)
+        stats.sort_stats('cumulative').print_stats(lines)
+        return f"Profile: {self.samples} stack samples\n{out.getvalue()}"
@@ -1,18 +1,431 @@
 # recorder.py
 from pynput import mouse, keyboard
 import time
-import json
 import pyautogui
 import os
+import sys
+import uuid
+import queue
+import threading
+import cv2
+import numpy as np
+from sequences import write_sequence
+from tracing import Histogram
+
+MOTION_TOLERANCE = 3.0  # Max deviation (pixels) of a simplified mouse path from the real one
+MOTION_CHUNK = 256      # Raw points buffered before they are simplified
+
+
+def simplify_path(points, tolerance):
+    """
+    Ramer–Douglas–Peucker simplification of a polyline (iterative, no recursion limit).
+
+    Args:
+        points (list): [x, y, t] points.
+        tolerance (float): Max distance in pixels between a dropped point and the kept line.
+
+    Returns:
+        list: The kept points, always including the first and last.
+    """
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = points[first][0], points[first][1]
+        x2, y2 = points[last][0], points[last][1]
+        dx, dy = x2 - x1, y2 - y1
+        length = (dx * dx + dy * dy) ** 0.5
+        max_dist, index = 0.0, None
+        for i in range(first + 1, last):
+            px, py = points[i][0], points[i][1]
+            if length:
+                dist = abs(dy * px - dx * py + x2 * y1 - y2 * x1) / length
+            else:
+                dist = ((px - x1) ** 2 + (py - y1) ** 2) ** 0.5
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if index is not None and max_dist > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+class PathCapture:
+    """
+    Online mouse path simplifier. Points closer than the tolerance to the last
+    accepted one are dropped as they arrive; the rest are buffered and simplified
+    with RDP every MOTION_CHUNK points, so memory and CPU stay bounded even at
+    1 kHz mouse rates.
+    """
+    def __init__(self, tolerance=MOTION_TOLERANCE, chunk=MOTION_CHUNK):
+        self.tolerance = tolerance
+        self.chunk = chunk
+        self.reset()
+
+    def reset(self):
+        self.kept = []        # Simplified points from completed chunks
+        self.pending = []     # Points not yet simplified
+        self.last_raw = None  # Most recent raw point (the path's true end)
+        self.path_start = None  # Time of the first point of the path last returned by take()
+        self.raw_count = 0
+
+    def add(self, x, y, t):
+        self.raw_count += 1
+        self.last_raw = [x, y, t]
+        if self.pending:
+            px, py = self.pending[-1][0], self.pending[-1][1]
+            if (x - px) ** 2 + (y - py) ** 2 < self.tolerance ** 2:
+                return
+        self.pending.append([x, y, t])
+        if len(self.pending) >= self.chunk:
+            simplified = simplify_path(self.pending, self.tolerance)
+            self.kept.extend(simplified[:-1])
+            self.pending = simplified[-1:]  # The chunk's end starts the next chunk
+
+    def take(self):
+        """
+        Returns the simplified path as [x, y, seconds since its first point]
+        (empty when fewer than 2 points were seen) and starts a new one.
+        """
+        points = self.pending
+        if self.last_raw is not None and (not points or points[-1] != self.last_raw):
+            points = points + [self.last_raw]
+        path = self.kept + simplify_path(points, self.tolerance)
+        self.reset()
+        if len(path) < 2:
+            return []
+        start = self.path_start = path[0][2]
+        return [[x, y, round(t - start, 3)] for x, y, t in path]
+
+
+CLICK_CROP_SIZE = 60            # Side of the click screenshot saved right away
+TEMPLATE_SIZES = (60, 90, 120, 160, 200)  # Crop sides tried by the quality check, smallest first
+TEMPLATE_MIN_TEXTURE = 6.0      # Grey-level standard deviation below which a crop is too flat to match
+TEMPLATE_MAX_RUNNER_UP = 0.85   # Best match score allowed anywhere else on the screen
+TEMPLATE_CHECK_BACKLOG = 8      # Clicks waiting for a check beyond which new clicks are not checked
+
+
+def centered_crop(frame, x, y, size):
+    """
+    The square of side `size` centered on (x, y), shrunk near the screen edges so
+    that (x, y) stays its center (replay clicks the center of the match).
+    None when the point is too close to an edge for a useful crop.
+    """
+    height, width = frame.shape[:2]
+    half = min(size // 2, x, y, width - x, height - y)
+    if half < 8:
+        return None
+    return frame[y - half:y + half, x - half:x + half]
+
+
+def runner_up_score(frame, crop):
+    """
+    Best match score of `crop` on `frame` away from its best match: how strongly
+    something else on the screen could be mistaken for it.
+    """
+    scores = np.nan_to_num(cv2.matchTemplate(frame, crop, cv2.TM_CCOEFF_NORMED))
+    _, _, _, (best_x, best_y) = cv2.minMaxLoc(scores)
+    height, width = crop.shape[:2]
+    # Positions overlapping the best match by more than half are the same element.
+    scores[max(0, best_y - height // 2):best_y + height // 2 + 1,
+           max(0, best_x - width // 2):best_x + width // 2 + 1] = -1
+    return float(scores.max())
+
+
+def assess_template(frame, x, y, sizes=TEMPLATE_SIZES):
+    """
+    Picks the smallest crop around a click that is both textured and unique on
+    the screen, growing it until it is.
+
+    Args:
+        frame (np.ndarray): BGR capture of the whole screen at the time of the click.
+        x, y (int): Click position.
+        sizes (tuple): Crop sides to try, smallest first.
+
+    Returns:
+        tuple: (crop, quality) where quality is {'size', 'texture', 'runner_up',
+               'distinct'}; the largest crop with distinct=False if none qualifies.
+               (None, None) when the click is too close to the screen edge.
+    """
+    chosen, quality = None, None
+    for size in sizes:
+        crop = centered_crop(frame, x, y, size)
+        if crop is None or (chosen is not None and crop.shape == chosen.shape):
+            break  # Too close to the edge, or clamped by it: growing changes nothing.
+        texture = float(cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY).std())
+        runner_up = runner_up_score(frame, crop) if texture >= TEMPLATE_MIN_TEXTURE else None
+        chosen = crop
+        quality = {
+            'size': crop.shape[1],
+            'texture': round(texture, 1),
+            'runner_up': None if runner_up is None else round(runner_up, 3),
+            'distinct': runner_up is not None and runner_up <= TEMPLATE_MAX_RUNNER_UP,
+        }
+        if quality['distinct']:
+            break
+    return chosen, quality
+
+
+class TemplateChecker:
+    """
+    Checks click screenshots on a background thread, right after capture.
+
+    Each check looks at the full-screen frame captured at the click. A crop that
+    is flat or that matches elsewhere on the screen is grown until it is
+    distinctive, and the screenshot file is rewritten. If no size works, the
+    action is flagged ('template_quality': {'distinct': False, ...}), and replay
+    goes straight to the recorded coordinates instead of running a lookup that
+    is likely to be slow or wrong.
+    """
+    def __init__(self, max_backlog=TEMPLATE_CHECK_BACKLOG):
+        self.max_backlog = max_backlog
+        self._queue = queue.Queue()
+        self._thread = None
+        self.checked = 0
+        self.grown = 0
+        self.ambiguous = 0
+        self.skipped = 0  # Clicks not checked because the backlog was full (frames are large)
+
+    def submit(self, action, frame, x, y):
+        """Queues the check of a click action's screenshot. Returns False if skipped."""
+        if self._queue.qsize() >= self.max_backlog:
+            self.skipped += 1
+            return False
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="template-checks", daemon=True)
+            self._thread.start()
+        self._queue.put((action, frame, x, y))
+        return True
+
+    def _run(self):
+        while True:
+            action, frame, x, y = self._queue.get()
+            try:
+                self._check(action, frame, x, y)
+            except Exception as e:
+                print(f"Error checking screenshot {action.get('screenshot')}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _check(self, action, frame, x, y):
+        crop, quality = assess_template(frame, x, y)
+        if crop is None:
+            return
+        cv2.imwrite(action['screenshot'], crop)
+        action['template_quality'] = quality
+        self.checked += 1
+        if quality['size'] > CLICK_CROP_SIZE:
+            self.grown += 1
+        if not quality['distinct']:
+            self.ambiguous += 1
+            print(f"⚠ Screenshot {os.path.basename(action['screenshot'])} is ambiguous "
+                  f"(texture {quality['texture']}, runner-up {quality['runner_up']}); replay will use coordinates")
+        elif quality['size'] > CLICK_CROP_SIZE:
+            print(f"🔍 Screenshot {os.path.basename(action['screenshot'])} grown to {quality['size']}px to be unique")
+
+    def wait(self):
+        """Blocks until every queued check is done."""
+        self._queue.join()
+
+    def stats(self):
+        return {'checked': self.checked, 'grown': self.grown, 'ambiguous': self.ambiguous, 'skipped': self.skipped}
+
+
+MAX_BACKLOG = 10000  # Queued events beyond which mouse moves are dropped
+LATENCY_BOUNDS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.5, 1.0)
+
+
+class EventPump:
+    """
+    Decouples the pynput listeners from the recorder.
+
+    The listener callbacks only timestamp the raw event and put it on a queue,
+    so the OS input hooks are never held up. A processing thread feeds the
+    events to the ElementRecorder in order (string building, scroll coalescing,
+    screenshots, printing) and saves the sequence when stopped.
+
+    When the backlog exceeds max_backlog, mouse moves are dropped (counted in
+    stats()); clicks, scrolls and keys are always kept.
+    """
+    def __init__(self, recorder, max_backlog=MAX_BACKLOG):
+        self.recorder = recorder
+        self.max_backlog = max_backlog
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="recorder-events", daemon=True)
+        self._counts_lock = threading.Lock()  # The mouse and keyboard listeners both update the counters
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.max_queued = 0
+        self.latency = Histogram(LATENCY_BOUNDS)  # Time from callback to handled
+        self.failed = 0            # Events whose handler raised (skipped)
+        self.error = None          # Error raised while saving, re-raised by join()
+        self._finished = False     # Whether the sequence has been saved (or tried to be)
+        self._handlers = {
+            'click': lambda x, y, button, pressed: (recorder.on_mouse_press(x, y, button, pressed) if pressed
+                                                    else recorder.on_mouse_release(x, y, button)),
+            'scroll': recorder.record_scroll,
+            'move': recorder.on_mouse_move,
+            'press': recorder.handle_keypress,
+            'release': recorder.handle_keyrelease,
+        }
+
+    # --- Listener callbacks (run on the pynput threads; keep them cheap) ---
+
+    def _put(self, kind, *args):
+        with self._counts_lock:
+            queued = self.received - self.processed
+            if kind == 'move' and queued >= self.max_backlog:
+                self.dropped += 1
+                return
+            self.received += 1
+            if queued >= self.max_queued:
+                self.max_queued = queued + 1
+            self._queue.put((kind, time.time(), time.perf_counter_ns(), args))
+
+    def on_click(self, x, y, button, pressed):
+        self._put('click', x, y, button, pressed)
+
+    def on_scroll(self, x, y, dx, dy):
+        self._put('scroll', x, y, dx, dy)
+
+    def on_move(self, x, y):
+        self._put('move', x, y)
+
+    def on_press(self, key):
+        if key == keyboard.Key.esc:
+            self.stop()
+            return False  # Stop listener
+        self._put('press', key)
+
+    def on_release(self, key):
+        self._put('release', key)
+
+    # --- Processing thread ---
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Asks the processing thread to handle what is queued, save, and exit."""
+        self._queue.put(('stop', time.time(), time.perf_counter_ns(), ()))
+
+    def join(self, timeout=None):
+        """
+        Waits for the processing thread; re-raises an error it hit while saving.
+        If the thread is gone without having saved (it never started, or died),
+        the remaining events are handled and the sequence is saved here instead,
+        so a recording is never lost silently.
+        """
+        if self._thread.ident is not None:
+            self._thread.join(timeout)
+        if not self._thread.is_alive() and not self._finished:
+            print("⚠ Recorder event thread stopped early; saving from the main thread")
+            self._drain()
+        if self.error is not None:
+            raise self.error
+
+    def _dispatch(self, kind, wall_time, event_ns, args):
+        """Handles one event. A failing handler is reported and skipped, never fatal."""
+        recorder = self.recorder
+        recorder.event_time, recorder.event_ns = wall_time, event_ns
+        try:
+            self._handlers[kind](*args)
+        except Exception as e:
+            self.failed += 1
+            print(f"Error processing recorder {kind} event (skipped): {e}")
+        self.processed += 1
+        self.latency.add((time.perf_counter_ns() - event_ns) / 1e9)
+
+    def _finish(self):
+        """Saves the sequence (once), keeping any error for join()."""
+        self._finished = True
+        recorder = self.recorder
+        recorder.event_time = recorder.event_ns = None
+        try:
+            recorder.metadata['ingestion'] = self.stats()
+            recorder.save_sequence()
+        except Exception as e:
+            self.error = e
+            print(f"❌ Error saving the recording: {e}")
+
+    def _drain(self):
+        """Handles every queued event up to a stop request, then saves."""
+        while True:
+            try:
+                kind, wall_time, event_ns, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'stop':
+                break
+            self._dispatch(kind, wall_time, event_ns, args)
+        self._finish()
+
+    def _run(self):
+        try:
+            while True:
+                kind, wall_time, event_ns, args = self._queue.get()
+                if kind == 'stop':
+                    self._finish()
+                    return
+                self._dispatch(kind, wall_time, event_ns, args)
+        except BaseException as e:
+            # Only reachable through a bug in the pump itself; join() saves what it can.
+            print(f"Error in recorder event thread: {e}")
+
+    def stats(self):
+        """Event counts, drops and callback-to-handled latency so far."""
+        return {
+            'received': self.received,
+            'processed': self.processed,
+            'failed': self.failed,
+            'dropped_moves': self.dropped,
+            'max_queued': self.max_queued,
+            'latency_mean_ms': round(self.latency.mean * 1000, 3),
+            'latency_p95_ms': round(self.latency.percentile(95) * 1000, 3),
+            'latency_max_ms': round((self.latency.max or 0.0) * 1000, 3),
+        }
+
 
 class ElementRecorder:
-    def __init__(self):
+    def __init__(self, output_path='sequence.json', metadata=None, screenshots_dir='sequences/screenshots',
+                 capture_motion=False, motion_tolerance=MOTION_TOLERANCE, check_templates=True):
+        """
+        Args:
+            output_path (str): Where save_sequence() writes the recording (.json, or
+                               the binary .atseq format). Written once, atomically.
+            metadata (dict): Extra metadata stored with the recording (e.g. sequence_name).
+            screenshots_dir (str): Directory for click screenshots.
+            capture_motion (bool): Record simplified mouse paths (hovers as 'mouse_path'
+                                   actions, and the path of each drag) via on_mouse_move().
+            motion_tolerance (float): Path simplification tolerance in pixels.
+            check_templates (bool): Check each click screenshot in the background for
+                                    texture and uniqueness, growing or flagging weak ones.
+        """
+        self.output_path = output_path
+        self.metadata = dict(metadata or {})
+        self.saved_path = None  # Set by save_sequence() once the file is written.
+        # Screenshot names carry a per-recorder id, so parallel recorders never overwrite each other.
+        self.session_id = uuid.uuid4().hex[:8]
         self.recorded_actions = []
         self.current_string = ""
+        # Action timing comes from the monotonic perf_counter_ns clock, as offsets from
+        # the start of the recording (immune to NTP and wall-clock jumps). The wall
+        # clock is only used for the informational 'timestamp' fields.
         self.start_time = time.time()
+        self.start_ns = time.perf_counter_ns()
+        self.event_time = None  # When the event being handled happened (set by EventPump)
+        self.event_ns = None    # Same, on the perf_counter_ns clock
         self.modifiers = {'ctrl': False, 'shift': False, 'alt': False}
         self.drag_start = None
         self.pressed_button = None  # Track which button was pressed
+        self.capture_motion = capture_motion
+        self.motion = PathCapture(motion_tolerance)
 
         # Enhanced scroll tracking
         self._current_scroll_burst = None
@@ -21,21 +434,59 @@ class ElementRecorder:
         self.last_scroll_position = 0  # Cumulative scroll position in pixels
 
         # Create screenshots directory
-        self.screenshots_dir = 'sequences/screenshots'
-        if not os.path.exists(self.screenshots_dir):
-            os.makedirs(self.screenshots_dir)
+        self.screenshots_dir = screenshots_dir
+        os.makedirs(self.screenshots_dir, exist_ok=True)
         self.screenshot_count = 0
+        self.template_checker = TemplateChecker() if check_templates else None
 
         print("Desktop recorder started. Drag, copy, paste now reliable.")
 
+    def now(self):
+        """Timestamp for recorded actions: when the input happened, not when it was handled."""
+        return self.event_time if self.event_time is not None else time.time()
+
+    def offset_ns(self):
+        """Nanoseconds from the start of the recording to the current event (monotonic)."""
+        return (self.event_ns if self.event_ns is not None else time.perf_counter_ns()) - self.start_ns
+
+    def elapsed(self):
+        """offset_ns() in seconds."""
+        return self.offset_ns() / 1e9
+
+    def _add_action(self, action):
+        """Appends an action, after any hover path that happened before it."""
+        if self.capture_motion and self.drag_start is None:
+            self._flush_motion()
+        action.setdefault('offset_ns', self.offset_ns())
+        self.recorded_actions.append(action)
+
+    def on_mouse_move(self, x, y):
+        """pynput on_move callback: feeds the path simplifier when motion capture is on."""
+        if self.capture_motion:
+            self.motion.add(x, y, self.elapsed())
+
+    def _flush_motion(self):
+        """Records the mouse path since the last action as a 'mouse_path' action."""
+        raw_count = self.motion.raw_count
+        path = self.motion.take()
+        if path:
+            start = self.motion.path_start
+            self.recorded_actions.append({
+                'type': 'mouse_path',
+                'path': path,
+                'timestamp': self.start_time + start,
+                'offset_ns': round(start * 1e9)
+            })
+            print(f"〰 Mouse path: {raw_count} moves -> {len(path)} points")
+
     def flush_current_string(self):
         if self.current_string:
             action = {
                 'type': 'type_string',
                 'text': self.current_string,
-                'timestamp': time.time()
+                'timestamp': self.now()
             }
-            self.recorded_actions.append(action)
+            self._add_action(action)
             print(f"🔤 Typed: '{self.current_string}'")
             self.current_string = ""
 
@@ -43,34 +494,42 @@ class ElementRecorder:
         self.flush_current_string()
 
         screenshot_path = None
+        frame = None
         try:
-            region_size = 60  # 60x60 pixel box
+            region_size = CLICK_CROP_SIZE  # 60x60 pixel box
             left = max(0, x - region_size // 2)
             top = max(0, y - region_size // 2)
             
-            screenshot = pyautogui.screenshot(region=(left, top, region_size, region_size))
-            
             self.screenshot_count += 1
-            screenshot_filename = f"click_{self.screenshot_count}_{int(time.time())}.png"
+            screenshot_filename = f"click_{self.session_id}_{self.screenshot_count}_{int(time.time())}.png"
             screenshot_path = os.path.join(self.screenshots_dir, screenshot_filename)
-            screenshot.save(screenshot_path)
+            if self.template_checker is not None:
+                # The whole screen is needed to judge uniqueness; the crop is saved now and refined later
+                frame = cv2.cvtColor(np.asarray(pyautogui.screenshot()), cv2.COLOR_RGB2BGR)
+                cv2.imwrite(screenshot_path, frame[top:top + region_size, left:left + region_size])
+            else:
+                screenshot = pyautogui.screenshot(region=(left, top, region_size, region_size))
+                screenshot.save(screenshot_path)
             print(f"📸 Screenshot saved to {screenshot_path}")
 
         except Exception as e:
             print(f"Error taking screenshot: {e}")
+            screenshot_path = None
 
         action = {
             'type': 'click',
             'button': button,
             'coordinates': {'x': x, 'y': y},
             'screenshot': screenshot_path,
-            'timestamp': time.time()
+            'timestamp': self.now()
         }
-        self.recorded_actions.append(action)
+        self._add_action(action)
+        if frame is not None and screenshot_path:
+            self.template_checker.submit(action, frame, int(x), int(y))
         print(f"\n🖱 Click at ({x}, {y})")
 
     def record_scroll(self, x, y, dx, dy):
-        now = time.time()
+        now = self.elapsed()  # Monotonic seconds since recording start
         pixel_delta = int(dy * 50)  # Standard: ~50px per mouse wheel notch
 
         # Optional: filter out negligible scrolls
@@ -93,6 +552,8 @@ class ElementRecorder:
         else:
             # Finalize previous burst if exists
             self._finalize_scroll_burst()
+            if self.capture_motion and self.drag_start is None:
+                self._flush_motion()
 
             # Start new burst
             self.last_scroll_position += pixel_delta
@@ -125,9 +586,12 @@ class ElementRecorder:
             'final_position': burst['final_position'],
             'duration_sec': burst['last_time'] - burst['start_time'],
             'steps': burst['steps'],
-            'timestamp': burst['start_time']
+            'timestamp': self.start_time + burst['start_time'],
+            'offset_ns': round(burst['start_time'] * 1e9)
         }
 
+        # Appended directly: bursts are finalized late, and the hover path before
+        # the burst was already flushed when it started.
         self.recorded_actions.append(action)
         print(f"\n🡅 SCROLLED {action['direction'].upper()}: {action['total_delta']}px "
               f"→ pos={action['final_position']} "
@@ -139,6 +603,9 @@ class ElementRecorder:
         if pressed and self.pressed_button is None:  # Only start if no other button down
             self.pressed_button = button
             if button == mouse.Button.left:
+                if self.capture_motion:
+                    self._flush_motion()  # Hover up to the press; the drag path starts here
+                    self.motion.add(x, y, self.elapsed())
                 self.drag_start = {'x': x, 'y': y}
                 print(f"📍 Drag start set at ({x}, {y})")
 
@@ -148,6 +615,10 @@ class ElementRecorder:
                 dx = x - self.drag_start['x']
                 dy = y - self.drag_start['y']
                 distance = (dx ** 2 + dy ** 2) ** 0.5
+                path = []
+                if self.capture_motion:
+                    self.motion.add(x, y, self.elapsed())
+                    path = self.motion.take()
 
                 # 🔍 Only drag if moved more than 10 pixels
                 if distance > 10:
@@ -155,15 +626,17 @@ class ElementRecorder:
                         'type': 'drag_drop',
                         'from': self.drag_start,
                         'to': {'x': x, 'y': y},
-                        'timestamp': time.time()
+                        'timestamp': self.now()
                     }
-                    self.recorded_actions.append(action)
+                    if path:
+                        action['path'] = path  # Replayed point by point instead of a synthetic curve
+                    self._add_action(action)
                     print(f"\n✅ DRAGGED from {self.drag_start} to ({x}, {y}) [dist={distance:.1f}]")
+                    self.drag_start = None
                 else:
+                    self.drag_start = None
                     self.record_click(x, y, 'left')
 
-                self.drag_start = None
-
             elif button != mouse.Button.left:
                 # Handle right/middle clicks as simple clicks
                 self.record_click(x, y, str(button))
@@ -225,10 +698,10 @@ class ElementRecorder:
                     action = {
                         'type': 'clipboard',
                         'operation': detected_key,
-                        'timestamp': time.time()
+                        'timestamp': self.now()
                     }
 
-                    self.recorded_actions.append(action)
+                    self._add_action(action)
 
                     if detected_key == 'c':
                         print("\n📋 COPY (Ctrl+C)")
@@ -249,9 +722,9 @@ class ElementRecorder:
                     action = {
                         'type': 'keystroke',
                         'key': str(key).replace('Key.', ''),
-                        'timestamp': time.time()
+                        'timestamp': self.now()
                     }
-                    self.recorded_actions.append(action)
+                    self._add_action(action)
                     print(f"⌨ Control Key: {action['key']}")
                     return
 
@@ -263,9 +736,9 @@ class ElementRecorder:
                 action = {
                     'type': 'keystroke',
                     'key': key_name,
-                    'timestamp': time.time()
+                    'timestamp': self.now()
                 }
-                self.recorded_actions.append(action)
+                self._add_action(action)
                 print(f"⌨ Key: {key_name}")
 
         except Exception as e:
@@ -281,57 +754,68 @@ class ElementRecorder:
             self.modifiers['alt'] = False
 
     def save_sequence(self):
-        """Save all recorded actions to JSON"""
+        """
+        Save all recorded actions to self.output_path, atomically: the file is
+        written to a temporary name in the target directory and renamed into place.
+
+        Returns:
+            str: The path written.
+        """
         self.flush_current_string()
         self._finalize_scroll_burst()  # Finalize any ongoing scroll
+        if self.capture_motion:
+            self._flush_motion()
+        if self.template_checker is not None:
+            self.template_checker.wait()  # Screenshots and their quality flags are final
+            self.metadata['template_checks'] = self.template_checker.stats()
 
         output = {
             'metadata': {
                 'created_at': time.strftime("%Y-%m-%d %H:%M:%S"),
                 'total_actions': len(self.recorded_actions),
-                'duration_sec': round(time.time() - self.start_time, 2),
-                'mode': 'desktop_only'
+                'duration_sec': round(self.elapsed(), 2),
+                'clock': 'perf_counter_ns',  # Source of the actions' offset_ns
+                'started_at': self.start_time,
+                'mode': 'desktop_only',
+                **self.metadata
             },
             'actions': self.recorded_actions
         }
-        with open('sequence.json', 'w') as f:
-            json.dump(output, f, indent=4)
-        print(f"\n✅ Saved to sequence.json | {len(self.recorded_actions)} actions")
-
-
-# === Initialize ===
-recorder = ElementRecorder()
-
-# Callbacks for listeners
-def on_click(x, y, button, pressed):
-    if pressed:
-        recorder.on_mouse_press(x, y, button, pressed)
-    else:
-        recorder.on_mouse_release(x, y, button)
-
-def on_scroll(x, y, dx, dy):
-    recorder.record_scroll(x, y, dx, dy)
-
-def on_press(key):
-    if key == keyboard.Key.esc:
-        recorder.save_sequence()
-        return False  # Stop listener
-    recorder.handle_keypress(key)
-
-def on_release(key):
-    recorder.handle_keyrelease(key)
-
-# Start listeners
-print("\n🟢 Recording. Try dragging now!")
-print("🖱 Drag >10px to trigger drag, else click")
-print("🡅 Scroll actions are grouped for accurate replay")
-print("📋 Ctrl+C/V/X/A work reliably")
-print("⏹ ESC to save and exit")
-
-mouse_listener = mouse.Listener(on_click=on_click, on_scroll=on_scroll)
-keyboard_listener = keyboard.Listener(on_press=on_press, on_release=on_release)
-
-mouse_listener.start()
-keyboard_listener.start()
-keyboard_listener.join()  # Will block until ESC
-mouse_listener.stop()
\ No newline at end of file
+        write_sequence(self.output_path, output)
+        self.saved_path = self.output_path
+        print(f"\n✅ Saved to {self.output_path} | {len(self.recorded_actions)} actions")
+        return self.output_path
+
+
+if __name__ == "__main__":
+    # === Initialize ===
+    recorder = ElementRecorder(capture_motion='--motion' in sys.argv,
+                               check_templates='--no-template-check' not in sys.argv)
+
+    # Listener callbacks only queue events; a separate thread processes them
+    pump = EventPump(recorder).start()
+
+    # Start listeners
+    print("\n🟢 Recording. Try dragging now!")
+    print("🖱 Drag >10px to trigger drag, else click")
+    print("🡅 Scroll actions are grouped for accurate replay")
+    print("📋 Ctrl+C/V/X/A work reliably")
+    if recorder.capture_motion:
+        print("〰 Mouse paths are captured and simplified")
+    print("⏹ ESC to save and exit")
+
+    mouse_listener = mouse.Listener(on_click=pump.on_click, on_scroll=pump.on_scroll,
+                                    on_move=pump.on_move if recorder.capture_motion else None)
+    keyboard_listener = keyboard.Listener(on_press=pump.on_press, on_release=pump.on_release)
+
+    mouse_listener.start()
+    keyboard_listener.start()
+    try:
+        keyboard_listener.join()  # Will block until ESC
+    finally:
+        # ESC, Ctrl+C or a listener error: the recording is saved in every case
+        mouse_listener.stop()
+        keyboard_listener.stop()
+        pump.stop()  # No-op after ESC (the pump has already finished)
+        pump.join()  # Handles the remaining events and saves
+    print(f"📊 Events: {pump.stats()}")
@@ -0,0 +1,167 @@
+
+# screenhash.py
+
+"""
+Perceptual-hash checkpoints of the screen, for comparing replays.
+
+While playing, ScreenHashRecorder stores a difference hash (dHash) of the
+screen before every N-th action: the frame is shrunk to (HASH_SIZE + 1) x
+HASH_SIZE grey pixels and each bit says whether a pixel is brighter than its
+right neighbour. That is HASH_SIZE^2 bits per checkpoint instead of a
+screenshot, and small changes (a clock, a blinking caret, antialiasing) flip
+only a few of them.
+
+diff_runs() walks two runs' hash streams side by side, once, and reports the
+first checkpoint whose hashes differ by more than a Hamming-distance
+tolerance: the replay went off the rails in the N actions before it.
+"""
+
+import json                         # Hash stream files.
+import time                         # Recording timestamp.
+import cv2                          # Shrinking and greyscale conversion.
+import numpy as np                  # Bit packing.
+from sequences import atomic_write_json
+
+HASH_VERSION = 1
+HASH_SIZE = 16                      # Hash is HASH_SIZE x HASH_SIZE bits (256 bits, 64 hex characters).
+HASH_EVERY = 5                      # Default: one checkpoint every this many actions.
+HASH_TOLERANCE = 12                 # Differing bits still considered the same screen.
+
+
+def dhash(frame, size=HASH_SIZE):
+    """
+    Difference hash of a BGR frame.
+
+    Returns:
+        int: size * size bits.
+    """
+    grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(grey, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
+
+
+class ScreenHashRecorder:
+    """
+    Collects (step, loop, action, hash) checkpoints during a run and writes them
+    as one JSON file.
+    """
+    def __init__(self, path, every=HASH_EVERY, size=HASH_SIZE, metadata=None):
+        """
+        Args:
+            path (str): Output file, written by save().
+            every (int): Record before actions 0, every, 2*every, ... of each loop.
+            size (int): Hash side (see dhash()).
+            metadata (dict): Stored with the hashes (e.g. the sequence or chain played).
+        """
+        self.path = path
+        self.every = max(1, every)
+        self.size = size
+        self.metadata = dict(metadata or {})
+        self.entries = []
+        self._context = (0, 0)  # (chain step, loop) being played
+
+    def begin_loop(self, step, loop):
+        """Sets the chain step and loop that following checkpoints belong to."""
+        self._context = (step, loop)
+
+    def wants(self, idx):
+        """Whether the screen before action `idx` is a checkpoint."""
+        return idx % self.every == 0
+
+    def add(self, idx, frame):
+        """Hashes the screen before action `idx`."""
+        step, loop = self._context
+        self.entries.append([step, loop, idx, format(dhash(frame, self.size), f'0{self.size * self.size // 4}x')])
+
+    def save(self):
+        """Writes the hash stream (atomically)."""
+        atomic_write_json(self.path, {
+            'version': HASH_VERSION,
+            'hash': f'dhash{self.size}',
+            'every': self.every,
+            'recorded_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'metadata': self.metadata,
+            'entries': self.entries,
+        }, indent=None)
+        return self.path
+
+
+def load_hashes(path):
+    """Reads a hash stream file written by ScreenHashRecorder.save()."""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('version') != HASH_VERSION:
+        raise ValueError(f"{path}: unsupported hash file version {data.get('version')}")
+    return data
+
+
+def diff_runs(run_a, run_b, tolerance=HASH_TOLERANCE):
+    """
+    Compares two hash streams in one pass.
+
+    Checkpoints are matched by (step, loop, action). Both streams are in play
+    order, so a merge walk visits every entry once; checkpoints present in only
+    one run (a loop that was aborted, or a different N) are counted, and the
+    first one in `run_a` missing from `run_b` counts as a divergence too.
+
+    Args:
+        run_a (dict): Baseline, as returned by load_hashes().
+        run_b (dict): Run to check.
+        tolerance (int): Largest Hamming distance treated as the same screen.
+
+    Returns:
+        dict: 'compared', 'max_distance', 'only_in_a', 'only_in_b' and
+              'first_divergence' ({'step', 'loop', 'action', 'distance'}; distance
+              None when the checkpoint is missing from run_b), or None if the runs agree.
+    """
+    if run_a.get('hash') != run_b.get('hash'):
+        raise ValueError(f"Hash types differ: {run_a.get('hash')} vs {run_b.get('hash')}")
+    a, b = run_a['entries'], run_b['entries']
+    i = j = compared = max_distance = only_a = only_b = 0
+    first = None
+    while i < len(a) and j < len(b):
+        key_a, key_b = tuple(a[i][:3]), tuple(b[j][:3])
+        if key_a == key_b:
+            distance = hamming(int(a[i][3], 16), int(b[j][3], 16))
+            compared += 1
+            max_distance = max(max_distance, distance)
+            if first is None and distance > tolerance:
+                first = {'step': key_a[0], 'loop': key_a[1], 'action': key_a[2], 'distance': distance}
+            i += 1
+            j += 1
+        elif key_a < key_b:
+            if first is None:
+                first = {'step': key_a[0], 'loop': key_a[1], 'action': key_a[2], 'distance': None}
+            only_a += 1
+            i += 1
+        else:
+            only_b += 1
+            j += 1
+    if first is None and i < len(a):
+        key_a = a[i][:3]
+        first = {'step': key_a[0], 'loop': key_a[1], 'action': key_a[2], 'distance': None}
+    only_a += len(a) - i
+    only_b += len(b) - j
+    return {'compared': compared, 'max_distance': max_distance, 'only_in_a': only_a, 'only_in_b': only_b,
+            'first_divergence': first}
+
+
+def format_diff(diff, every=None):
+    """One or two lines describing a diff_runs() result."""
+    lines = [f"Compared {diff['compared']} checkpoints (max distance {diff['max_distance']}, "
+             f"{diff['only_in_a']} only in baseline, {diff['only_in_b']} only in run)"]
+    first = diff['first_divergence']
+    if first is None:
+        lines.append("Runs agree")
+    else:
+        where = f"step {first['step'] + 1}, loop {first['loop']}, before action {first['action']}"
+        what = "missing from the run" if first['distance'] is None else f"{first['distance']} bits differ"
+        window = f" (look at actions {max(0, first['action'] - every)}..{first['action'] - 1})" if every and first['action'] else ""
+        lines.append(f"First divergence at {where}: {what}{window}")
+    return "\n".join(lines)
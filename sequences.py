@@ -0,0 +1,717 @@
+
+# sequences.py
+
+"""
+Loading, validation and compilation of sequence files and chain configs.
+
+A CompiledSequence is a parsed, validated sequence with every click screenshot
+path resolved once up front, so playback never searches the filesystem per click.
+plan_chain() turns a chain config into a ChainPlan: every distinct sequence file
+is read and compiled once, however many steps use it, and the whole chain is
+validated before anything is played.
+
+Sequences can also be stored in a compact, columnar binary format (see
+encode_binary()) that loads without building every action up front;
+read_sequence() detects it from the file's first bytes, so either format can be
+used anywhere a sequence file is expected.
+
+SequenceRegistry caches compiled sequences across runs, keyed by path and
+file modification stamp, so repeated runs skip parsing while still picking up
+edits made between them.
+"""
+
+import array                        # Typed columns of the binary format.
+import collections.abc              # ActionColumns is a read-only Sequence.
+import itertools                    # Shape offsets of binary-format actions.
+import json                         # Sequence and chain files are JSON.
+import os                           # Path resolution and existence checks.
+import struct                       # Binary format header length.
+import sys                          # Byte order of typed arrays.
+import tempfile                     # Temporary files for atomic writes.
+import threading                    # Registry lock (GUI runs play from worker threads).
+import zlib                         # Compression of the binary format.
+from memory import LRUCache         # Size cap of the compiled-sequence registry.
+
+# Fields each action type needs at playback time, checked by validate_sequence().
+REQUIRED_FIELDS = {
+    'click': ('coordinates',),
+    'drag_start': ('coordinates',),
+    'drag_end': ('coordinates',),
+    'drag_drop': ('from', 'to'),
+    'keystroke': ('key',),
+    'mouse_path': ('path',),
+}
+POINT_FIELDS = ('coordinates', 'from', 'to')  # Fields holding {'x': ..., 'y': ...}.
+
+
+class SequenceValidationError(ValueError):
+    """Raised when a sequence or chain config fails validation. Lists every problem found."""
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__("; ".join(self.problems))
+
+
+# --- Atomic writes ---
+
+def atomic_write_bytes(path, payload, fsync=True):
+    """
+    Writes a file atomically: the bytes go to a temporary file in the target
+    directory, which is then renamed over the destination. Readers never see a
+    partial file, and concurrent writers never share a temporary name.
+
+    Args:
+        path (str): Destination file.
+        payload (bytes): Content to write.
+        fsync (bool): Flush to disk before the rename, so the file survives a crash.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def atomic_write_json(path, data, indent=4, fsync=True):
+    """Serializes data as JSON and writes it with atomic_write_bytes()."""
+    atomic_write_bytes(path, json.dumps(data, indent=indent).encode('utf-8'), fsync=fsync)
+
+
+# --- Binary format ---
+#
+# Layout: BINARY_MAGIC followed by a zlib-compressed body: a 4-byte little-endian
+# header length, a compact JSON header, then the raw bytes of typed arrays.
+# Actions are grouped by shape (their key list, in order); each shape stores one
+# column per key, typed whenever every value in it allows:
+#   ['enum', table, ref]     strings or None: the distinct values, plus a uint32 index per action
+#   ['int', ref]             64-bit integers
+#   ['float', ref]           doubles
+#   ['point', ref_x, ref_y]  {'x': int, 'y': int} dictionaries
+#   ['json', values]         anything else, inline in the header
+# where ref = [array typecode, byte offset, item count]. The header also holds
+# 'rows' (actions per shape), 'order' (shape of every action) and 'slots' (row
+# of every action among all shapes' rows, in shape order), the last two as arrays. Loading only decompresses and wraps
+# the arrays; ActionColumns builds an action's dictionary when it is accessed,
+# and whole-field reads (validation, screenshot resolution) use the columns
+# directly. The conversion is lossless: list(decode_binary(encode_binary(data))['actions'])
+# equals data['actions'], key order included. A truncated or
+# otherwise malformed body raises ValueError, like any unreadable sequence.
+
+BINARY_MAGIC = b'\x89ATSEQ2\n'
+BINARY_EXTENSION = '.atseq'
+_HEADER_LENGTH = struct.Struct('<I')
+
+
+def _add_array(blobs, typecode, items):
+    """Appends a typed array to the blob list; returns its [typecode, offset, count] reference."""
+    values = array.array(typecode, items)
+    if sys.byteorder == 'big':
+        values.byteswap()  # Arrays are stored little-endian.
+    offset = sum(len(blob) for blob in blobs)
+    blobs.append(values.tobytes())
+    return [typecode, offset, len(values)]
+
+
+def _read_array(body, ref):
+    typecode, offset, count = ref
+    values = array.array(typecode)
+    blob = body[offset:offset + count * values.itemsize]
+    if len(blob) != count * values.itemsize:
+        raise ValueError(f"array of {count} '{typecode}' items is truncated")
+    values.frombytes(blob)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _encode_column(values, blobs):
+    """Descriptor of one column (see the layout above), adding its arrays to `blobs`."""
+    kinds = set(map(type, values))
+    if kinds <= {str, type(None)}:
+        index = {}
+        indices = [index.setdefault(value, len(index)) for value in values]
+        return ['enum', list(index), _add_array(blobs, 'I', indices)]
+    try:
+        if kinds == {int}:
+            return ['int', _add_array(blobs, 'q', values)]
+    except OverflowError:
+        pass  # Beyond 64 bits: stored as JSON.
+    if kinds == {float}:
+        return ['float', _add_array(blobs, 'd', values)]
+    if kinds == {dict} and all(list(v) == ['x', 'y'] and type(v['x']) is int and type(v['y']) is int
+                               for v in values):
+        try:
+            return ['point', _add_array(blobs, 'q', [v['x'] for v in values]),
+                    _add_array(blobs, 'q', [v['y'] for v in values])]
+        except OverflowError:
+            pass
+    return ['json', values]
+
+
+class _Column:
+    """One decoded column: get(row) for a single value, values() for all rows."""
+    def __init__(self, descriptor, body):
+        self.kind = descriptor[0]
+        if self.kind == 'enum':
+            self.table = descriptor[1]
+            indices = _read_array(body, descriptor[2])
+            table = self.table
+            self.get = lambda row: table[indices[row]]
+            self.values = lambda: list(map(table.__getitem__, indices))
+        elif self.kind in ('int', 'float'):
+            values = _read_array(body, descriptor[1])
+            self.get = values.__getitem__
+            self.values = values.tolist
+        elif self.kind == 'point':
+            xs, ys = _read_array(body, descriptor[1]), _read_array(body, descriptor[2])
+            self.get = lambda row: {'x': xs[row], 'y': ys[row]}
+            self.values = lambda: [{'x': x, 'y': y} for x, y in zip(xs, ys)]
+        elif self.kind == 'json':
+            values = descriptor[1]
+            self.get = values.__getitem__
+            self.values = lambda: list(values)
+        else:
+            raise ValueError(f"Unknown binary column kind '{self.kind}'")
+
+
+class ActionColumns(collections.abc.Sequence):
+    """
+    The actions of a binary sequence file, as a read-only list.
+
+    Each access builds a new dictionary (so changes to it are not kept); column()
+    reads one field of every action without building any dictionary.
+
+    Attributes:
+        shapes (list): Key list of each shape.
+        columns (list): Per shape, one _Column per key.
+    """
+    def __init__(self, shapes, columns, rows, order, slots):
+        self.shapes = shapes
+        self.columns = columns
+        self._rows = rows     # Actions of each shape.
+        self._order = order
+        self._slots = slots
+        self._offsets = list(itertools.accumulate([0] + self._rows[:-1]))  # First slot of each shape.
+        self._getters = [[column.get for column in shape_columns] for shape_columns in columns]
+
+    def __len__(self):
+        return len(self._order)
+
+    def _build(self, idx):
+        shape = self._order[idx]
+        row = self._slots[idx] - self._offsets[shape]
+        return {key: get(row) for key, get in zip(self.shapes[shape], self._getters[shape])}
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._build(i) for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("action index out of range")
+        return self._build(idx)
+
+    def __iter__(self):
+        return map(self._build, range(len(self)))
+
+    def column(self, key, default=None):
+        """The value of `key` for every action, in order (`default` where an action has no such key)."""
+        values = []
+        for keys, shape_columns, rows in zip(self.shapes, self.columns, self._rows):
+            values.extend(shape_columns[keys.index(key)].values() if key in keys else [default] * rows)
+        return [values[slot] for slot in self._slots]
+
+    def problems(self, source):
+        """
+        sequence_problems() from the shapes alone: [] when every shape is
+        provably valid, None when the actions must be checked one by one.
+        """
+        for keys, shape_columns in zip(self.shapes, self.columns):
+            if 'type' not in keys:
+                return None
+            types = shape_columns[keys.index('type')]
+            if types.kind != 'enum' or not all(isinstance(t, str) for t in types.table):
+                return None
+            for action_type in types.table:
+                for field in REQUIRED_FIELDS.get(action_type, ()):
+                    if field not in keys:
+                        return None
+                    if field in POINT_FIELDS and shape_columns[keys.index(field)].kind != 'point':
+                        return None
+        return []
+
+
+def action_values(actions, key):
+    """The value of `key` for every action (None where missing), for lists and ActionColumns alike."""
+    if isinstance(actions, ActionColumns):
+        return actions.column(key)
+    return [action.get(key) if isinstance(action, dict) else None for action in actions]
+
+
+def encode_binary(data):
+    """
+    Encodes a parsed sequence in the binary format.
+
+    Args:
+        data (dict): Sequence with an 'actions' list of dictionaries.
+
+    Returns:
+        bytes: The encoded file content.
+    """
+    shape_ids = {}
+    shapes, order, rows = [], [], []
+    for action in data['actions']:
+        if not isinstance(action, dict):
+            raise ValueError("Binary format requires every action to be a dictionary")
+        keys = tuple(action)
+        shape = shape_ids.get(keys)
+        if shape is None:
+            shape = shape_ids[keys] = len(shapes)
+            shapes.append(list(keys))
+            rows.append([])
+        order.append(shape)
+        rows[shape].append(action)
+    # Slot of every action: its row within its shape, after all rows of the earlier shapes.
+    offsets = list(itertools.accumulate([0] + [len(r) for r in rows[:-1]]))
+    seen = [0] * len(shapes)
+    slots = []
+    for shape in order:
+        slots.append(offsets[shape] + seen[shape])
+        seen[shape] += 1
+    blobs = []
+    header = {
+        'keys': list(data),
+        'fields': {k: v for k, v in data.items() if k != 'actions'},
+        'shapes': shapes,
+        'columns': [[_encode_column([action[key] for action in shape_rows], blobs) for key in keys]
+                    for keys, shape_rows in zip(shapes, rows)],
+        'rows': [len(shape_rows) for shape_rows in rows],
+        'order': _add_array(blobs, 'H' if len(shapes) <= 0xFFFF else 'I', order),
+        'slots': _add_array(blobs, 'I', slots),
+    }
+    encoded_header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    body = _HEADER_LENGTH.pack(len(encoded_header)) + encoded_header + b''.join(blobs)
+    return BINARY_MAGIC + zlib.compress(body, 6)
+
+
+def decode_binary(payload):
+    """
+    Decodes bytes produced by encode_binary().
+
+    Returns:
+        dict: The sequence, with its actions as an ActionColumns list.
+
+    Raises:
+        ValueError: The payload is not a binary sequence, or its body is truncated or malformed.
+    """
+    if not payload.startswith(BINARY_MAGIC):
+        raise ValueError("Not a binary sequence file")
+    try:
+        body = memoryview(zlib.decompress(payload[len(BINARY_MAGIC):]))
+        header_end = _HEADER_LENGTH.size + _HEADER_LENGTH.unpack_from(body)[0]
+        header = json.loads(bytes(body[_HEADER_LENGTH.size:header_end]))
+        arrays = body[header_end:]
+        actions = ActionColumns(header['shapes'],
+                                [[_Column(descriptor, arrays) for descriptor in shape_columns]
+                                 for shape_columns in header['columns']],
+                                header['rows'], _read_array(arrays, header['order']), _read_array(arrays, header['slots']))
+        fields = header['fields']
+        return {key: actions if key == 'actions' else fields[key] for key in header['keys']}
+    except (ValueError, zlib.error, struct.error, KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"corrupt binary sequence: {e}") from e
+
+
+def is_binary_payload(payload):
+    """True if file content starts with the binary format's magic bytes."""
+    return payload.startswith(BINARY_MAGIC)
+
+
+def is_binary_sequence(filename):
+    """True if the file starts with the binary format's magic bytes."""
+    with open(filename, 'rb') as f:
+        return is_binary_payload(f.read(len(BINARY_MAGIC)))
+
+
+def write_sequence(filename, data, binary=None, fsync=True):
+    """
+    Writes a sequence atomically, as JSON or in the binary format.
+
+    Args:
+        filename (str): Destination file.
+        data (dict): The sequence.
+        binary (bool): Use the binary format; by default chosen from the
+                       extension (BINARY_EXTENSION means binary).
+        fsync (bool): Flush to disk before the file is renamed into place.
+    """
+    if binary is None:
+        binary = filename.endswith(BINARY_EXTENSION)
+    if binary:
+        atomic_write_bytes(filename, encode_binary(data), fsync=fsync)
+    else:
+        if isinstance(data.get('actions'), ActionColumns):
+            data = dict(data, actions=list(data['actions']))  # Decoded binary actions, as plain dictionaries.
+        atomic_write_json(filename, data, fsync=fsync)
+
+
+def convert_sequence(source, destination, binary=None):
+    """
+    Converts a sequence file between JSON and the binary format, without loss.
+
+    Args:
+        source (str): Sequence file in either format.
+        destination (str): Output file.
+        binary (bool): Output format; by default chosen from the destination's extension.
+    """
+    write_sequence(destination, read_sequence(source), binary=binary)
+
+
+# --- Reading and validation ---
+
+def read_sequence(filename):
+    """
+    Reads and validates a sequence file, in JSON or binary format.
+
+    Args:
+        filename (str): Path to the sequence file.
+
+    Returns:
+        dict: The parsed sequence data.
+    """
+    with open(filename, 'rb') as f:
+        payload = f.read()
+    if is_binary_payload(payload):
+        data = decode_binary(payload)
+    else:
+        data = json.loads(payload)
+    validate_sequence(data, source=filename)
+    return data
+
+
+def sequence_problems(data, source="sequence"):
+    """
+    Lists everything wrong with a parsed sequence, without raising.
+
+    Args:
+        data: Parsed sequence file content.
+        source (str): Name used in the messages.
+
+    Returns:
+        list: Problem descriptions (empty when the sequence is valid).
+    """
+    if not isinstance(data, dict) or "actions" not in data:
+        return [f"{source}: Invalid sequence format: Missing actions"]
+    actions = data['actions']
+    if isinstance(actions, ActionColumns):
+        problems = actions.problems(source)
+        if problems is not None:
+            return problems  # Checked per shape; otherwise each action is checked below.
+    elif not isinstance(actions, list):
+        return [f"{source}: 'actions' must be a list"]
+    problems = []
+    for idx, action in enumerate(actions):
+        if not isinstance(action, dict) or not isinstance(action.get('type'), str):
+            problems.append(f"{source}: action {idx} has no type")
+            continue
+        for field in REQUIRED_FIELDS.get(action['type'], ()):
+            if field not in action:
+                problems.append(f"{source}: action {idx} ({action['type']}) is missing '{field}'")
+            elif field in POINT_FIELDS and not (isinstance(action[field], dict)
+                                                and 'x' in action[field] and 'y' in action[field]):
+                problems.append(f"{source}: action {idx} ({action['type']}) has an invalid '{field}'")
+    return problems
+
+
+def validate_sequence(data, source="sequence"):
+    """Raises SequenceValidationError if the parsed sequence is not playable."""
+    problems = sequence_problems(data, source)
+    if problems:
+        raise SequenceValidationError(problems)
+
+
+def action_offset(action):
+    """
+    When an action happened, in seconds from the start of its recording: the
+    monotonic 'offset_ns' in recent recordings, else the wall-clock 'timestamp'
+    of older ones (only differences between actions are meaningful). None if neither.
+    """
+    if 'offset_ns' in action:
+        return action['offset_ns'] / 1e9
+    return action.get('timestamp')
+
+
+def template_ambiguous(action):
+    """
+    Whether the recorder flagged a click's screenshot as too flat or too
+    repetitive to match reliably ('template_quality' set by its check).
+    """
+    quality = action.get('template_quality')
+    return bool(quality) and quality.get('distinct') is False
+
+
+# --- Compilation ---
+
+def resolve_screenshot_path(screenshot_path, base_dir=None):
+    """
+    Finds a click screenshot on disk, trying the path as recorded, relative to the
+    current directory, to the sequence file's directory and to this script's directory.
+
+    Args:
+        screenshot_path (str): Path stored in the action.
+        base_dir (str): Directory of the sequence file, if known.
+
+    Returns:
+        str: The first existing path, or None.
+    """
+    for path in screenshot_candidates(screenshot_path, base_dir):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def screenshot_candidates(screenshot_path, base_dir=None):
+    """The paths resolve_screenshot_path() tries, in order."""
+    normalized = screenshot_path.replace('/', os.sep).replace('\\', os.sep)
+    possible_paths = [
+        screenshot_path,
+        os.path.join(os.getcwd(), screenshot_path),
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), screenshot_path),
+        normalized,
+    ]
+    if base_dir:
+        possible_paths.append(os.path.join(base_dir, normalized))
+    return possible_paths
+
+
+class CompiledSequence:
+    """
+    A validated sequence ready for playback.
+
+    Attributes:
+        path (str): Source file (None for in-memory sequences).
+        name (str): File name without extension, or the metadata's sequence_name.
+        data (dict): The full parsed sequence, including metadata.
+        actions (list): The action dictionaries, in order.
+        screenshot_paths (list): For each action, the resolved screenshot path,
+                                 or None when there is none or it is missing.
+        missing_screenshots (list): Distinct screenshot references that did not resolve.
+        base_dir (str): Directory of the source file (None for in-memory sequences).
+    """
+    def __init__(self, data, path=None):
+        self.path = path
+        self.data = data
+        self.actions = data['actions']
+        metadata = data.get('metadata') or {}
+        if path:
+            self.name = os.path.splitext(os.path.basename(path))[0]
+        else:
+            self.name = metadata.get('sequence_name', 'sequence')
+        self.base_dir = os.path.dirname(os.path.abspath(path)) if path else None
+        shots = action_values(self.actions, 'screenshot')
+        # Each distinct screenshot is looked up once, however many clicks use it.
+        resolved = {shot: resolve_screenshot_path(shot, self.base_dir) for shot in set(shots) if shot}
+        self.screenshot_paths = [resolved[shot] if shot else None for shot in shots]
+        self.missing_screenshots = sorted(shot for shot, found in resolved.items() if found is None)
+
+    def __len__(self):
+        return len(self.actions)
+
+
+def compile_sequence(data, path=None):
+    """
+    Validates a parsed sequence and resolves its screenshots.
+
+    Args:
+        data (dict): Parsed sequence.
+        path (str): File it came from, used for messages and relative screenshots.
+
+    Returns:
+        CompiledSequence: The compiled sequence.
+    """
+    validate_sequence(data, source=path or "sequence")
+    return CompiledSequence(data, path)
+
+
+def load_compiled(path):
+    """Reads, validates and compiles a sequence file."""
+    return CompiledSequence(read_sequence(path), path)
+
+
+# --- Registry ---
+
+REGISTRY_MAX_ENTRIES = 64  # Compiled sequences a registry keeps (a long-lived GUI touches many files).
+
+def file_stamp(path):
+    """
+    Returns a cheap change marker for a file: (mtime in ns, size), or None if
+    the file does not exist.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class SequenceRegistry:
+    """
+    Shared cache of compiled sequences, keyed by absolute path.
+
+    get() stats the file (and the screenshots it resolved) and only re-reads and
+    recompiles when something changed, so a long-running GUI session or service
+    replays edited files immediately without paying for unchanged ones.
+
+    A cache hit stats each distinct screenshot once, not once per click. Missing
+    screenshots are not looked up again: the directories they would appear in
+    are stamped instead, and a change there (a file added) triggers the lookup.
+    """
+    def __init__(self, loader=load_compiled, max_entries=REGISTRY_MAX_ENTRIES):
+        """
+        Args:
+            loader (callable): Turns a path into a CompiledSequence.
+            max_entries (int): Compiled sequences kept; the least recently used is dropped first.
+        """
+        self.loader = loader
+        self._entries = LRUCache(max_entries)  # Absolute path -> (file stamp, {path: stamp} of screenshots
+                                               #   and of missing screenshots' directories, CompiledSequence).
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    @staticmethod
+    def _dependency_stamps(compiled):
+        """
+        Stamps of what a compiled sequence depends on besides its file: every
+        distinct resolved screenshot, and the directories where its missing
+        screenshots would be found (adding a file there changes their stamp).
+        """
+        paths = {path for path in compiled.screenshot_paths if path}
+        for shot in compiled.missing_screenshots:
+            paths.update(os.path.dirname(os.path.abspath(candidate))
+                         for candidate in screenshot_candidates(shot, compiled.base_dir))
+        return {path: file_stamp(path) for path in paths}
+
+    def _is_current(self, entry, stamp):
+        cached_stamp, dependency_stamps, compiled = entry
+        if stamp != cached_stamp:
+            return False
+        # Screenshot edited or deleted, or a file added where a missing one would be.
+        return all(file_stamp(path) == dep_stamp for path, dep_stamp in dependency_stamps.items())
+
+    def get(self, path):
+        """
+        Returns the compiled sequence for a file, recompiling it only if the file
+        or one of its screenshots changed since the last call.
+
+        Args:
+            path (str): Sequence file.
+
+        Returns:
+            CompiledSequence: The up-to-date compiled sequence.
+        """
+        key = os.path.abspath(path)
+        stamp = file_stamp(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and stamp is not None and self._is_current(entry, stamp):
+                self.hits += 1
+                return entry[2]
+        compiled = self.loader(path)  # Raises for missing or invalid files, which are not cached.
+        dependency_stamps = self._dependency_stamps(compiled)
+        with self._lock:
+            self._entries[key] = (stamp, dependency_stamps, compiled)
+            self.loads += 1
+        return compiled
+
+    def invalidate(self, path=None):
+        """Drops one file from the cache, or everything when path is None."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+
+# Registry shared by every player in the process.
+default_registry = SequenceRegistry()
+
+
+# --- Chain planning ---
+
+class ChainStep:
+    """One step of a chain: a compiled sequence played `loop_count` times."""
+    def __init__(self, position, sequence, loop_count, extra_delay):
+        self.position = position        # 1-based position in the chain.
+        self.sequence = sequence        # CompiledSequence (shared between steps using the same file).
+        self.loop_count = loop_count
+        self.extra_delay = extra_delay  # Seconds between loops; 0 means no wait.
+
+
+class ChainPlan:
+    """A fully validated chain, with each distinct sequence compiled once."""
+    def __init__(self, steps, sequences):
+        self.steps = steps
+        self.sequences = sequences      # Absolute path -> CompiledSequence.
+
+    @property
+    def total_actions(self):
+        return sum(len(step.sequence) * step.loop_count for step in self.steps)
+
+    @property
+    def total_loops(self):
+        return sum(step.loop_count for step in self.steps)
+
+
+def plan_chain(chain_config, loader=load_compiled):
+    """
+    Validates a chain config and compiles every distinct sequence it uses.
+
+    All problems (bad fields, missing or invalid files) are collected and raised
+    together, before any playback starts.
+
+    Args:
+        chain_config (list): Steps with 'sequence_file', 'loop_count' and
+                             optional 'extra_delay' (default 1 second).
+        loader (callable): Turns a path into a CompiledSequence.
+
+    Returns:
+        ChainPlan: The plan.
+    """
+    if not isinstance(chain_config, list):
+        raise SequenceValidationError(["Chain config must be a list of steps"])
+    problems = []
+    sequences = {}
+    steps = []
+    for position, item in enumerate(chain_config, start=1):
+        if not isinstance(item, dict) or not item.get('sequence_file'):
+            problems.append(f"Step {position}: missing 'sequence_file'")
+            continue
+        seq_file = item['sequence_file']
+        loop_count = item.get('loop_count')
+        extra_delay = item.get('extra_delay', 1)
+        if isinstance(loop_count, bool) or not isinstance(loop_count, int) or loop_count < 0:
+            problems.append(f"Step {position}: 'loop_count' must be a non-negative integer")
+        if isinstance(extra_delay, bool) or not isinstance(extra_delay, (int, float)) or extra_delay < 0:
+            problems.append(f"Step {position}: 'extra_delay' must be a non-negative number")
+        key = os.path.abspath(seq_file)
+        if key not in sequences:
+            try:
+                sequences[key] = loader(seq_file)
+            except SequenceValidationError as e:
+                problems.extend(f"Step {position}: {problem}" for problem in e.problems)
+                sequences[key] = None
+            except Exception as e:
+                problems.append(f"Step {position}: Failed to load {seq_file}: {e}")
+                sequences[key] = None
+        if sequences[key] is not None:
+            steps.append(ChainStep(position, sequences[key], loop_count, float(extra_delay)))
+    if problems:
+        raise SequenceValidationError(problems)
+    return ChainPlan(steps, sequences)
@@ -0,0 +1,243 @@
+
+# tracing.py
+
+"""
+Per-action timing instrumentation for the player.
+
+A Tracer records nested spans (an action and its phases: delay, locate, move,
+input), keeps a duration histogram per action type, and exports everything in
+the Chrome trace / Perfetto JSON format (load it in chrome://tracing or
+https://ui.perfetto.dev). summary() prints where the wall-clock time went.
+Phase totals count self time: a span nested in another (a mouse move inside a
+click verification) is subtracted from its parent, so totals never exceed wall time.
+
+A disabled tracer hands out one shared no-op span, so instrumented code costs
+next to nothing when tracing is off.
+"""
+
+import json                         # Chrome trace export.
+import os                           # Process id for trace events.
+import threading                    # Thread id for trace events.
+import time                         # Default clock.
+
+# Phase categories reported in the summary, in display order.
+PHASES = ('delay', 'locate', 'move', 'input')
+
+# Upper bounds (seconds) of the histogram buckets; the last bucket is open-ended.
+HISTOGRAM_BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    Fixed-bucket duration histogram. Memory stays constant no matter how many
+    samples are added; percentiles are estimated from the bucket bounds.
+    """
+    def __init__(self, bounds=HISTOGRAM_BOUNDS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Adds one sample (in seconds)."""
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """
+        Estimates the q-th percentile (0-100) as the upper bound of the bucket it falls in.
+        Samples in the open-ended bucket report the observed maximum.
+        """
+        if not self.count:
+            return 0.0
+        target = self.count * q / 100.0
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target and n:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count, 'total_s': self.total, 'mean_s': self.mean,
+            'min_s': self.min, 'max_s': self.max,
+            'p50_s': self.percentile(50), 'p95_s': self.percentile(95),
+            'bounds_s': list(self.bounds), 'buckets': list(self.buckets),
+        }
+
+
+class _NullSpan:
+    """Shared no-op span used when tracing is disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """A timed region. Recorded on exit as a Chrome 'complete' (ph=X) event."""
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start', 'action_type', 'nested')
+
+    def __init__(self, tracer, name, category, args, action_type=None):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.action_type = action_type
+        self.nested = 0.0  # Time spent in directly nested spans.
+
+    def __enter__(self):
+        self.tracer._open.append(self)
+        self.start = self.tracer.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = self.tracer.clock()
+        if exc_type is not None:
+            self.args = dict(self.args, error=str(exc))
+        open_spans = self.tracer._open
+        open_spans.pop()
+        if open_spans:
+            open_spans[-1].nested += end - self.start
+        self.tracer._record(self, end)
+        return False
+
+
+class Tracer:
+    """
+    Collects spans for one or more replays.
+    """
+    def __init__(self, enabled=True, clock=time.perf_counter, max_events=1_000_000):
+        """
+        Args:
+            enabled (bool): When False, every span is a shared no-op.
+            clock (callable): Returns the current time in seconds. Players pass
+                              their backend's now(), so simulator traces show
+                              virtual time (real delays, not zero-length spans).
+            max_events (int): Cap on stored trace events; histograms and phase
+                              totals keep counting after the cap is reached.
+
+        A tracer follows one thread of spans (the player's); nesting is tracked
+        on a single stack.
+        """
+        self.enabled = enabled
+        self.clock = clock
+        self.max_events = max_events
+        self.events = []
+        self.dropped_events = 0
+        self.action_histograms = {}               # Action type -> Histogram of total action time.
+        self.phase_totals = dict.fromkeys(PHASES, 0.0)  # Phase -> self time (nested spans excluded).
+        self._open = []                           # Spans entered and not yet exited, innermost last.
+        self.first_start = None
+        self.last_end = None
+        self._pid = os.getpid()
+
+    def span(self, name, category, **args):
+        """
+        Times a phase.
+
+        Args:
+            name (str): Event name shown in the trace (e.g. 'locate', 'mouse_move').
+            category (str): One of PHASES, or any other label for grouping spans.
+            **args: Extra details stored on the trace event.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def action(self, idx, action_type):
+        """Times a whole action and feeds the per-action-type histogram."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, f"{action_type} #{idx}", 'action', {'index': idx}, action_type=action_type)
+
+    def _record(self, span, end):
+        duration = end - span.start
+        if self.first_start is None or span.start < self.first_start:
+            self.first_start = span.start
+        if self.last_end is None or end > self.last_end:
+            self.last_end = end
+        if span.action_type is not None:
+            histogram = self.action_histograms.get(span.action_type)
+            if histogram is None:
+                histogram = self.action_histograms[span.action_type] = Histogram()
+            histogram.add(duration)
+        elif span.category in self.phase_totals:
+            self.phase_totals[span.category] += duration - span.nested
+
+        if len(self.events) >= self.max_events:
+            self.dropped_events += 1
+            return
+        self.events.append({
+            'name': span.name,
+            'cat': span.category,
+            'ph': 'X',
+            'ts': span.start * 1e6,
+            'dur': duration * 1e6,
+            'pid': self._pid,
+            'tid': threading.get_ident(),
+            'args': span.args,
+        })
+
+    def export_chrome_trace(self, path):
+        """
+        Writes all recorded events as a Chrome trace / Perfetto JSON file.
+
+        Args:
+            path (str): Output file path.
+        """
+        trace = {
+            'traceEvents': self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'dropped_events': self.dropped_events,
+                'action_histograms': {k: h.to_dict() for k, h in self.action_histograms.items()},
+                'phase_totals_s': self.phase_totals,
+            },
+        }
+        with open(path, 'w') as f:
+            json.dump(trace, f)
+
+    def summary(self):
+        """
+        Returns a human-readable breakdown of where the wall-clock time went:
+        self time per phase and count/mean/p95 per action type.
+        """
+        if self.first_start is None:
+            return "No trace data recorded."
+        wall = self.last_end - self.first_start
+        lines = [f"Traced wall time: {wall:.3f}s"]
+        attributed = 0.0
+        for phase in PHASES:
+            total = self.phase_totals[phase]
+            attributed += total
+            share = total / wall * 100 if wall else 0.0
+            lines.append(f"  {phase:<10} {total:10.3f}s  {share:5.1f}%")
+        other = max(0.0, wall - attributed)
+        lines.append(f"  {'other':<10} {other:10.3f}s  {(other / wall * 100 if wall else 0.0):5.1f}%")
+        lines.append("Per action type:")
+        for action_type, h in sorted(self.action_histograms.items(), key=lambda kv: -kv[1].total):
+            lines.append(f"  {action_type:<12} n={h.count:<6} total={h.total:9.3f}s "
+                         f"mean={h.mean * 1e3:8.1f}ms p95<={h.percentile(95) * 1e3:8.1f}ms")
+        if self.dropped_events:
+            lines.append(f"({self.dropped_events} trace events dropped after reaching max_events)")
+        return "\n".join(lines)